@@ -0,0 +1,178 @@
+"""
+Yellow balls tracked across frames, each with an ID and a constant-velocity Kalman filter.
+
+Every track filters its centre x, y and its distance independently, each as
+position and velocity. All tracks are kept in flat NumPy arrays, so
+predicting and updating cost the same handful of array operations however
+many balls there are. Detections are matched to tracks greedily, closest
+centres first. Between detections the tracks are only predicted forward,
+so the yellow pipeline can skip frames and the robot still gets a position
+for every frame.
+"""
+
+import numpy
+
+from measurements import measureYellow
+
+
+class BallTracker:
+    """
+    Kalman tracks of balls in (centre x, centre y, distance).
+    """
+
+    def __init__(self, gate=80.0, max_missed=6, acceleration=(3000.0, 3000.0, 300.0), noise=(3.0, 3.0, 4.0)):
+        """
+        Args:
+            gate: Largest centre distance in pixels a detection is matched to a track over.
+            max_missed: Detection frames a track may go unmatched before it is dropped.
+            acceleration: Process noise per axis, as a spectral density of the acceleration (px/s^2, in/s^2).
+            noise: Measurement standard deviation per axis (px, px, in).
+        """
+        self.gate = gate
+        self.max_missed = max_missed
+        self.q = numpy.array(acceleration, dtype=numpy.float64) ** 2
+        self.r = numpy.array(noise, dtype=numpy.float64) ** 2
+        # velocity variance of a new track, nothing is known about how it moves yet
+        self.v0 = numpy.array([300.0, 300.0, 100.0]) ** 2
+
+        self.next_id = 0
+        self.time = None
+        self.ids = numpy.empty(0, dtype=numpy.int64)
+        self.missed = numpy.empty(0, dtype=numpy.int64)
+        # per track and axis: position, velocity and the three distinct covariance terms
+        self.position = numpy.empty((0, 3))
+        self.velocity = numpy.empty((0, 3))
+        self.p00 = numpy.empty((0, 3))
+        self.p01 = numpy.empty((0, 3))
+        self.p11 = numpy.empty((0, 3))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def predict(self, time):
+        """Move every track forward to a time in seconds."""
+        if self.time is not None and time > self.time and len(self.ids):
+            dt = time - self.time
+            self.position += self.velocity * dt
+            q = self.q
+            self.p00 += dt * 2 * self.p01 + dt * dt * self.p11 + q * (dt ** 3 / 3)
+            self.p01 += dt * self.p11 + q * (dt ** 2 / 2)
+            self.p11 += q * dt
+        if self.time is None or time > self.time:
+            self.time = time
+
+    def update(self, detections, time):
+        """Match a frame's detections to the tracks, correct the matched ones and start tracks for the rest.
+        Args:
+            detections: (M, 3) array of centre x, centre y and distance.
+            time: Capture time of the frame in seconds.
+        """
+        self.predict(time)
+        detections = numpy.asarray(detections, dtype=numpy.float64).reshape(-1, 3)
+
+        track_of, detection_of = self.__match(detections)
+        matched = detection_of >= 0
+        if matched.any():
+            z = detections[detection_of[matched]]
+            p00 = self.p00[matched]
+            p01 = self.p01[matched]
+            s = p00 + self.r
+            k0 = p00 / s
+            k1 = p01 / s
+            residual = z - self.position[matched]
+            self.position[matched] += k0 * residual
+            self.velocity[matched] += k1 * residual
+            self.p00[matched] = (1 - k0) * p00
+            self.p01[matched] = (1 - k0) * p01
+            self.p11[matched] -= k1 * p01
+        self.missed[matched] = 0
+        self.missed[~matched] += 1
+
+        keep = self.missed <= self.max_missed
+        if not keep.all():
+            self.__select(keep)
+
+        new = detections[track_of < 0]
+        if len(new):
+            count = len(new)
+            self.ids = numpy.concatenate([self.ids, numpy.arange(self.next_id, self.next_id + count)])
+            self.next_id += count
+            self.missed = numpy.concatenate([self.missed, numpy.zeros(count, dtype=numpy.int64)])
+            self.position = numpy.concatenate([self.position, new])
+            self.velocity = numpy.concatenate([self.velocity, numpy.zeros((count, 3))])
+            self.p00 = numpy.concatenate([self.p00, numpy.tile(self.r, (count, 1))])
+            self.p01 = numpy.concatenate([self.p01, numpy.zeros((count, 3))])
+            self.p11 = numpy.concatenate([self.p11, numpy.tile(self.v0, (count, 1))])
+
+    def closest(self):
+        """Index of the track with the smallest distance, None without tracks."""
+        if len(self.ids) == 0:
+            return None
+        return int(numpy.argmin(self.position[:, 2]))
+
+    def __match(self, detections):
+        """Greedy nearest-centre matching.
+        Returns:
+            (track index per detection, detection index per track), -1 where unmatched.
+        """
+        track_of = numpy.full(len(detections), -1, dtype=numpy.int64)
+        detection_of = numpy.full(len(self.ids), -1, dtype=numpy.int64)
+        if len(detections) == 0 or len(self.ids) == 0:
+            return track_of, detection_of
+        gap = self.position[:, None, :2] - detections[None, :, :2]
+        distance = numpy.hypot(gap[..., 0], gap[..., 1])
+        for flat in numpy.argsort(distance, axis=None, kind="stable"):
+            track, detection = divmod(int(flat), len(detections))
+            if distance[track, detection] > self.gate:
+                break
+            if detection_of[track] < 0 and track_of[detection] < 0:
+                detection_of[track] = detection
+                track_of[detection] = track
+        return track_of, detection_of
+
+    def __select(self, keep):
+        self.ids = self.ids[keep]
+        self.missed = self.missed[keep]
+        self.position = self.position[keep]
+        self.velocity = self.velocity[keep]
+        self.p00 = self.p00[keep]
+        self.p01 = self.p01[keep]
+        self.p11 = self.p11[keep]
+
+
+def trackYellow(contours_output_yellow, sd, tracker, capture_time, overlay=None):
+    """Measure the yellow balls of a frame, update the tracks and put the closest track in sd."""
+    balls = measureYellow(contours_output_yellow)
+    balls = balls[balls['distance'] < 10000]
+    tracker.update(numpy.stack([balls['center_x'], balls['center_y'], balls['distance']], axis=1), capture_time)
+    publishClosestTrack(sd, tracker, overlay)
+
+
+def predictYellow(sd, tracker, capture_time, overlay=None):
+    """Put the closest track, predicted to a frame the yellow pipeline skipped, in sd."""
+    tracker.predict(capture_time)
+    publishClosestTrack(sd, tracker, overlay)
+
+
+def publishClosestTrack(sd, tracker, overlay=None):
+    """Put the closest track under the getValuesYellow keys plus its ID and the track count."""
+    if overlay is not None:
+        overlay.clear()
+        for i in range(len(tracker)):
+            x, y, distance = tracker.position[i]
+            overlay.circle((x, y), 10, (0, 0, 0), 3)
+            overlay.text("#{} {}in".format(tracker.ids[i], int(distance)), (x - 70, y + 70), (0, 0, 0))
+
+    sd.putNumber('Yellow Tracks', len(tracker))
+    closest = tracker.closest()
+    if closest is None:
+        sd.putNumber('Center X Yellow', -1)
+        sd.putNumber('Center Y Yellow', -1)
+        sd.putNumber('Yellow Distance', -1)
+        sd.putNumber('Yellow Track ID', -1)
+        return
+    x, y, distance = tracker.position[closest]
+    sd.putNumber('Center X Yellow', x)
+    sd.putNumber('Center Y Yellow', y)
+    sd.putNumber('Yellow Distance', distance)
+    sd.putNumber('Yellow Track ID', tracker.ids[closest])
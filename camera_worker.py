@@ -0,0 +1,127 @@
+"""
+One camera's frames through its pipeline, measured and published, on the camera's own thread.
+
+Every camera has its own grabber, condition and worker, so a camera only
+ever waits for its own frames and a slow pipeline holds up nothing but its
+own camera. OpenCV lets go of the GIL while it works, so the pipelines of
+different cameras run side by side. Only measuring and publishing go one
+camera at a time, under a lock shared with everything else that publishes.
+"""
+
+import threading
+from time import perf_counter_ns
+
+from ball_tracker import trackYellow, predictYellow
+from frame_grabber import waitForFrames
+from latency import LatencyHistogram, now
+from overlay import Overlay
+
+
+class CameraWorker(threading.Thread):
+    """
+    Takes a camera's newest frames, runs its pipeline and measurement on them and streams them when chosen.
+    """
+
+    def __init__(self, grabber, publisher, lock, pipeline=None, measure=None, stream=None):
+        """
+        Args:
+            grabber: The camera's FrameGrabber, with a condition of its own.
+            publisher: ResultPublisher the measurements go into.
+            lock: threading.Lock held while measuring and publishing.
+            pipeline: GRIP pipeline run on every frame, None for a camera that is only looked at.
+            measure: getValuesGreen/getValuesYellow style function(contours, table, overlay).
+            stream: DashboardStream the frames go to while this camera is chosen.
+        """
+        threading.Thread.__init__(self, name="worker " + grabber.camera_name, daemon=True)
+        self.camera_name = grabber.camera_name
+        self.grabber = grabber
+        self.publisher = publisher
+        self.lock = lock
+        self.pipeline = pipeline
+        self.measure = measure
+        self.stream = stream
+
+        # result_publisher.RESULT_GROUPS name the measurements are stamped under, e.g. 'green'
+        self.results = None
+        # set by the main loop from "Camera chooser"
+        self.streamed = False
+        # a pipeline_pool.PipelineWorker runs the pipeline in another process instead
+        self.pool_worker = None
+        # a ball_tracker.BallTracker that predicts the frames the pipeline skips, yellow only
+        self.tracker = None
+        self.every = 1
+        # a profiler.StageProfiler times measuring and publishing
+        self.profiler = None
+
+        self.overlay = Overlay()
+        self.latency = LatencyHistogram(self.camera_name)
+        self.waited = 0.0
+        self.__skipped = 0
+        self.__busy_since = now()
+        self.__measure_stage = self.camera_name + "/measure"
+        self.__publish_stage = self.camera_name + "/publish"
+
+    def isProcessed(self):
+        """True if a pipeline needs every frame from this camera."""
+        return self.pipeline is not None or self.pool_worker is not None
+
+    def annotated(self):
+        """True if this camera's frames are streamed to someone and worth drawing on."""
+        return self.streamed and self.stream is not None and self.stream.isWatched()
+
+    def busy(self):
+        """Fraction of the time since the last call the worker was not waiting for frames."""
+        elapsed = now() - self.__busy_since
+        busy = 1.0 - self.waited / elapsed if elapsed > 0 else 0.0
+        self.__busy_since = now()
+        self.waited = 0.0
+        return busy
+
+    def run(self):
+        grabber = self.grabber
+        while True:
+            wait_start = now()
+            waitForFrames([grabber], grabber.condition)
+            self.waited += now() - wait_start
+            timestamp, image = grabber.takeFrame()
+            if image is None:
+                continue
+            if self.isProcessed():
+                self.process(image, grabber.captureTime(timestamp))
+            # with the process pool, annotated frames are streamed once the worker process is done
+            if self.streamed and self.stream is not None and self.pool_worker is None:
+                overlay = self.overlay if self.pipeline is not None else None
+                self.stream.submit(image, overlay, image.shape[2] == 2, pool=grabber.pool)
+            grabber.release(image)
+
+    def process(self, image, capture_time):
+        """Run the pipeline on a frame, or predict the tracks for it, and publish the results."""
+        frame_id = self.grabber.frames_processed
+        if self.pool_worker is not None:
+            self.pool_worker.submit(image, frame_id, capture_time, self.annotated())
+            return
+
+        if self.tracker is not None and self.__skipped < self.every - 1:
+            self.__skipped += 1
+            with self.lock:
+                predictYellow(self.publisher, self.tracker, capture_time, self.overlay)
+                self.publisher.publish(frame_id, capture_time, self.results)
+                self.latency.add(self.publisher.latency)
+            return
+        self.__skipped = 0
+
+        self.pipeline.process(image)
+        profiler = self.profiler
+        with self.lock:
+            if profiler is not None:
+                start = perf_counter_ns()
+            if self.tracker is not None:
+                trackYellow(self.pipeline.filter_contours_output, self.publisher, self.tracker, capture_time, self.overlay)
+            else:
+                self.measure(self.pipeline.filter_contours_output, self.publisher, self.overlay)
+            if profiler is not None:
+                start = profiler.lap(self.__measure_stage, start)
+            self.publisher.publish(frame_id, capture_time, self.results)
+            if profiler is not None:
+                profiler.lap(self.__publish_stage, start)
+            self.latency.add(self.publisher.latency)
@@ -0,0 +1,158 @@
+import cv2
+import numpy
+
+
+class CoarseToFine:
+    """
+    Finds candidates on a downscaled copy of the frame before running the full pipeline.
+
+    The frame is sampled twice, a pixel apart, and both coarse copies are
+    thresholded and dilated once. A ball seen through a net still comes out
+    as one blob, even where one of the samplings lands on nothing but the
+    net's lines. If that holds too few pixels to ever pass the pipeline's
+    minimum area the frame is done right away, otherwise the full pipeline
+    runs on a window around each candidate. Contours come back in full-frame
+    coordinates, so this can stand in for the pipeline.
+    """
+
+    def __init__(self, pipeline, coarse_width=160, coarse_height=120, margin=16, area_fraction=0.5):
+        """Wrap a pipeline.
+        Args:
+            pipeline: A pipeline with process(), threshold(), minArea() and filter_contours_output.
+            coarse_width: Width of the downscaled copy.
+            coarse_height: Height of the downscaled copy.
+            margin: Full resolution pixels added around each candidate.
+            area_fraction: Part of the minimum area a coarse blob needs to count as a candidate.
+                Blobs are only dilated once and the pipeline's own morphology may grow them more, so this stays below 1.
+        """
+        self.pipeline = pipeline
+        self.coarse_size = (coarse_width, coarse_height)
+        self.margin = margin
+        self.area_fraction = area_fraction
+
+        self.filter_contours_output = None
+        self.candidates = []
+        self.early_exits = 0
+        self.frames = 0
+
+        self.__coarse = numpy.empty((coarse_height, coarse_width, 3), dtype=numpy.uint8)
+        self.__coarse_hsv = numpy.empty((coarse_height, coarse_width, 3), dtype=numpy.uint8)
+        self.__coarse_mask = numpy.empty((coarse_height, coarse_width), dtype=numpy.uint8)
+        self.__coarse_shifted = numpy.empty((coarse_height, coarse_width), dtype=numpy.uint8)
+        self.__coarse_dilated = numpy.empty((coarse_height, coarse_width), dtype=numpy.uint8)
+        self.__coarse_yuyv = numpy.empty((coarse_height, coarse_width, 2), dtype=numpy.uint8)
+        # remap() maps of the shifted sampling, and the frame shape they were made for
+        self.__shifted_maps = None
+        self.__shifted_shape = None
+
+    def process(self, source0):
+        """
+        Runs the coarse threshold and, if anything is there, the full pipeline on each candidate.
+        """
+        height, width = source0.shape[:2]
+        scale_x = width / self.coarse_size[0]
+        scale_y = height / self.coarse_size[1]
+        min_pixels = self.pipeline.minArea() * self.area_fraction / (scale_x * scale_y)
+        self.frames += 1
+
+        # sampling keeps real pixel colours for the threshold, averaging would darken a ball behind a net,
+        # and the second sampling finds it where the first lands on the net's lines
+        yuyv = source0.shape[2:] == (2,)
+        if yuyv:
+            # a YUYV frame is sampled as whole Y U Y V pairs, so every pixel keeps its own U and V
+            frame = numpy.ascontiguousarray(source0).reshape(height, width // 2, 4)
+            coarse = self.__coarse_yuyv.reshape(self.coarse_size[1], self.coarse_size[0] // 2, 4)
+        else:
+            frame = source0
+            coarse = self.__coarse
+        cv2.resize(frame, coarse.shape[1::-1], coarse, interpolation=cv2.INTER_NEAREST)
+        mask = self.__threshold(yuyv, self.__coarse_mask)
+        map_x, map_y = self.__shiftedMaps(frame.shape[:2], coarse.shape[:2])
+        cv2.remap(frame, map_x, map_y, cv2.INTER_NEAREST, coarse)
+        cv2.bitwise_or(mask, self.__threshold(yuyv, self.__coarse_shifted), mask)
+        # joins the pieces of a broken up blob, as the pipeline's dilation would
+        mask = cv2.dilate(mask, None, self.__coarse_dilated)
+        if cv2.countNonZero(mask) < min_pixels:
+            self.early_exits += 1
+            self.candidates = []
+            self.filter_contours_output = []
+            return
+
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(mask)
+        windows = []
+        for i in range(1, count):
+            if stats[i, cv2.CC_STAT_AREA] < min_pixels:
+                continue
+            # even left and right edges keep the pixel pairs of a YUYV frame together
+            x = (int(stats[i, cv2.CC_STAT_LEFT] * scale_x) - self.margin) & ~1
+            y = int(stats[i, cv2.CC_STAT_TOP] * scale_y) - self.margin
+            right = (int((stats[i, cv2.CC_STAT_LEFT] + stats[i, cv2.CC_STAT_WIDTH]) * scale_x) + self.margin + 1) & ~1
+            bottom = int((stats[i, cv2.CC_STAT_TOP] + stats[i, cv2.CC_STAT_HEIGHT]) * scale_y) + self.margin
+            windows.append([max(0, x), max(0, y), min(width, right), min(height, bottom)])
+        self.candidates = self.__merge(windows)
+
+        output = []
+        for left, top, right, bottom in self.candidates:
+            self.pipeline.process(source0[top:bottom, left:right])
+            for contour in self.pipeline.filter_contours_output:
+                contour += (left, top)
+                output.append(contour)
+        self.filter_contours_output = output
+
+    def __threshold(self, yuyv, dst):
+        if yuyv:
+            return self.pipeline.threshold(self.__coarse_yuyv, None, dst)
+        return self.pipeline.threshold(self.__coarse, self.__coarse_hsv, dst)
+
+    def __shiftedMaps(self, shape, coarse_shape):
+        """remap() maps that sample the pixel below and right of the one resize() takes in every cell.
+        Args:
+            shape: (height, width) of the frame, in pixel pairs for a YUYV frame.
+            coarse_shape: (height, width) of the coarse copy, the same way.
+        """
+        if self.__shifted_shape != (shape, coarse_shape):
+            step_y = shape[0] / coarse_shape[0]
+            step_x = shape[1] / coarse_shape[1]
+            # the same pixel again if a cell is only one pixel
+            rows = numpy.floor(numpy.arange(coarse_shape[0]) * step_y) + (1 if step_y >= 2 else 0)
+            columns = numpy.floor(numpy.arange(coarse_shape[1]) * step_x) + (1 if step_x >= 2 else 0)
+            map_y, map_x = numpy.meshgrid(rows, columns, indexing="ij")
+            self.__shifted_maps = (map_x.astype(numpy.float32), map_y.astype(numpy.float32))
+            self.__shifted_shape = (shape, coarse_shape)
+        return self.__shifted_maps
+
+    def warm(self, shape):
+        """Run the coarse and the full pipeline once each on a black frame, without counting it.
+
+        A black frame always leaves on the coarse copy, so the full pipeline
+        is run on it directly. Otherwise the first frame with a ball would pay
+        for its buffers and OpenCV's set-up.
+        """
+        frame = numpy.zeros(shape, dtype=numpy.uint8)
+        self.process(frame)
+        self.pipeline.process(frame)
+        self.frames -= 1
+        self.early_exits -= 1
+
+    def earlyExitRate(self):
+        """Fraction of frames rejected on the coarse copy alone."""
+        return self.early_exits / self.frames if self.frames else 0.0
+
+    @staticmethod
+    def __merge(windows):
+        """Merge overlapping windows so no blob is searched twice."""
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(windows)):
+                for j in range(i + 1, len(windows)):
+                    a = windows[i]
+                    b = windows[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        windows[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del windows[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return windows
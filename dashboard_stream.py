@@ -0,0 +1,245 @@
+"""
+The dashboard stream, annotated, scaled and handed to cscore on its own thread within a bandwidth budget.
+
+The main loop only hands over the newest frame with a snapshot of its
+overlay and goes back to the cameras. Decoding a YUYV frame, drawing,
+scaling and putFrame() all happen on the stream thread, and not at all
+while no MJPEG client is connected. cscore's MjpegServer compresses every
+frame it sends on its own thread, so the budget is kept by what it is
+given: about once a second one frame is also encoded here with
+cv2.imencode at the current size and quality, which gives the bytes per
+frame and the encode time. The stream steps down a ladder of (scale,
+quality) levels while the bytes per second would go over the budget, back
+up when the level above fits with room to spare, and on the last level
+spaces the frames out instead.
+
+A camera nothing processes is shown by pointing the server at the camera
+itself, so its MJPEG frames go out as the camera sent them.
+"""
+
+import sys
+import threading
+import time
+from time import perf_counter_ns
+
+import cv2
+import numpy
+
+from latency import now
+from overlay import Overlay
+
+
+# (scale, JPEG quality) from the best picture down
+LEVELS = [(1.0, 70), (1.0, 50), (0.5, 60), (0.5, 40), (0.25, 40)]
+
+# the level above is only taken if it would use at most this much of the budget
+HEADROOM = 0.8
+
+
+class DashboardStream(threading.Thread):
+    """
+    Puts annotated frames to a CvSource, the newest one only, at a size and quality that fit the budget.
+    """
+
+    def __init__(self, source, server=None, budget_kbps=None, levels=LEVELS, measure_interval=1.0):
+        """
+        Args:
+            source: The CvSource the dashboard's MjpegServer streams.
+            server: That MjpegServer, for its compression and to switch to cameras, None to leave it alone.
+            budget_kbps: Kilobits per second the stream may use, None for no limit.
+            levels: (scale, quality) ladder, e.g. LEVELS.
+            measure_interval: Seconds between sample encodes.
+        """
+        threading.Thread.__init__(self, name="dashboard stream", daemon=True)
+        self.source = source
+        self.server = server
+        self.budget_kbps = budget_kbps
+        self.levels = levels
+        self.measure_interval = measure_interval
+
+        self.level = 0
+        self.frames_streamed = 0
+        self.frames_dropped = 0
+        self.frames_unwatched = 0
+        self.kbps = 0.0
+        self.frame_bytes = 0
+        self.encode_ms = 0.0
+
+        # a profiler.StageProfiler times every frame put
+        self.profiler = None
+
+        self.__condition = threading.Condition()
+        self.__pending = None  # (image, overlay items, yuyv, copied, pool)
+        self.__spares = []
+        self.__overlay = Overlay()
+        self.__bgr = None
+        self.__scaled = None
+        self.__next_put = 0.0
+        self.__measured = now()
+        self.__measured_frames = 0
+        self.__stopped = False
+        # camera the server passes through instead of the source
+        self.__shown = None
+        self.__setQuality()
+
+    def submit(self, image, overlay=None, yuyv=False, copy=False, pool=None):
+        """Hand over a frame to stream, replacing one that has not been streamed yet.
+        Args:
+            image: BGR or packed YUYV numpy.ndarray. Drawn on unless copied.
+            overlay: Overlay to draw on it, its items are copied so it can be cleared straight away.
+            yuyv: The image is packed YUYV.
+            copy: Copy the image, for images that are only valid until this returns.
+            pool: frame_grabber.FramePool the image came from, it is held there until it has been put.
+        Returns:
+            False if no client is connected and the frame was ignored.
+        """
+        if not self.isWatched():
+            self.frames_unwatched += 1
+            return False
+        items = None if overlay is None else list(overlay.items)
+        with self.__condition:
+            pending = self.__pending
+            if pending is not None:
+                self.frames_dropped += 1
+                if pending[4] is not None:
+                    pending[4].release(pending[0])
+            if copy:
+                if pending is not None and pending[3] and pending[0].shape == image.shape:
+                    buffer = pending[0]
+                else:
+                    buffer = self.__spare(image)
+                numpy.copyto(buffer, image)
+                image = buffer
+            elif pool is not None:
+                pool.retain(image)
+            self.__pending = (image, items, yuyv, copy, None if copy else pool)
+            self.__condition.notify()
+        return True
+
+    def isWatched(self):
+        """True if an MJPEG client is connected to the stream."""
+        return self.source.isEnabled()
+
+    def showCamera(self, camera=None):
+        """Point the server at a camera's own stream, passed through untouched, or back at the source with None."""
+        if self.server is None or camera is self.__shown:
+            return
+        self.__shown = camera
+        self.server.setSource(self.source if camera is None else camera)
+        if camera is None:
+            self.__setQuality()
+        else:
+            # a quality of its own would make the server decode and encode the camera's frames again
+            self.server.setCompression(-1)
+
+    def stop(self):
+        """End the thread after the frame it is putting, and wait for it."""
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify()
+        self.join()
+
+    def run(self):
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: self.__pending is not None or self.__stopped)
+                # spaced out to the budget, and then the newest frame
+                wait = self.__next_put - now()
+                if wait > 0 and not self.__stopped:
+                    self.__condition.wait(wait)
+                if self.__stopped:
+                    return
+                image, items, yuyv, copied, pool = self.__pending
+                self.__pending = None
+            try:
+                self.__put(image, items, yuyv)
+            except cv2.error as err:
+                print("dashboard stream: {}".format(err), file=sys.stderr)
+            if copied:
+                with self.__condition:
+                    self.__spares.append(image)
+            elif pool is not None:
+                pool.release(image)
+
+    def publish(self, table):
+        """Put the stream's bandwidth, encode time and level into a NetworkTables table."""
+        scale, quality = self.levels[self.level]
+        table.putNumber('Stream kbps', self.kbps)
+        table.putNumber('Stream Encode ms', self.encode_ms)
+        table.putNumber('Stream Scale', scale)
+        table.putNumber('Stream Quality', quality)
+        table.putNumber('Stream Frames Dropped', self.frames_dropped)
+
+    def __put(self, image, items, yuyv):
+        profiler = self.profiler
+        if profiler is not None:
+            start = perf_counter_ns()
+        if yuyv:
+            if self.__bgr is None or self.__bgr.shape[:2] != image.shape[:2]:
+                self.__bgr = numpy.empty(image.shape[:2] + (3,), dtype=numpy.uint8)
+            image = cv2.cvtColor(image, cv2.COLOR_YUV2BGR_YUYV, dst=self.__bgr)
+        if items:
+            self.__overlay.items = items
+            self.__overlay.draw(image)
+        frame = self.__scale(image, self.levels[self.level][0])
+        self.source.putFrame(frame)
+        self.frames_streamed += 1
+        if profiler is not None:
+            profiler.lap("Stream/put", start)
+
+        if now() - self.__measured >= self.measure_interval:
+            self.__measure(image, frame)
+        if self.budget_kbps is not None and self.frame_bytes:
+            # on the last level only fewer frames can keep the budget
+            self.__next_put = now() + self.frame_bytes * 8 / (self.budget_kbps * 1000.0)
+
+    def __measure(self, image, frame):
+        """Encode a sample like the server would, update the rates and pick the level for the next frames."""
+        elapsed = now() - self.__measured
+        fps = (self.frames_streamed - self.__measured_frames) / elapsed
+        self.__measured = now()
+        self.__measured_frames = self.frames_streamed
+
+        start = time.perf_counter()
+        self.frame_bytes = self.__encodedSize(frame, self.levels[self.level][1])
+        self.encode_ms = (time.perf_counter() - start) * 1000
+        self.kbps = self.frame_bytes * 8 * fps / 1000
+        if self.budget_kbps is None:
+            return
+
+        if self.kbps > self.budget_kbps and self.level < len(self.levels) - 1:
+            self.level += 1
+            self.__setQuality()
+        elif self.level > 0:
+            scale, quality = self.levels[self.level - 1]
+            above = self.__encodedSize(self.__scale(image, scale, False), quality)
+            if above * 8 * fps / 1000 < self.budget_kbps * HEADROOM:
+                self.level -= 1
+                self.__setQuality()
+
+    def __scale(self, image, scale, reuse=True):
+        if scale == 1.0:
+            return image
+        size = (int(image.shape[1] * scale), int(image.shape[0] * scale))
+        if not reuse:
+            return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        if self.__scaled is None or self.__scaled.shape[1::-1] != size:
+            self.__scaled = numpy.empty((size[1], size[0], 3), dtype=numpy.uint8)
+        return cv2.resize(image, size, self.__scaled, interpolation=cv2.INTER_AREA)
+
+    def __setQuality(self):
+        # the last sample was of another level, frames are not spaced out until the next one
+        self.frame_bytes = 0
+        if self.server is not None and self.__shown is None:
+            self.server.setCompression(self.levels[self.level][1])
+
+    def __spare(self, image):
+        for i, spare in enumerate(self.__spares):
+            if spare.shape == image.shape:
+                return self.__spares.pop(i)
+        return numpy.empty_like(image)
+
+    @staticmethod
+    def __encodedSize(image, quality):
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return len(jpeg) if ok else 0
@@ -0,0 +1,214 @@
+import sys
+import threading
+from time import perf_counter_ns
+
+import numpy
+
+from latency import ClockOffset, now
+
+
+class FramePool:
+    """
+    Frame buffers of one camera's size, handed out in turn and taken back once nobody holds them.
+
+    The grabber fills one buffer while the worker and the dashboard stream
+    hold the frames before it. Every holder calls release() once it is done,
+    and a buffer goes back into the pool when the last one has. New buffers
+    are only made while more frames are held at once than ever before, so
+    once every holder has had its frame nothing is allocated any more.
+    """
+
+    def __init__(self, shape, count=2):
+        """
+        Args:
+            shape: (height, width, channels) of the camera's frames.
+            count: Buffers made up front, two to fill one while the other is held.
+        """
+        self.shape = shape
+        self.allocated = 0
+        self.__lock = threading.Lock()
+        self.__free = [self.__allocate() for _ in range(count)]
+        # id() of every buffer handed out, with the number of holders
+        self.__holders = {}
+
+    def acquire(self):
+        """A free buffer, held once by the caller."""
+        with self.__lock:
+            buffer = self.__free.pop() if self.__free else None
+        if buffer is None:
+            buffer = self.__allocate()
+        self.adopt(buffer)
+        return buffer
+
+    def adopt(self, buffer):
+        """Hold a buffer made elsewhere once, it goes into the pool when it is released."""
+        with self.__lock:
+            self.__holders[id(buffer)] = 1
+
+    def retain(self, buffer):
+        """Hold a buffer that is already held once more."""
+        with self.__lock:
+            self.__holders[id(buffer)] += 1
+
+    def release(self, buffer):
+        """Let go of a buffer, it is free again once every holder has."""
+        with self.__lock:
+            holders = self.__holders.pop(id(buffer), 1) - 1
+            if holders > 0:
+                self.__holders[id(buffer)] = holders
+            elif buffer.shape == self.shape:
+                self.__free.append(buffer)
+
+    def resize(self, shape):
+        """Switch to frames of another shape, e.g. after the camera's mode changed. Held buffers are dropped on release."""
+        with self.__lock:
+            self.shape = shape
+            self.__free = []
+
+    def __allocate(self):
+        self.allocated += 1
+        return numpy.empty(self.shape, dtype=numpy.uint8)
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Grabs frames from a single CvSink on its own thread.
+
+    Only the newest frame is kept. A frame that is not taken before the next
+    one arrives is dropped and its buffer goes back into the FramePool for
+    the next grab, so a slow camera never holds up the others.
+    """
+
+    def __init__(self, name, sink, condition, width=640, height=480, channels=3):
+        """Set up the grabber for a sink.
+        Args:
+            name: Camera name used for counters and messages.
+            sink: The CvSink to grab from.
+            condition: threading.Condition notified whenever a new frame arrives.
+            width: Expected frame width.
+            height: Expected frame height.
+            channels: Bytes per pixel, 3 for BGR and 2 for a raw YUYV sink.
+        """
+        threading.Thread.__init__(self, name="grabber " + name, daemon=True)
+        self.camera_name = name
+        self.sink = sink
+        self.condition = condition
+        self.shape = (height, width, channels)
+
+        self.frames_captured = 0
+        self.frames_processed = 0
+        # now() of the first frame grabbed, for the startup timeline
+        self.first_frame = None
+
+        # cscore's frame clock against now()
+        self.clock = ClockOffset()
+
+        # a profiler.StageProfiler times every grab, waiting for the camera included
+        self.profiler = None
+        self.__grab_stage = name + "/grab"
+
+        # a frame_recorder.FrameRecorder gets a copy of every frame grabbed
+        self.recorder = None
+        # wait for each frame to be taken before grabbing the next, for replaying every frame
+        self.lossless = False
+
+        self.pool = FramePool(self.shape)
+        self.__frame = None
+        self.__timestamp = 0
+        self.__enabled = threading.Event()
+        self.__enabled.set()
+
+    def run(self):
+        while True:
+            self.__enabled.wait()
+            if self.lossless:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.__frame is None)
+            profiler = self.profiler
+            if profiler is not None:
+                start = perf_counter_ns()
+            buffer = self.pool.acquire()
+            timestamp, image = self.sink.grabFrame(buffer)
+            if profiler is not None:
+                profiler.lap(self.__grab_stage, start)
+            if timestamp == 0:
+                print("camera '{}': {}".format(self.camera_name, self.sink.getError()), file=sys.stderr)
+                self.pool.release(buffer)
+                continue
+            if image is not buffer:
+                # the sink made a frame of its own, the camera's mode has changed
+                self.pool.release(buffer)
+                self.pool.resize(image.shape)
+                self.pool.adopt(image)
+            self.clock.update(timestamp * 1e-6, now())
+            if self.first_frame is None:
+                self.first_frame = now()
+            if self.recorder is not None:
+                self.recorder.record(timestamp, image)
+
+            with self.condition:
+                if self.__frame is not None:
+                    # previous frame was never taken, grab over it next time
+                    self.pool.release(self.__frame)
+                self.__frame = image
+                self.__timestamp = timestamp
+                self.frames_captured += 1
+                self.condition.notify_all()
+
+    def setEnabled(self, enabled):
+        """Start or stop grabbing. A disabled sink does not decode frames at all."""
+        if enabled == self.__enabled.is_set():
+            return
+        self.sink.setEnabled(enabled)
+        if enabled:
+            self.__enabled.set()
+        else:
+            self.__enabled.clear()
+
+    def isEnabled(self):
+        return self.__enabled.is_set()
+
+    def hasFrame(self):
+        """True if a frame is waiting to be taken."""
+        return self.__frame is not None
+
+    def takeFrame(self):
+        """Take the newest frame.
+        Returns:
+            (timestamp, image), or (0, None) if nothing new arrived since the last call.
+            The caller holds the image until it calls release(), the grabber does not write to it before.
+        """
+        with self.condition:
+            frame = self.__frame
+            if frame is None:
+                return 0, None
+            self.__frame = None
+            self.frames_processed += 1
+            if self.lossless:
+                self.condition.notify_all()
+            return self.__timestamp, frame
+
+    def release(self, image):
+        """Hand back a frame from takeFrame() for grabbing into again."""
+        self.pool.release(image)
+
+    def captureTime(self, timestamp):
+        """A timestamp from takeFrame() as now() time in seconds."""
+        return self.clock.toOurs(timestamp * 1e-6)
+
+    def framesDropped(self):
+        """Number of frames captured but never taken."""
+        return self.frames_captured - self.frames_processed - (1 if self.hasFrame() else 0)
+
+
+def waitForFrames(grabbers, condition, timeout=None):
+    """Block until at least one of the grabbers holds a new frame."""
+    with condition:
+        return condition.wait_for(lambda: any(g.hasFrame() for g in grabbers), timeout)
+
+
+def publishFrameCounts(table, grabber):
+    """Put captured/processed/dropped counts for a camera into a NetworkTables table."""
+    table.putNumber('Frames Captured ' + grabber.camera_name, grabber.frames_captured)
+    table.putNumber('Frames Processed ' + grabber.camera_name, grabber.frames_processed)
+    table.putNumber('Frames Dropped ' + grabber.camera_name, grabber.framesDropped())
@@ -0,0 +1,262 @@
+"""
+Raw frames recorded to a memory-mapped ring file per camera, and played back.
+
+A ring file is a small header followed by a fixed number of slots, each
+holding one frame's sequence number, grabFrame timestamp and raw pixels,
+BGR or packed YUYV as the camera's sink hands them out.
+Recording a frame is one copy into the mapping. The file is preallocated and
+written to disk by a background thread, so the camera thread never waits on
+the SD card. Starting a recorder moves an earlier file of the same name to
+.1, .2, ..., so a reboot after a match does not wipe the match.
+
+ReplaySink reads a ring file back in recording order and stands in for a
+CvSink, at the original pace or as fast as frames are taken.
+"""
+
+import mmap
+import os
+import sys
+import threading
+import time
+
+import numpy
+
+
+MAGIC = b"FRCRING1"
+
+HEADER_DTYPE = numpy.dtype([
+    ("magic", "S8"), ("slots", "<u4"), ("height", "<u4"), ("width", "<u4"), ("channels", "<u4"),
+    ("next", "<i8"),  # sequence number the next frame gets
+])
+HEADER_SIZE = 64
+
+# the background thread keeps this many slots ahead of the recorder faulted in, checking this often
+PREFAULT_SLOTS = 8
+PREFAULT_INTERVAL = 0.05
+
+
+def slotDtype(shape):
+    """One ring slot for frames of shape (height, width, channels)."""
+    return numpy.dtype([("sequence", "<i8"), ("timestamp", "<i8"), ("image", numpy.uint8, shape)])
+
+
+def ringPath(directory, name):
+    return os.path.join(directory, name + ".ring")
+
+
+class FrameRecorder:
+    """
+    Records one camera's frames into a ring file, keeping the newest `slots` of them.
+    """
+
+    def __init__(self, path, slots=300, shape=(480, 640, 3), keep=3, sync_interval=1.0):
+        """
+        Args:
+            path: The ring file.
+            slots: Frames kept, the file takes slots times a frame's size.
+            shape: Frame shape, frames of any other shape are not recorded.
+            keep: Earlier recordings kept as path.1 to path.<keep>.
+            sync_interval: Seconds between writing dirty pages to disk.
+        """
+        self.path = path
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.keep = keep
+        self.sync_interval = sync_interval
+
+        self.frames_recorded = 0
+        self.frames_skipped = 0
+
+        self.__file = None
+        self.__map = None
+        self.__header = None
+        self.__sequences = None
+        self.__timestamps = None
+        self.__images = None
+        self.__pages = None
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="recorder " + os.path.basename(path), daemon=True)
+
+    def start(self):
+        """Rotate, preallocate and map the file on the background thread. Frames are skipped until it is ready."""
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        self.__thread.join()
+
+    def isReady(self):
+        return self.__images is not None
+
+    def record(self, timestamp, image):
+        """Copy a frame into the next slot.
+        Returns:
+            False if the frame was skipped, because the file is not mapped yet or the shape is wrong.
+        """
+        images = self.__images
+        if images is None or image.shape != self.shape:
+            self.frames_skipped += 1
+            return False
+        sequence = self.frames_recorded
+        slot = sequence % self.slots
+        # a slot being written is never valid, even if we die half way
+        self.__sequences[slot] = -1
+        numpy.copyto(images[slot], image)
+        self.__timestamps[slot] = timestamp
+        self.__sequences[slot] = sequence
+        self.__header["next"] = sequence + 1
+        self.frames_recorded += 1
+        return True
+
+    def __run(self):
+        try:
+            self.__open()
+        except OSError as err:
+            print("could not record to '{}': {}".format(self.path, err), file=sys.stderr)
+            return
+        synced = time.monotonic()
+        touched = 0
+        while not self.__stop.wait(PREFAULT_INTERVAL):
+            written = self.frames_recorded
+            if time.monotonic() - synced >= self.sync_interval:
+                # fsync writes the mapping's dirty pages like msync, but lets go of the GIL while it waits
+                os.fsync(self.__file.fileno())
+                synced = time.monotonic()
+                touched = 0
+            # the slot being written and the next one are left alone, writing them here could undo a frame
+            first = max(touched, written + 2)
+            last = written + 2 + min(PREFAULT_SLOTS, self.slots - 2)
+            for sequence in range(first, last):
+                self.__prefault(sequence % self.slots)
+            touched = max(first, last)
+        os.fsync(self.__file.fileno())
+
+    def __prefault(self, slot):
+        """Write every page of a slot back with the bytes it holds.
+
+        Writing to a clean page of a shared mapping faults, and every page is
+        clean again after a sync, so the first write to a slot would cost
+        record() one fault per page. Here those faults are taken on this thread.
+        """
+        # numpy skips a copy onto itself, an in-place or really writes
+        self.__pages[slot] |= 0
+
+    def __open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        for i in range(self.keep, 0, -1):
+            older = self.path if i == 1 else "{}.{}".format(self.path, i - 1)
+            if os.path.exists(older):
+                os.replace(older, "{}.{}".format(self.path, i))
+
+        slot_dtype = slotDtype(self.shape)
+        size = HEADER_SIZE + self.slots * slot_dtype.itemsize
+        self.__file = open(self.path, "w+b")
+        # really allocate the blocks, a full card must fail here and not as SIGBUS in record()
+        os.posix_fallocate(self.__file.fileno(), 0, size)
+        self.__map = mmap.mmap(self.__file.fileno(), size)
+
+        header = numpy.frombuffer(self.__map, dtype=HEADER_DTYPE, count=1)
+        header["magic"] = MAGIC
+        header["slots"] = self.slots
+        header["height"], header["width"], header["channels"] = self.shape
+        header["next"] = 0
+        slots = numpy.frombuffer(self.__map, dtype=slot_dtype, count=self.slots, offset=HEADER_SIZE)
+        slots["sequence"] = -1
+
+        self.__header = header
+        self.__sequences = slots["sequence"]
+        self.__timestamps = slots["timestamp"]
+        self.__images = slots["image"]
+        data = numpy.frombuffer(self.__map, dtype=numpy.uint8, count=self.slots * slot_dtype.itemsize, offset=HEADER_SIZE)
+        self.__pages = [data[start:start + slot_dtype.itemsize:mmap.PAGESIZE]
+                        for start in range(0, len(data), slot_dtype.itemsize)]
+
+
+def readRecording(path):
+    """Read a ring file.
+    Returns:
+        (timestamps, images): the valid frames, oldest first. The images are views into the file.
+    """
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = numpy.frombuffer(data, dtype=HEADER_DTYPE, count=1)[0]
+    if header["magic"] != MAGIC:
+        raise ValueError("{}: not a ring file".format(path))
+    shape = (int(header["height"]), int(header["width"]), int(header["channels"]))
+    slots = numpy.frombuffer(data, dtype=slotDtype(shape), count=int(header["slots"]), offset=HEADER_SIZE)
+    order = numpy.argsort(slots["sequence"], kind="stable")
+    order = order[slots["sequence"][order] >= 0]
+    images = slots["image"]
+    return slots["timestamp"][order], [images[i] for i in order]
+
+
+class ReplaySink:
+    """
+    Stands in for a CvSink and hands out the frames of a ring file in the order they were recorded.
+
+    At the original pace grabFrame() waits out the gaps between the recorded
+    timestamps. Otherwise it returns the next frame straight away, and the
+    FrameGrabber should be made lossless so no frame is skipped. After the
+    last frame grabFrame() blocks like a camera that stopped sending, unless
+    it loops.
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        """
+        Args:
+            path: The ring file.
+            realtime: Keep the recorded gaps between frames.
+            loop: Start over after the last frame.
+        """
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.timestamps, self.images = readRecording(path)
+        # 3 for BGR frames, 2 for a recording of packed YUYV frames
+        self.channels = self.images[0].shape[2] if self.images else 3
+        self.__next = 0
+        self.__start = None
+        self.__enabled = True
+        self.__finished = threading.Event()
+
+    def grabFrame(self, image, timeout=0.225):
+        """Copy the next frame into image.
+        Returns:
+            (timestamp, image), with the recorded timestamp.
+        """
+        if self.__next == len(self.images):
+            if not self.loop or len(self.images) == 0:
+                if not self.__finished.is_set():
+                    print("replay of '{}' finished".format(self.path))
+                    self.__finished.set()
+                # blocks for good, there is nothing more to grab
+                threading.Event().wait()
+            self.__next = 0
+            self.__start = None
+
+        timestamp = int(self.timestamps[self.__next])
+        if self.realtime:
+            if self.__start is None:
+                self.__start = (time.monotonic(), timestamp)
+            wait = self.__start[0] + (timestamp - self.__start[1]) * 1e-6 - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+        frame = self.images[self.__next]
+        self.__next += 1
+        if image is None or image.shape != frame.shape:
+            image = numpy.empty_like(frame)
+        numpy.copyto(image, frame)
+        return timestamp, image
+
+    def getError(self):
+        return ""
+
+    def setEnabled(self, enabled):
+        self.__enabled = enabled
+
+    def setSource(self, source):
+        pass
+
+    def isFinished(self):
+        return self.__finished.is_set()
@@ -0,0 +1,427 @@
+"""
+Runs GRIP .grip files directly instead of the classes GRIP generates from them.
+
+A .grip file is parsed into a step graph. Steps whose outputs nothing asks
+for are dropped (GRIP keeps preview-only steps like a Canny or a Mask), and
+steps with the same inputs and settings across files are run only once.
+With a morphology plan, every chain of erode and dilate steps nothing else
+reads in between runs as one MorphologyStep.
+"""
+
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+from time import perf_counter_ns
+
+import cv2
+import numpy
+
+from fast_filter import filterContours, filterContoursFast
+from hsv_lut import HsvLookupTable, YuyvLookupTable
+from morphology import MorphologyPlan, ERODE, DILATE
+
+
+DEFAULT_OUTPUTS = ("filter_contours_output",)
+
+# GRIP sinks, nothing downstream reads them
+IGNORED_STEPS = ("NTPublish ContoursReport", "NTPublish BlobsReport", "NTPublish LinesReport")
+
+
+class Step:
+    """
+    One runnable step. Owns its output buffers, sized from the first input.
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self.name = type(self).__name__
+        self.__buffers = {}
+
+    def buffer(self, name, shape):
+        """A preallocated array of the given shape, reused for every frame no bigger than it."""
+        buffer = self.__buffers.get(name)
+        if buffer is None or buffer.ndim != len(shape) or buffer.shape[0] < shape[0] or buffer.shape[1] < shape[1]:
+            buffer = numpy.empty(shape, dtype=numpy.uint8)
+            self.__buffers[name] = buffer
+        return buffer[:shape[0], :shape[1]]
+
+    def key(self):
+        """Steps with equal keys and equal inputs produce equal outputs."""
+        return (type(self).__name__, repr(self.params))
+
+
+class HsvThresholdStep(Step):
+
+    def __init__(self, params):
+        Step.__init__(self, params)
+        self.lut = None
+
+    def run(self, input):
+        return self.threshold(input, self.buffer("hsv", input.shape), self.buffer("dst", input.shape[:2]))
+
+    def threshold(self, input, hsv=None, dst=None):
+        hue, sat, val = self.params
+        if self.lut is not None:
+            return self.lut.apply(input, dst)
+        out = cv2.cvtColor(input, cv2.COLOR_BGR2HSV, dst=hsv)
+        return cv2.inRange(out, (hue[0], sat[0], val[0]), (hue[1], sat[1], val[1]), dst=dst)
+
+
+class ErodeStep(Step):
+
+    def run(self, src):
+        kernel, anchor, iterations, border_type, border_value = self.params
+        return cv2.erode(src, kernel, self.buffer("dst", src.shape), anchor, iterations=(int)(iterations + 0.5),
+                         borderType=border_type, borderValue=border_value)
+
+
+class DilateStep(Step):
+
+    def run(self, src):
+        kernel, anchor, iterations, border_type, border_value = self.params
+        return cv2.dilate(src, kernel, self.buffer("dst", src.shape), anchor, iterations=(int)(iterations + 0.5),
+                          borderType=border_type, borderValue=border_value)
+
+
+class MaskStep(Step):
+
+    def run(self, input, mask):
+        dst = self.buffer("dst", input.shape)
+        dst.fill(0)
+        return cv2.bitwise_and(input, input, dst=dst, mask=mask)
+
+
+class MorphologyStep(Step):
+    """
+    A chain of ErodeSteps and DilateSteps compiled into one MorphologyPlan.
+    """
+
+    def __init__(self, chain):
+        Step.__init__(self, tuple((ERODE if isinstance(step, ErodeStep) else DILATE,) + tuple(step.params) for step in chain))
+        self.name = "+".join(step.name for step in chain)
+        self.plan = MorphologyPlan(list(self.params))
+
+    def run(self, src):
+        return self.plan.run(src, self.buffer("dst", src.shape), self.buffer("scratch", src.shape))
+
+
+class FindContoursStep(Step):
+
+    def run(self, input):
+        (external_only,) = self.params
+        mode = cv2.RETR_EXTERNAL if external_only else cv2.RETR_LIST
+        im2, contours, hierarchy = cv2.findContours(input, mode=mode, method=cv2.CHAIN_APPROX_SIMPLE)
+        return contours
+
+
+class FilterContoursStep(Step):
+
+    def __init__(self, params):
+        Step.__init__(self, params)
+        self.fast = False
+
+    def run(self, input_contours):
+        if self.fast:
+            return filterContoursFast(input_contours, *self.params)
+        return filterContours(input_contours, *self.params)
+
+
+class CannyStep(Step):
+
+    def run(self, image):
+        thres1, thres2, aperture_size, gradient = self.params
+        return cv2.Canny(image, thres1, thres2, self.buffer("dst", image.shape), apertureSize=(int)(aperture_size),
+                         L2gradient=gradient)
+
+
+# step name -> (class, number of image inputs, function turning the remaining socket values into params)
+STEP_TYPES = {
+    "HSV Threshold": (HsvThresholdStep, 1, lambda v: (v[1], v[2], v[3])),
+    "CV erode": (ErodeStep, 1, lambda v: (v[1], _default(v[2], (-1, -1)), v[3], _border(v[4]), _default(v[5], -1))),
+    "CV dilate": (DilateStep, 1, lambda v: (v[1], _default(v[2], (-1, -1)), v[3], _border(v[4]), _default(v[5], -1))),
+    "Mask": (MaskStep, 2, lambda v: ()),
+    "Find Contours": (FindContoursStep, 1, lambda v: (bool(v[1]),)),
+    "Filter Contours": (FilterContoursStep, 1, lambda v: tuple(v[1:12])),
+    "CV Canny": (CannyStep, 1, lambda v: (v[1], v[2], v[3], bool(v[4]))),
+}
+
+
+def _default(value, default):
+    return default if value is None else value
+
+
+def _border(value):
+    return getattr(cv2, value) if value is not None else cv2.BORDER_CONSTANT
+
+
+def _parseValue(element):
+    """Turn a GRIP <value> element into a Python value."""
+    if element is None:
+        return None
+    children = list(element)
+    if children:
+        return [int(c.text) if c.tag == "int" else float(c.text) for c in children]
+    text = (element.text or "").strip()
+    if text in ("true", "false"):
+        return text == "true"
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _outputName(name, used):
+    """GRIP's generated attribute name for a step output, e.g. "CV erode" -> "cv_erode_output"."""
+    base = name.lower().replace(" ", "_")
+    output = base + "_output"
+    n = 1
+    while output in used:
+        output = "{}{}_output".format(base, n)
+        n += 1
+    used.add(output)
+    return output
+
+
+def parseGrip(path):
+    """Parse a .grip file.
+    Returns:
+        A list of (step name, output name, socket values, {socket: ("source", n) or ("step", n)})
+        in file order.
+    """
+    with open(path, "rt", encoding="utf-8") as f:
+        # GRIP never declares its "grip:" namespace, drop the prefix so the XML parses
+        root = ElementTree.fromstring(re.sub(r"(</?)grip:", r"\1", f.read()))
+    steps = []
+    used = set()
+    for element in root.find("steps"):
+        name = element.get("name")
+        values = {}
+        for socket in element.findall("Input"):
+            values[int(socket.get("socket"))] = _parseValue(socket.find("value"))
+        count = max(values) + 1 if values else 0
+        steps.append((name, _outputName(name, used), [values.get(i) for i in range(count)], {}))
+
+    connections = root.find("connections")
+    for connection in connections if connections is not None else []:
+        output = connection.find("Output")
+        input = connection.find("Input")
+        if output.get("source") is not None:
+            origin = ("source", int(output.get("source")))
+        else:
+            origin = ("step", int(output.get("step")))
+        steps[int(input.get("step"))][3][int(input.get("socket"))] = origin
+    return steps
+
+
+class GripPipeline:
+    """
+    The outputs of one .grip file, filled in by GripEngine.process().
+
+    Stands in for a GRIP generated class: when made on its own it owns an
+    engine and process() runs it.
+    """
+
+    def __init__(self, path=None, outputs=DEFAULT_OUTPUTS):
+        self.path = path
+        self.outputs = outputs
+        for output in outputs:
+            setattr(self, output, None)
+        self.__engine = None
+        if path is not None:
+            self.__engine = GripEngine()
+            self.__engine.addPipeline(path, outputs, self)
+
+    def process(self, source0):
+        """
+        Runs the pipeline and sets all requested outputs to new values.
+        """
+        self.__engine.process(source0)
+
+    def useLookupTable(self, bits=8):
+        self.__engine.useLookupTable(bits)
+
+    def useYuyvLookupTable(self):
+        self.__engine.useYuyvLookupTable()
+
+    def useFastFilter(self):
+        self.__engine.useFastFilter()
+
+    def useMorphologyPlan(self):
+        self.__engine.useMorphologyPlan()
+
+    def useProfiler(self, profiler, name="Grip"):
+        self.__engine.useProfiler(profiler, name)
+
+    def threshold(self, source0, hsv=None, dst=None):
+        """Runs only the first HSV threshold step."""
+        return self.__engine.steps(HsvThresholdStep)[0].threshold(source0, hsv, dst)
+
+    def minArea(self):
+        """The smallest contour area the filter step keeps."""
+        return self.__engine.steps(FilterContoursStep)[0].params[0]
+
+
+class GripEngine:
+    """
+    Runs any number of .grip files fed by the same frame as one optimised step graph.
+    """
+
+    def __init__(self):
+        self.__nodes = []      # (step, input node indexes), source is -1
+        self.__keys = {}       # (step key, inputs) -> node index
+        self.__pipelines = []  # (GripPipeline, {output name: node index})
+        self.__plan = None     # (node index, step, input node indexes) in run order
+        self.__morphology = False
+        self.__profiler = None
+        self.__profiler_name = None
+        self.__profiler_stages = None
+
+    def addPipeline(self, path, outputs=DEFAULT_OUTPUTS, pipeline=None):
+        """Add a .grip file to the graph.
+        Args:
+            path: The .grip file.
+            outputs: Output attribute names that are needed, everything else is dropped.
+            pipeline: The GripPipeline to fill in, a new one if None.
+        Returns:
+            The GripPipeline whose attributes are set by process().
+        """
+        if pipeline is None:
+            pipeline = GripPipeline(outputs=outputs)
+        steps = parseGrip(path)
+        node_of_step = {}
+
+        def resolve(index):
+            if index in node_of_step:
+                return node_of_step[index]
+            name, output, values, connections = steps[index]
+            if name not in STEP_TYPES:
+                raise ValueError("{}: unsupported GRIP step '{}'".format(path, name))
+            step_class, image_inputs, params = STEP_TYPES[name]
+            inputs = []
+            for socket in range(image_inputs):
+                origin = connections.get(socket)
+                if origin is None:
+                    raise ValueError("{}: step '{}' input {} is not connected".format(path, name, socket))
+                inputs.append(-1 if origin[0] == "source" else resolve(origin[1]))
+            step = step_class(params(values))
+            # the name the generated code gives the step, e.g. "CV_erode0"
+            step.name = "{}{}".format(name.replace(" ", "_"), sum(1 for other in steps[:index] if other[0] == name))
+            key = (step.key(), tuple(inputs))
+            if key not in self.__keys:
+                self.__keys[key] = len(self.__nodes)
+                self.__nodes.append((step, tuple(inputs)))
+            node_of_step[index] = self.__keys[key]
+            return node_of_step[index]
+
+        wanted = {}
+        for index, (name, output, values, connections) in enumerate(steps):
+            if output in outputs and name not in IGNORED_STEPS:
+                wanted[output] = resolve(index)
+        missing = set(outputs) - set(wanted)
+        if missing:
+            raise ValueError("{}: no step produces {}".format(path, ", ".join(sorted(missing))))
+
+        self.__pipelines.append((pipeline, wanted))
+        self.__plan = None
+        return pipeline
+
+    def process(self, source0):
+        """Run every live step once on a frame and fill in all pipelines' outputs."""
+        if self.__plan is None:
+            self.__compile()
+        values = [None] * len(self.__nodes)
+        profiler = self.__profiler
+        if profiler is not None:
+            start = perf_counter_ns()
+        for position, (index, step, inputs) in enumerate(self.__plan):
+            values[index] = step.run(*[source0 if i < 0 else values[i] for i in inputs])
+            if profiler is not None:
+                start = profiler.lap(self.__profiler_stages[position], start)
+        for pipeline, wanted in self.__pipelines:
+            for output, index in wanted.items():
+                setattr(pipeline, output, values[index])
+
+    def useLookupTable(self, bits=8):
+        """Threshold every HSV step through a precomputed HsvLookupTable."""
+        for step in self.steps(HsvThresholdStep):
+            step.lut = HsvLookupTable(step.params[0], step.params[1], step.params[2], bits)
+
+    def useYuyvLookupTable(self):
+        """Take packed YUYV frames and threshold every HSV step through a YuyvLookupTable."""
+        for step in self.steps(HsvThresholdStep):
+            step.lut = YuyvLookupTable(step.params[0], step.params[1], step.params[2])
+
+    def useFastFilter(self):
+        """Filter contours with filterContoursFast, which keeps the same contours."""
+        for step in self.steps(FilterContoursStep):
+            step.fast = True
+
+    def useMorphologyPlan(self):
+        """Run each chain of erode and dilate steps as one MorphologyStep, which gives the same output."""
+        self.__morphology = True
+        self.__plan = None
+
+    def useProfiler(self, profiler, name="Grip"):
+        """Time every live step with a profiler.StageProfiler, as stages "<name>/<step>"."""
+        self.__profiler = profiler
+        self.__profiler_name = name
+        self.__plan = None
+
+    def steps(self, step_class):
+        """Live steps of a type, in run order."""
+        if self.__plan is None:
+            self.__compile()
+        return [step for index, step, inputs in self.__plan if isinstance(step, step_class)]
+
+    def stepCount(self):
+        """Number of steps that actually run per frame."""
+        if self.__plan is None:
+            self.__compile()
+        return len(self.__plan)
+
+    def __compile(self):
+        """Order the nodes any wanted output depends on. Nodes were created inputs first."""
+        outputs = set(index for pipeline, wanted in self.__pipelines for index in wanted.values())
+        live = set()
+        stack = list(outputs)
+        while stack:
+            index = stack.pop()
+            if index < 0 or index in live:
+                continue
+            live.add(index)
+            stack.extend(self.__nodes[index][1])
+        live = sorted(live)
+
+        # erode/dilate chains by the node ending them, a node only continues a chain it alone reads
+        chains = {}
+        if self.__morphology:
+            readers = {}
+            for index in live:
+                for i in self.__nodes[index][1]:
+                    readers[i] = readers.get(i, 0) + 1
+            for index in live:
+                step, inputs = self.__nodes[index]
+                if not isinstance(step, (ErodeStep, DilateStep)):
+                    continue
+                source = inputs[0]
+                if source in chains and readers[source] == 1 and source not in outputs:
+                    chains[index] = chains.pop(source) + [index]
+                else:
+                    chains[index] = [index]
+        in_chain = set(i for chain in chains.values() for i in chain)
+
+        self.__plan = []
+        for index in live:
+            step, inputs = self.__nodes[index]
+            if index in chains:
+                chain = chains[index]
+                self.__plan.append((index, MorphologyStep([self.__nodes[i][0] for i in chain]), self.__nodes[chain[0]][1]))
+            elif index not in in_chain:
+                self.__plan.append((index, step, inputs))
+        if self.__profiler_name is not None:
+            self.__profiler_stages = [self.__profiler_name + "/" + step.name for index, step, inputs in self.__plan]
+
+
+def gripPath(name):
+    """Path of a .grip file that ships next to this module."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
@@ -0,0 +1,199 @@
+import hashlib
+import os
+import sys
+
+import cv2
+import numpy
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "frc4639-vision")
+
+
+def buildTable(hue, sat, val, bits):
+    """Run every quantized BGR colour through cvtColor + inRange once.
+    Args:
+        hue: A list of two numbers the are the min and max hue.
+        sat: A list of two numbers the are the min and max saturation.
+        val: A list of two numbers the are the min and max value.
+        bits: Bits kept per channel, 1 to 8.
+    Returns:
+        A flat uint8 numpy.ndarray of 0/255, indexed by the quantized B, G, R, 0
+        bytes of a pixel read as one native uint32.
+    """
+    levels = 1 << bits
+    shift = 8 - bits
+    q = numpy.arange(levels, dtype=numpy.uint8)
+    b, g, r = numpy.meshgrid(q, q, q, indexing="ij")
+    packed = numpy.zeros((levels ** 3, 1, 4), dtype=numpy.uint8)
+    packed[:, 0, 0] = b.ravel()
+    packed[:, 0, 1] = g.ravel()
+    packed[:, 0, 2] = r.ravel()
+    index = packed.view(numpy.uint32).ravel()
+
+    # threshold the centre of each quantization bin
+    colours = numpy.ascontiguousarray(packed[:, :, :3] << shift) + ((1 << shift) >> 1)
+    hsv = cv2.cvtColor(colours, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, (hue[0], sat[0], val[0]), (hue[1], sat[1], val[1])).ravel()
+
+    table = numpy.zeros(int(index.max()) + 1, dtype=numpy.uint8)
+    table[index] = mask
+    return table
+
+
+def buildYuyvTable(hue, sat, val):
+    """Run every YUV colour through the YUYV to BGR decode, cvtColor and inRange once.
+    Args:
+        hue, sat, val: The same as buildTable.
+    Returns:
+        A flat uint8 numpy.ndarray of 0/255 with 2**24 entries, indexed by
+        U + (Y << 8) + (V << 16).
+    """
+    table = numpy.empty(1 << 24, dtype=numpy.uint8)
+    u, y = numpy.meshgrid(numpy.arange(256, dtype=numpy.uint8), numpy.arange(256, dtype=numpy.uint8))
+    # each colour as a pair of equal pixels, Y U Y V, decoded the way cscore decodes YUYV
+    pairs = numpy.empty((1 << 16, 2, 2), dtype=numpy.uint8)
+    pairs[:, 0, 0] = pairs[:, 1, 0] = y.ravel()
+    pairs[:, 0, 1] = u.ravel()
+    # one V at a time keeps the temporaries small
+    for v in range(256):
+        pairs[:, 1, 1] = v
+        bgr = cv2.cvtColor(pairs, cv2.COLOR_YUV2BGR_YUYV)
+        hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+        table[v << 16:(v + 1) << 16] = cv2.inRange(hsv, (hue[0], sat[0], val[0]), (hue[1], sat[1], val[1]))[:, 0]
+    return table
+
+
+def loadTable(hue, sat, val, bits, cache_dir=DEFAULT_CACHE_DIR, yuyv=False):
+    """Load the table for these thresholds from the cache, building and saving it if missing."""
+    key = hashlib.sha1(repr((list(hue), list(sat), list(val), bits, sys.byteorder)).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, "{}_lut_{}_{}.npy".format("yuyv" if yuyv else "hsv", bits, key))
+    try:
+        return numpy.load(path)
+    except (OSError, ValueError):
+        pass
+
+    table = buildYuyvTable(hue, sat, val) if yuyv else buildTable(hue, sat, val, bits)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        numpy.save(path, table)
+    except OSError as err:
+        print("could not cache threshold table '{}': {}".format(path, err), file=sys.stderr)
+    return table
+
+
+def _take(table, index, dst, scratch):
+    """table[index] into dst without a temporary, through scratch if dst is a window of a bigger buffer."""
+    out = dst if dst.flags.c_contiguous else scratch
+    # every index is in the table, and only with a mode other than "raise" does take() write to out directly
+    numpy.take(table, index, out=out, mode="clip")
+    if out is not dst:
+        numpy.copyto(dst, out)
+    return dst
+
+
+class HsvLookupTable:
+    """
+    Thresholds a BGR image through a precomputed colour table instead of cvtColor + inRange.
+
+    The thresholds are baked into the table, so make a new one if they change.
+    With 8 bits per channel the mask is identical to cvtColor + inRange, fewer
+    bits trade a little accuracy at the threshold edges for a smaller table.
+    """
+
+    def __init__(self, hue, sat, val, bits=8, cache_dir=DEFAULT_CACHE_DIR):
+        self.bits = bits
+        self.table = loadTable(hue, sat, val, bits, cache_dir)
+        self.__packed = None
+        self.__index = None
+        self.__mask = None
+
+    def apply(self, input, dst=None):
+        """Threshold a BGR image.
+        Args:
+            input: A BGR numpy.ndarray.
+            dst: Optional single channel numpy.ndarray to hold the output.
+        Returns:
+            A black and white numpy.ndarray.
+        """
+        height, width = input.shape[:2]
+        size = height * width
+        # flat and only ever grown, a region of interest of another size each frame reuses them
+        if self.__packed is None or self.__index.size < size:
+            # the fourth byte is never written, so it stays 0
+            self.__packed = numpy.zeros(size * 4, dtype=numpy.uint8)
+            self.__index = numpy.empty(size, dtype=numpy.intp)
+            self.__mask = numpy.empty(size, dtype=numpy.uint8)
+        packed = self.__packed[:size * 4].reshape(height, width, 4)
+        index = self.__index[:size].reshape(height, width)
+        if dst is None:
+            dst = numpy.empty((height, width), dtype=numpy.uint8)
+
+        cv2.mixChannels([input], [packed], [0, 0, 1, 1, 2, 2])
+        if self.bits < 8:
+            numpy.right_shift(packed, 8 - self.bits, out=packed)
+        numpy.copyto(index, packed.view(numpy.uint32).reshape(height, width))
+        return _take(self.table, index, dst, self.__mask[:size].reshape(height, width))
+
+
+class YuyvLookupTable:
+    """
+    Thresholds a packed YUYV image through a precomputed table, without decoding it to BGR.
+
+    Images are (height, width, 2) arrays of Y and alternating U/V bytes, the
+    layout of a YUYV camera buffer, with an even width. The table covers every
+    YUV colour, so the mask is exactly the one cvtColor + inRange give on the
+    BGR image cscore would have decoded from the same frame.
+    """
+
+    def __init__(self, hue, sat, val, cache_dir=DEFAULT_CACHE_DIR):
+        self.table = loadTable(hue, sat, val, 8, cache_dir, yuyv=True)
+        self.__input = None
+        self.__odd = None
+        self.__even = None
+        self.__low = None
+        self.__index = None
+        self.__mask = None
+
+    def apply(self, input, dst=None):
+        """Threshold a YUYV image.
+        Args:
+            input: A (height, width, 2) YUYV numpy.ndarray.
+            dst: Optional single channel numpy.ndarray to hold the output.
+        Returns:
+            A black and white numpy.ndarray.
+        """
+        height, width = input.shape[:2]
+        pairs = width // 2
+        size = height * pairs
+        # flat and only ever grown, a region of interest of another size each frame reuses them
+        if self.__index is None or self.__odd.size < size:
+            self.__input = numpy.empty(size * 4, dtype=numpy.uint8)
+            self.__odd = numpy.empty(size, dtype=numpy.uint32)
+            self.__even = numpy.empty(size, dtype=numpy.uint32)
+            self.__low = numpy.empty(size, dtype=numpy.uint32)
+            self.__index = numpy.empty(size * 2, dtype=numpy.intp)
+            self.__mask = numpy.empty(size * 2, dtype=numpy.uint8)
+        odd = self.__odd[:size].reshape(height, pairs)
+        even = self.__even[:size].reshape(height, pairs)
+        low = self.__low[:size].reshape(height, pairs)
+        index = self.__index[:size * 2].reshape(height, pairs, 2)
+        if dst is None:
+            dst = numpy.empty((height, width), dtype=numpy.uint8)
+
+        if not input.flags.c_contiguous:
+            # a window of a frame, its rows are copied together to be read as words
+            contiguous = self.__input[:size * 4].reshape(height, width, 2)
+            numpy.copyto(contiguous, input)
+            input = contiguous
+        # each pixel pair Y0 U Y1 V as one little endian word
+        words = input.reshape(height, pairs, 4).view("<u4").reshape(height, pairs)
+        # U + (Y1 << 8) + (V << 16) is the word shifted down a byte
+        numpy.right_shift(words, 8, out=odd)
+        # U + (Y0 << 8) + (V << 16) takes Y0 from the bottom byte instead
+        numpy.bitwise_and(odd, 0xFF00FF, out=even)
+        numpy.bitwise_and(words, 0xFF, out=low)
+        numpy.left_shift(low, 8, out=low)
+        numpy.bitwise_or(even, low, out=even)
+        index[:, :, 0] = even
+        index[:, :, 1] = odd
+        return _take(self.table, index.reshape(height, width), dst, self.__mask[:height * width].reshape(height, width))
@@ -0,0 +1,98 @@
+"""
+Capture timestamps and capture-to-publish latency.
+
+cscore stamps every frame in microseconds on its own clock, the robot stamps
+everything on its FPGA clock and neither is the clock Python runs on. Each
+ClockOffset learns the offset between one of those clocks and time.monotonic()
+from pairs of readings: the smallest difference seen recently is the offset
+plus the quickest the other clock's readings ever reach us, so converted times
+are off by a few milliseconds at most and never lie in the future.
+"""
+
+import collections
+import time
+
+import numpy
+
+
+# the robot puts Timer.getFPGATimestamp() here, in seconds, so results can carry robot time
+ROBOT_TIME_KEY = 'Robot Time'
+
+PERCENTILES = (50, 95, 99)
+
+
+def now():
+    """Local time in seconds, the clock every capture time is converted to first."""
+    return time.monotonic()
+
+
+class ClockOffset:
+    """
+    Offset between another clock and now(), learnt from (their time, now() when it was read) pairs.
+    """
+
+    def __init__(self, window=256):
+        """
+        Args:
+            window: Number of recent pairs the offset is taken from, so it follows slow drift.
+        """
+        self.__differences = collections.deque(maxlen=window)
+        self.offset = None
+
+    def update(self, theirs, ours):
+        """Add a reading of the other clock, both times in seconds. Call from one thread only."""
+        self.__differences.append(ours - theirs)
+        self.offset = min(self.__differences)
+
+    def known(self):
+        return self.offset is not None
+
+    def toOurs(self, theirs):
+        """Their time in seconds as now() time, or None before the first update."""
+        offset = self.offset
+        return None if offset is None else theirs + offset
+
+    def toTheirs(self, ours):
+        """now() time in seconds as their time, or None before the first update."""
+        offset = self.offset
+        return None if offset is None else ours - offset
+
+
+class LatencyHistogram:
+    """
+    The last few hundred capture-to-publish latencies of one camera, for p50/p95/p99.
+    """
+
+    def __init__(self, name, size=512):
+        """
+        Args:
+            name: Camera name, used in the table keys.
+            size: Number of latencies kept.
+        """
+        self.name = name
+        self.count = 0
+        self.__samples = numpy.zeros(size, dtype=numpy.float64)
+
+    def add(self, latency):
+        """Add a latency in milliseconds."""
+        self.__samples[self.count % len(self.__samples)] = latency
+        self.count += 1
+
+    def percentiles(self):
+        """p50, p95 and p99 in milliseconds, -1 before the first latency."""
+        if self.count == 0:
+            return [-1.0] * len(PERCENTILES)
+        return list(numpy.percentile(self.__samples[:min(self.count, len(self.__samples))], PERCENTILES))
+
+    def publish(self, table):
+        """Put the percentiles into a NetworkTables table."""
+        for percentile, value in zip(PERCENTILES, self.percentiles()):
+            table.putNumber('Latency p{} {}'.format(percentile, self.name), value)
+
+
+def listenForRobotTime(table, clock):
+    """Feed every ROBOT_TIME_KEY update the robot puts into table to a ClockOffset."""
+    def listener(source, key, value, isNew):
+        clock.update(value, now())
+
+    table.addEntryListener(listener, immediateNotify=False, key=ROBOT_TIME_KEY, localNotify=False)
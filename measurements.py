@@ -0,0 +1,115 @@
+"""
+Target measurements for a whole list of contours at once.
+
+All contour points are packed into one array and every contour's extents,
+extreme points, slope, angle, centre and distance come out of NumPy
+reductions over it, one row per contour in a structured array.
+"""
+
+import numpy
+
+
+MEASUREMENT_DTYPE = numpy.dtype([
+    ("x_min", numpy.int32), ("x_max", numpy.int32),
+    ("y_min", numpy.int32), ("y_max", numpy.int32),
+    # leftmost point (first in the contour) and rightmost point (last in the contour)
+    ("left_x", numpy.int32), ("left_y", numpy.int32),
+    ("right_x", numpy.int32), ("right_y", numpy.int32),
+    ("width", numpy.int32),
+    ("slope", numpy.float64), ("angle", numpy.float64),
+    ("center_x", numpy.float64), ("center_y", numpy.float64),
+    ("distance", numpy.float64),
+])
+
+GREEN_REAL_WIDTH = 39  # in
+YELLOW_REAL_WIDTH = 7  # in
+
+
+#Distance function
+
+def distance_to_camera(Width, perceivedWidth):
+
+    #Find focal distance
+    Control_Distance = 69
+    Control_Width_pixels = 57
+    Control_Width_in = 7
+    focalLength = (Control_Width_pixels * Control_Distance) / Control_Width_in
+
+    return (Width * focalLength) / perceivedWidth
+
+
+def angleFinder(slope):
+
+    control_angle = 45 #deg
+    control_slope =.36
+    angle = (control_angle * slope)/control_slope
+
+    return angle
+
+
+def measureGreen(contours):
+    """Measure green tape contours: centre of the line between the extreme points, distance corrected for angle.
+    Args:
+        contours: Contours as a list of numpy.ndarray.
+    Returns:
+        A numpy structured array of MEASUREMENT_DTYPE, one row per contour.
+    """
+    results, x, y, counts, starts = _measure(contours)
+    if len(results) == 0:
+        return results
+
+    # argmin / argmax per contour: first point on the left edge and last point on the right edge,
+    # the points a stable sort by x puts first and last
+    index = numpy.arange(len(x))
+    left = numpy.minimum.reduceat(numpy.where(x == numpy.repeat(results["x_min"], counts), index, len(x)), starts)
+    right = numpy.maximum.reduceat(numpy.where(x == numpy.repeat(results["x_max"], counts), index, -1), starts)
+    left_x = results["left_x"] = x[left]
+    left_y = results["left_y"] = y[left]
+    right_x = results["right_x"] = x[right]
+    right_y = results["right_y"] = y[right]
+
+    results["slope"] = (left_y - right_y) / (left_x - right_x)
+    angle = results["angle"] = angleFinder(results["slope"])
+
+    # halves of pixel coordinates are exact, so this is the midpoint whichever end is higher
+    results["center_x"] = ((right_x - left_x) / 2) + left_x
+    results["center_y"] = ((right_y - left_y) / 2) + left_y
+    results["distance"] = distance_to_camera(GREEN_REAL_WIDTH, results["width"]) - (0.0111 * (angle * angle)) + (0.0809 * angle)
+    return results
+
+
+def measureYellow(contours):
+    """Measure yellow ball contours: centre of the bounding box, distance from the width.
+    The extreme points, slope and angle are left at 0.
+    """
+    results, x, y, counts, starts = _measure(contours)
+    x_min = results["x_min"]
+    y_min = results["y_min"]
+
+    results["center_x"] = ((results["x_max"] - x_min) / 2) + x_min
+    results["center_y"] = ((results["y_max"] - y_min) / 2) + y_min
+    results["distance"] = distance_to_camera(YELLOW_REAL_WIDTH, results["width"])
+    return results
+
+
+def _measure(contours):
+    """Pack the contour points and fill in the extents and width.
+    Returns:
+        (results, x, y, points per contour, index of each contour's first point)
+    """
+    results = numpy.zeros(len(contours), dtype=MEASUREMENT_DTYPE)
+    if len(contours) == 0:
+        empty = numpy.empty(0, dtype=numpy.intp)
+        return results, empty, empty, empty, empty
+    counts = numpy.fromiter((len(contour) for contour in contours), dtype=numpy.intp, count=len(contours))
+    starts = numpy.cumsum(counts) - counts
+    points = numpy.concatenate(contours).reshape(-1, 2)
+
+    low = numpy.minimum.reduceat(points, starts)
+    high = numpy.maximum.reduceat(points, starts)
+    results["x_min"] = low[:, 0]
+    results["y_min"] = low[:, 1]
+    results["x_max"] = high[:, 0]
+    results["y_max"] = high[:, 1]
+    results["width"] = high[:, 0] - low[:, 0]
+    return results, points[:, 0], points[:, 1], counts, starts
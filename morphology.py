@@ -0,0 +1,147 @@
+"""
+Chains of GRIP erode and dilate steps compiled into the fewest OpenCV calls, with the same output.
+
+GRIP gives every erode and dilate its own call. A plan drops steps with
+zero iterations, folds the iterations of a 3x3 (or any full rectangular)
+kernel into one kernel of size 2n+1, merges neighbouring steps of the same
+kind and turns an erode followed by a dilate of the same size into one
+morphologyEx open (a dilate then an erode into a close). OpenCV already
+runs a full rectangular kernel as a row pass and a column pass.
+
+Masks are mostly black, so a plan also runs only on the bounding box of the
+white pixels, grown by the radius of every step together, and leaves the
+rest of the output black. That is exact because with GRIP's default border
+the pixels outside the box are black before and after every step. An empty
+mask costs a bounding box and a fill.
+"""
+
+import cv2
+import numpy
+
+
+ERODE = cv2.MORPH_ERODE
+DILATE = cv2.MORPH_DILATE
+
+
+def rectRadius(kernel, anchor, iterations):
+    """(x, y) radius the iterations of a kernel add up to, or None if it is not a centred full rectangle."""
+    if kernel is None:
+        # GRIP's default, OpenCV takes it as a 3x3 square
+        return (iterations, iterations)
+    kernel = numpy.asarray(kernel)
+    if kernel.ndim != 2:
+        return None
+    height, width = kernel.shape
+    if height % 2 == 0 or width % 2 == 0 or not kernel.all():
+        return None
+    if tuple(anchor) not in ((-1, -1), (width // 2, height // 2)):
+        return None
+    return (iterations * (width // 2), iterations * (height // 2))
+
+
+class MorphologyPlan:
+    """
+    Runs a chain of erode/dilate steps as a short list of OpenCV calls on the area that can change.
+    """
+
+    def __init__(self, steps):
+        """Compile a chain.
+        Args:
+            steps: (operation, kernel, anchor, iterations, border type, border value) per step,
+                operation ERODE or DILATE, the rest as GRIP passes them to cv2.erode/dilate.
+        """
+        self.steps = steps
+        # (operation, kernel, anchor, iterations, border type, border value), operation may be an open or a close
+        self.calls = []
+        # pixels the output can differ from the input around the white ones, None if the plan cannot crop
+        self.margin = 0
+
+        simple = []
+        for operation, kernel, anchor, iterations, border_type, border_value in steps:
+            iterations = (int)(iterations + 0.5)
+            if iterations <= 0:
+                continue
+            radius = None
+            if border_type == cv2.BORDER_CONSTANT and border_value == -1:
+                radius = rectRadius(kernel, anchor, iterations)
+            if radius is None:
+                self.margin = None
+                simple.append((operation, None, (kernel, anchor, iterations, border_type, border_value)))
+            elif simple and simple[-1][0] == operation and simple[-1][1] is not None:
+                # consecutive rectangles of the same kind add up
+                previous = simple[-1][1]
+                simple[-1] = (operation, (previous[0] + radius[0], previous[1] + radius[1]), None)
+            else:
+                simple.append((operation, radius, None))
+
+        i = 0
+        while i < len(simple):
+            operation, radius, original = simple[i]
+            if radius is None:
+                self.calls.append((operation,) + original)
+                i += 1
+                continue
+            if self.margin is not None:
+                self.margin += max(radius)
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * radius[0] + 1, 2 * radius[1] + 1))
+            after = simple[i + 1] if i + 1 < len(simple) else None
+            if after is not None and after[1] == radius and after[0] != operation:
+                if self.margin is not None:
+                    self.margin += max(radius)
+                combined = cv2.MORPH_OPEN if operation == ERODE else cv2.MORPH_CLOSE
+                self.calls.append((combined, kernel, (-1, -1), 1, cv2.BORDER_CONSTANT, -1))
+                i += 2
+            else:
+                self.calls.append((operation, kernel, (-1, -1), 1, cv2.BORDER_CONSTANT, -1))
+                i += 1
+
+    def run(self, src, dst, scratch):
+        """Run the chain on a single channel image.
+        Args:
+            src: A numpy.ndarray, not written to.
+            dst: A numpy.ndarray of the same shape to hold the output.
+            scratch: A numpy.ndarray of the same shape for the steps in between.
+        Returns:
+            dst.
+        """
+        if not self.calls:
+            numpy.copyto(dst, src)
+            return dst
+        if self.margin is not None and src.ndim == 2:
+            x, y, width, height = cv2.boundingRect(src)
+            if width == 0:
+                dst.fill(0)
+                return dst
+            margin = self.margin
+            left = max(0, x - margin)
+            top = max(0, y - margin)
+            right = min(src.shape[1], x + width + margin)
+            bottom = min(src.shape[0], y + height + margin)
+            if right - left < src.shape[1] or bottom - top < src.shape[0]:
+                dst.fill(0)
+                self.__runCalls(src[top:bottom, left:right], dst[top:bottom, left:right], scratch[top:bottom, left:right])
+                return dst
+        self.__runCalls(src, dst, scratch)
+        return dst
+
+    def __runCalls(self, src, dst, scratch):
+        # the calls alternate between the buffers so that the last one lands in dst
+        out = dst if len(self.calls) % 2 == 1 else scratch
+        for operation, kernel, anchor, iterations, border_type, border_value in self.calls:
+            if operation == ERODE:
+                cv2.erode(src, kernel, out, anchor, iterations=iterations, borderType=border_type, borderValue=border_value)
+            elif operation == DILATE:
+                cv2.dilate(src, kernel, out, anchor, iterations=iterations, borderType=border_type, borderValue=border_value)
+            else:
+                cv2.morphologyEx(src, operation, kernel, out, anchor, iterations, border_type, border_value)
+            src = out
+            out = scratch if out is dst else dst
+
+    def describe(self):
+        """The compiled calls, e.g. "open 7x7", for reports."""
+        names = {ERODE: "erode", DILATE: "dilate", cv2.MORPH_OPEN: "open", cv2.MORPH_CLOSE: "close"}
+        calls = []
+        for operation, kernel, anchor, iterations, border_type, border_value in self.calls:
+            size = "3x3" if kernel is None else "{}x{}".format(kernel.shape[1], kernel.shape[0])
+            calls.append("{} {}{}".format(names[operation], size, "" if iterations == 1 else " x{}".format(iterations)))
+        return ", ".join(calls) if calls else "copy"
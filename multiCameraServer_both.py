@@ -7,10 +7,17 @@
 #----------------------------------------------------------------------------
 
 import json
+import os
 import time
 import sys
+import threading
+import signal
+from time import perf_counter_ns
 
-from cscore import CameraServer, VideoSource, UsbCamera, MjpegServer, CvSink
+# everything below is timed as the "imports" phase of startup
+importStart = time.monotonic()
+
+from cscore import CameraServer, VideoSource, VideoMode, UsbCamera, MjpegServer, CvSink, CvSource
 from networktables import NetworkTablesInstance
 import ntcore
 import cv2
@@ -20,12 +27,49 @@ import math
 
 from reflective_tape_new import GripPipelineGreen
 from yellow_ball_test import GripPipelineYellow
+from target_values import getValuesGreen, getValuesYellow
+from result_publisher import ResultPublisher
+from latency import ClockOffset, listenForRobotTime, now
+from profiler import StageProfiler, PERF_TABLE
+from frame_recorder import FrameRecorder, ReplaySink, ringPath
+from rate_control import RateController, rateModes
+from ball_tracker import BallTracker
+from frame_grabber import FrameGrabber, publishFrameCounts
+from grip_engine import GripPipeline, gripPath
+from roi_tracking import RoiTracker
+from coarse_to_fine import CoarseToFine
+from pipeline_pool import PipelinePool, RecordingTable, RECORD_HEADER, GREEN_KEYS, YELLOW_KEYS
+from startup import StartupTimer, processStartTime, warmPipeline
+from camera_worker import CameraWorker
+from dashboard_stream import DashboardStream
+
+importEnd = time.monotonic()
 
 
 #   JSON format:
 #   {
 #       "team": <team number>,
 #       "ntmode": <"client" or "server", "client" if unspecified>
+#       "process pool": <true to run each pipeline in its own process> // optional
+#       "threshold lut bits": <threshold through a lookup table, 5 to 8> // optional
+#       "roi tracking": <true to track the green target in a window> // optional
+#       "coarse to fine": <true to look for yellow balls on a small copy first> // optional
+#       "grip engine": <true to run the .grip files instead of the generated classes> // optional
+#       "fast filter": <true to run the cheap contour filter tests on all contours at once> // optional
+#       "morphology plan": <true to run each erode/dilate chain as the fewest OpenCV calls on the area that can change> // optional
+#       "result epsilon": <smallest change of a result that is published, 0.001 if unspecified> // optional
+#       "stamp ms": <longest the frame stamps go unpublished while no result changes, 100 if unspecified> // optional
+#       "individual keys": <false to publish only the "Vision Result" array, true if unspecified> // optional
+#       "stream kbps": <kilobits per second the dashboard stream may use, no limit if unspecified> // optional
+#       "profiling": <true to time every stage, see Vision/Perf or send SIGUSR1> // optional
+#       "record": <directory to record every camera's raw frames to> // optional
+#       "record frames": <frames kept per camera, 300 if unspecified> // optional
+#       "replay": <directory of recordings to run instead of the cameras> // optional
+#       "replay speed": <"original" or "max", "original" if unspecified> // optional
+#       "adaptive rate": <true to lower camera fps while frames are being dropped> // optional
+#       "ball tracking": <true to track yellow balls across frames, not with the process pool> // optional
+#       "yellow every": <run the yellow pipeline on every n-th frame and predict the rest, 1 if unspecified> // optional
+#       "raw yuyv": <true to threshold YUYV Green/Yellow frames without decoding them, not with the process pool> // optional
 #       "cameras": [
 #           {
 #               "name": <camera name>
@@ -37,6 +81,8 @@ from yellow_ball_test import GripPipelineYellow
 #               "brightness": <percentage brightness>    // optional
 #               "white balance": <"auto", "hold", value> // optional
 #               "exposure": <"auto", "hold", value>      // optional
+#               "pipeline": <"green", "yellow" or "none", see below> // optional
+#               "chooser": <"Camera chooser" value that streams it, its position from 1 if unspecified> // optional
 #               "properties": [                          // optional
 #                   {
 #                       "name": <property name>
@@ -63,16 +109,46 @@ from yellow_ball_test import GripPipelineYellow
 #       ]
 #   }
 
+#   Every camera with a pipeline gets its own grabber and worker thread. A
+#   camera with none is never decoded, the dashboard's "UI Active Cam" is
+#   switched over to its own MJPEG stream while it is chosen. If no camera
+#   has a "pipeline", the first three are green, yellow and none, chosen by
+#   3, 1 and 2. Cameras with the same pipeline publish under the same keys.
+
 configFile = "/boot/frc.json"
 
 class CameraConfig: pass
 
 team = None
 server = False
+processPool = False
+thresholdLutBits = None
+roiTracking = False
+coarseToFine = False
+gripEngine = False
+fastFilter = False
+morphologyPlan = False
+resultEpsilon = 1e-3
+stampMs = 100.0
+individualKeys = True
+profiling = False
+profiler = None
+recordDirectory = None
+recordFrames = 300
+replayDirectory = None
+replaySpeed = "original"
+adaptiveRate = False
+ballTracking = False
+yellowEvery = 1
+rawYuyv = False
+streamKbps = None
 cameraConfigs = []
 switchedCameraConfigs = []
 cameras = []
 
+# seconds between looks at "Camera chooser" and the statistics
+CHOOSER_INTERVAL = 0.02
+
 def parseError(str):
     """Report parse error."""
     print("config error in '" + configFile + "': " + str, file=sys.stderr)
@@ -98,6 +174,17 @@ def readCameraConfig(config):
     # stream properties
     cam.streamConfig = config.get("stream")
 
+    # pipeline its frames feed, and the "Camera chooser" value that streams it
+    cam.pipeline = str(config.get("pipeline", "none")).lower()
+    if cam.pipeline not in ("green", "yellow", "none"):
+        parseError("camera '{}': could not understand pipeline '{}'".format(cam.name, cam.pipeline))
+        return False
+    try:
+        cam.chooser = int(config.get("chooser", len(cameraConfigs) + 1))
+    except (TypeError, ValueError):
+        parseError("camera '{}': could not understand chooser value '{}'".format(cam.name, config["chooser"]))
+        return False
+
     cam.config = config
 
     cameraConfigs.append(cam)
@@ -128,6 +215,26 @@ def readConfig():
     """Read configuration file."""
     global team
     global server
+    global processPool
+    global thresholdLutBits
+    global roiTracking
+    global coarseToFine
+    global gripEngine
+    global fastFilter
+    global morphologyPlan
+    global resultEpsilon
+    global stampMs
+    global individualKeys
+    global profiling
+    global recordDirectory
+    global recordFrames
+    global replayDirectory
+    global replaySpeed
+    global adaptiveRate
+    global ballTracking
+    global yellowEvery
+    global rawYuyv
+    global streamKbps
 
     # parse file
     try:
@@ -159,6 +266,84 @@ def readConfig():
         else:
             parseError("could not understand ntmode value '{}'".format(str))
 
+    # process pool (optional)
+    processPool = bool(j.get("process pool", False))
+
+    # threshold lookup table (optional)
+    if "threshold lut bits" in j:
+        try:
+            thresholdLutBits = int(j["threshold lut bits"])
+        except (TypeError, ValueError):
+            parseError("could not understand threshold lut bits value '{}'".format(j["threshold lut bits"]))
+            thresholdLutBits = None
+        if thresholdLutBits is not None and (thresholdLutBits < 1 or thresholdLutBits > 8):
+            parseError("threshold lut bits must be 1 to 8, not '{}'".format(thresholdLutBits))
+            thresholdLutBits = None
+
+    # green region of interest tracking (optional)
+    roiTracking = bool(j.get("roi tracking", False))
+
+    # yellow coarse-to-fine detection (optional)
+    coarseToFine = bool(j.get("coarse to fine", False))
+
+    # run the .grip files directly (optional)
+    gripEngine = bool(j.get("grip engine", False))
+
+    # vectorized contour filter (optional)
+    fastFilter = bool(j.get("fast filter", False))
+
+    # compiled erode/dilate chains (optional)
+    morphologyPlan = bool(j.get("morphology plan", False))
+
+    # result publishing (optional)
+    try:
+        resultEpsilon = float(j.get("result epsilon", resultEpsilon))
+    except (TypeError, ValueError):
+        parseError("could not understand result epsilon value '{}'".format(j["result epsilon"]))
+    try:
+        stampMs = float(j.get("stamp ms", stampMs))
+    except (TypeError, ValueError):
+        parseError("could not understand stamp ms value '{}'".format(j["stamp ms"]))
+    individualKeys = bool(j.get("individual keys", True))
+
+    # stage timing (optional)
+    profiling = bool(j.get("profiling", False))
+
+    # frame recording and replay (optional)
+    recordDirectory = j.get("record", None)
+    try:
+        recordFrames = int(j.get("record frames", recordFrames))
+    except (TypeError, ValueError):
+        parseError("could not understand record frames value '{}'".format(j["record frames"]))
+    replayDirectory = j.get("replay", None)
+    replaySpeed = j.get("replay speed", replaySpeed)
+    if replaySpeed not in ("original", "max"):
+        parseError("could not understand replay speed value '{}'".format(replaySpeed))
+        replaySpeed = "original"
+
+    # camera rate control (optional)
+    adaptiveRate = bool(j.get("adaptive rate", False))
+
+    # yellow ball tracking (optional)
+    ballTracking = bool(j.get("ball tracking", False))
+    try:
+        yellowEvery = max(1, int(j.get("yellow every", yellowEvery)))
+    except (TypeError, ValueError):
+        parseError("could not understand yellow every value '{}'".format(j["yellow every"]))
+
+    # undecoded YUYV frames (optional)
+    rawYuyv = bool(j.get("raw yuyv", False))
+    if rawYuyv and processPool:
+        parseError("raw yuyv does not work with the process pool, decoding every frame")
+        rawYuyv = False
+
+    # dashboard stream bandwidth (optional)
+    if "stream kbps" in j:
+        try:
+            streamKbps = float(j["stream kbps"])
+        except (TypeError, ValueError):
+            parseError("could not understand stream kbps value '{}'".format(j["stream kbps"]))
+
     # cameras
     try:
         cameras = j["cameras"]
@@ -168,6 +353,11 @@ def readConfig():
     for camera in cameras:
         if not readCameraConfig(camera):
             return False
+    if not any("pipeline" in camera for camera in cameras):
+        # wired as before cameras had a pipeline: Green, Yellow, then Front only to look at
+        for cam, pipeline, chooser in zip(cameraConfigs, ["green", "yellow", "none"], [3, 1, 2]):
+            cam.pipeline = pipeline
+            cam.chooser = chooser
 
     # switched cameras
     if "switched cameras" in j:
@@ -192,6 +382,27 @@ def startCamera(config):
 
     return camera
 
+def startCameras():
+    """Open every camera on its own thread, so a slow camera does not hold up the rest.
+    Returns:
+        The threads. cameras holds each camera in config order once they are joined.
+    """
+    cameras.extend([None] * len(cameraConfigs))
+
+    def start(index, config):
+        cameras[index] = startCamera(config)
+
+    threads = [threading.Thread(target=start, args=(index, config), name="start " + config.name)
+               for index, config in enumerate(cameraConfigs)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def frameShape(index, yuyv=False):
+    """(height, width, channels) of a camera's frames as configured."""
+    config = cameraConfigs[index].config
+    return (int(config.get("height", 480)), int(config.get("width", 640)), 2 if yuyv else 3)
+
 def startSwitchedCamera(config):
     """Start running the switched camera."""
     print("Starting switched camera '{}' on {}".format(config.name, config.key))
@@ -216,363 +427,138 @@ def startSwitchedCamera(config):
 
     return server
 
-#Distance function
-
-def distance_to_camera(Width, perceivedWidth):
-
-    #Find focal distance
-    Control_Distance = 69
-    Control_Width_pixels = 57
-    Control_Width_in = 7
-    focalLength = (Control_Width_pixels * Control_Distance) / Control_Width_in
-
-    return (Width * focalLength) / perceivedWidth
-
-
-def angleFinder(slope):
-
-    control_angle = 45 #deg
-    control_slope =.36
-    angle = (control_angle * slope)/control_slope
-
-    return angle
-
-def getValuesGreen(image):
-
-    contourPoints = contours_output_green[0][:,0]
-
-    #print(contourPoints)
-
-    x_points_green = contourPoints[:,0]
-    y_points_green = contourPoints[:,1]
-
-    x_min_green = numpy.amin(x_points_green)
-    x_max_green = numpy.amax(x_points_green)
-
-    sorted_contours = sorted(contourPoints, key=lambda tup: tup[0])
-    #print(sorted_contours_min[0])
-    min_point = sorted_contours[0]
-    #print(min_point)
-    max_point = sorted_contours[len(sorted_contours)-1]
-    #print(max_point)
-
-    #for distance
-    Green_Width = x_max_green - x_min_green
-    #sd.putNumber('Green Width', Green_Width)
-
-    #Find slope of the target
-    slope = (min_point[1] - max_point[1])/(min_point[0]-max_point[0])
-
-    #Find angle of the target
-    angle_green = angleFinder(slope)
-
-    #call distance function to return widths
-    Green_Real_Width = 39 #in
-    inchesG = distance_to_camera(Green_Real_Width, Green_Width) - (0.0111*(angle_green*angle_green)) + (0.0809*angle_green)
-    sd.putNumber('Green Distance', inchesG)
-
-
-
-    y_min_green = numpy.amin(y_points_green)
-    y_max_green = numpy.amax(y_points_green)
-
-    #sd.putNumber('Min X Green', x_min_green)
-    #sd.putNumber('Max X Green', x_max_green)
-    #sd.putNumber('Min Y Green', y_min_green)
-    #sd.putNumber('Max Y Green', y_max_green)
-
-    area_green = (x_max_green - x_min_green) * (y_max_green - y_min_green)
-
-    #sd.putNumber('Green Area', area_green)
-
-    #x_center_green = ((x_max_green - x_min_green)/2) + x_min_green
-    #y_center_green = ((y_max_green - y_min_green)/2) + y_min_green
-
-    x_center_green = ((max_point[0]-min_point[0])/2) + min_point[0]
-    if (max_point[1] > min_point[1]):
-        y_center_green = ((max_point[1] - min_point[1])/2) + min_point[1]
-
-    elif (max_point[1] < min_point[1]):
-        y_center_green = ((min_point[1] - max_point[1])/2) + max_point[1]
-
+def makeGreenPipeline(yuyv=False, name="Green"):
+    """Create the green pipeline as configured, for packed YUYV frames if yuyv, profiled under name."""
+    if gripEngine:
+        pipeline = GripPipeline(gripPath("Contours_GreenNORESIZE.grip"))
     else:
-        y_center_green = min_point[1]
-
-
-    sd.putNumber('Center X Green', x_center_green)
-    sd.putNumber('Center Y Green', y_center_green)
-
-
-
-
-    #Display Distance
-    image = cv2.putText(image, "Distance={}in".format(inchesG.astype(numpy.int64)),((x_center_green - 50).astype(numpy.int64), (y_center_green +50).astype(numpy.int64)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 255), 3)
-
-    #OUTLINE CONTOUR
-    #image = cv2.line(image, ((x_max_green).astype(numpy.int64),((y_max_green)).astype(numpy.int64)),((x_max_green).astype(numpy.int64),((y_min_green)).astype(numpy.int64)),(255,0,255),5)
-    #image = cv2.line(image, (((x_min_green)).astype(numpy.int64),(y_max_green).astype(numpy.int64)),(((x_min_green)).astype(numpy.int64),(y_min_green).astype(numpy.int64)),(255,0,255),5)
-    #image = cv2.line(image, ((x_max_green).astype(numpy.int64),((y_max_green)).astype(numpy.int64)),((x_min_green).astype(numpy.int64),((y_max_green)).astype(numpy.int64)),(255,0,255),5)
-    #image = cv2.line(image, (((x_max_green)).astype(numpy.int64),(y_min_green).astype(numpy.int64)),(((x_min_green)).astype(numpy.int64),(y_min_green).astype(numpy.int64)),(255,0,255),5)
-
-    #Points of corner
-    image = cv2.circle(image, (max_point[0], max_point[1]), 5, (0,0,255), -1)
-    image = cv2.circle(image, (min_point[0], min_point[1]), 5, (0,0,255), -1)
-
-    #Draw line from corner to corner
-    image = cv2.line(image, (max_point[0],max_point[1]),(min_point[0],min_point[1]),(255,0,255),5)
-
-    #draw crosshair
-
-    image = cv2.line(image, ((x_center_green).astype(numpy.int64), (y_center_green - 50).astype(numpy.int64)), ((x_center_green).astype(numpy.int64), (y_center_green +50).astype(numpy.int64)), (255,0,255), 3)
-
-    #Angle
-    image = cv2.putText(image, "Angle={}deg".format(angle_green.astype(numpy.int64)),((x_center_green - 50).astype(numpy.int64), (y_center_green +90).astype(numpy.int64)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 255), 3)
-
-    return image
-
-def getValuesYellow(image):
-
-    inchesZ = 10000
-
-    for contours in contours_output_yellow:
-
-        contourPoints = contours[:,0]
-
-        x_points_yellow = contourPoints[:,0]
-        y_points_yellow = contourPoints[:,1]
-
-        x_min_yellow = numpy.amin(x_points_yellow)
-        x_max_yellow = numpy.amax(x_points_yellow)
-
-        #for distance
-        Yellow_Width = x_max_yellow - x_min_yellow
-        #sd.putNumber('Yellow Width', Yellow_Width)
-
-        #call distance function to return widths
-        Yellow_Real_Width = 7 #in
-        inchesY = distance_to_camera(Yellow_Real_Width, Yellow_Width)
-        #sd.putNumber('Yellow Distance', inchesY)
-
-        #sd.putNumber('YellowDistance', inchesY)
-
-        y_min_yellow = numpy.amin(y_points_yellow)
-        y_max_yellow = numpy.amax(y_points_yellow)
-
-        #sd.putNumber('Min X Yellow', x_min_yellow)
-        #sd.putNumber('Max X Yellow', x_max_yellow)
-        #sd.putNumber('Min Y Yellow', y_min_yellow)
-        #sd.putNumber('Max Y Yellow', y_max_yellow)
-
-        area_yellow = (x_max_yellow - x_min_yellow) * (y_max_yellow - y_min_yellow)
-
-        #sd.putNumber('Yellow Area', area_yellow)
-
-        x_center_yellow = ((x_max_yellow - x_min_yellow)/2) + x_min_yellow
-        y_center_yellow = ((y_max_yellow - y_min_yellow)/2) + y_min_yellow
-
-        #sd.putNumber('Center X Yellow', x_center_yellow)
-        #sd.putNumber('Center Y Yellow', y_center_yellow)
-
-        image = cv2.line(image, ((x_center_yellow).astype(numpy.int64),((y_center_yellow) - 15).astype(numpy.int64)),((x_center_yellow).astype(numpy.int64),((y_center_yellow) + 15).astype(numpy.int64)),(0,0,0),5)
-        image = cv2.line(image, (((x_center_yellow) - 15).astype(numpy.int64),(y_center_yellow).astype(numpy.int64)),(((x_center_yellow) + 15).astype(numpy.int64),(y_center_yellow).astype(numpy.int64)),(0,0,0),5)
-
-        image = cv2.line(image, ((x_max_yellow).astype(numpy.int64),((y_max_yellow)).astype(numpy.int64)),((x_max_yellow).astype(numpy.int64),((y_min_yellow)).astype(numpy.int64)),(0,0,0),5)
-        image = cv2.line(image, (((x_min_yellow)).astype(numpy.int64),(y_max_yellow).astype(numpy.int64)),(((x_min_yellow)).astype(numpy.int64),(y_min_yellow).astype(numpy.int64)),(0,0,0),5)
-        image = cv2.line(image, ((x_max_yellow).astype(numpy.int64),((y_max_yellow)).astype(numpy.int64)),((x_min_yellow).astype(numpy.int64),((y_max_yellow)).astype(numpy.int64)),(0,0,0),5)
-        image = cv2.line(image, (((x_max_yellow)).astype(numpy.int64),(y_min_yellow).astype(numpy.int64)),(((x_min_yellow)).astype(numpy.int64),(y_min_yellow).astype(numpy.int64)),(0,0,0),5)
-
-        #Display Distance
-        image = cv2.putText(image, "Distance={}in".format(inchesY.astype(numpy.int64)),((x_center_yellow - 70).astype(numpy.int64), (y_center_yellow +70).astype(numpy.int64)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 3)
-
-        if (inchesY < inchesZ):
-            sd.putNumber('Center X Yellow', x_center_yellow)
-            sd.putNumber('Center Y Yellow', y_center_yellow)
-            #sd.putNumber('Yellow Area', area_yellow)
-
-            #sd.putNumber('Min X Yellow', x_min_yellow)
-            #sd.putNumber('Max X Yellow', x_max_yellow)
-            #sd.putNumber('Min Y Yellow', y_min_yellow)
-            #sd.putNumber('Max Y Yellow', y_max_yellow)
-
-            sd.putNumber('Yellow Distance', inchesY)
-
-
-            inchesZ = inchesY
-
-
-    return image
-#
-# def getValuesBoth(image):
-#
-#     contourPoints_green = contours_output_green[0][:,0]
-#
-#     x_points_green = contourPoints_green[:,0]
-#     y_points_green = contourPoints_green[:,1]
-#
-#     x_min_green = numpy.amin(x_points_green)
-#     x_max_green = numpy.amax(x_points_green)
-#
-#     sorted_contours = sorted(contourPoints_green, key=lambda tup: tup[0])
-#     #print(sorted_contours_min[0])
-#     min_point = sorted_contours[0]
-#     #print(min_point)
-#     max_point = sorted_contours[len(sorted_contours)-1]
-#     #print(max_point)
-#
-#     sorted_contours = sorted(contourPoints_green, key=lambda tup: tup[0])
-#     #print(sorted_contours_min[0])
-#     min_point = sorted_contours[0]
-#     #print(min_point)
-#     max_point = sorted_contours[len(sorted_contours)-1]
-#     #print(max_point)
-#
-#     y_min_green = numpy.amin(y_points_green)
-#     y_max_green = numpy.amax(y_points_green)
-#     #for distance
-#     Green_Width = x_max_green - x_min_green
-#     #sd.putNumber('Green Width', Green_Width)
-#
-#     #call distance function to return widths
-#     Green_Real_Width = 39 #in
-#
-#     #Find slope of the target
-#     slope = (min_point[1] - max_point[1])/(min_point[0]-max_point[0])
-#
-#     #Find angle of the target
-#     angle_green = angleFinder(slope)
-#
-#     #find distance
-#     inchesG = distance_to_camera(Green_Real_Width, Green_Width) - (0.0111*(angle_green*angle_green)) + (0.0809*angle_green)
-#     sd.putNumber('Green Distance', inchesG)
-#
-#     #sd.putNumber('Min X Green', x_min_green)
-#     #sd.putNumber('Max X Green', x_max_green)
-#     #sd.putNumber('Min Y Green', y_min_green)
-#     #sd.putNumber('Max Y Green', y_max_green)
-#
-#
-#     area_green = (x_max_green - x_min_green) * (y_max_green - y_min_green)
-#
-#     #sd.putNumber('Green Area', area_green)
-#
-#     x_center_green = ((max_point[0]-min_point[0])/2) + min_point[0]
-#     if (max_point[1] > min_point[1]):
-#         y_center_green = ((max_point[1] - min_point[1])/2) + min_point[1]
-#
-#     elif (max_point[1] < min_point[1]):
-#         y_center_green = ((min_point[1] - max_point[1])/2) + max_point[1]
-#
-#     else:
-#         y_center_green = min_point[1]
-#
-#     sd.putNumber('Center X Green', x_center_green)
-#     sd.putNumber('Center Y Green', y_center_green)
-#
-#     #image = cv2.line(image, ((x_center_green).astype(numpy.int64),((y_center_green) - 15).astype(numpy.int64)),((x_center_green).astype(numpy.int64),((y_center_green) + 15).astype(numpy.int64)),(255,0,255),5)
-#     #image = cv2.line(image, (((x_center_green) - 15).astype(numpy.int64),(y_center_green).astype(numpy.int64)),(((x_center_green) + 15).astype(numpy.int64),(y_center_green).astype(numpy.int64)),(255,0,255),5)
-#
-#     #image = cv2.line(image, ((x_max_green).astype(numpy.int64),((y_max_green)).astype(numpy.int64)),((x_max_green).astype(numpy.int64),((y_min_green)).astype(numpy.int64)),(255,0,255),5)
-#     #image = cv2.line(image, (((x_min_green)).astype(numpy.int64),(y_max_green).astype(numpy.int64)),(((x_min_green)).astype(numpy.int64),(y_min_green).astype(numpy.int64)),(255,0,255),5)
-#     #image = cv2.line(image, ((x_max_green).astype(numpy.int64),((y_max_green)).astype(numpy.int64)),((x_min_green).astype(numpy.int64),((y_max_green)).astype(numpy.int64)),(255,0,255),5)
-#     #image = cv2.line(image, (((x_max_green)).astype(numpy.int64),(y_min_green).astype(numpy.int64)),(((x_min_green)).astype(numpy.int64),(y_min_green).astype(numpy.int64)),(255,0,255),5)
-#
-#     #Display Distance
-#     image = cv2.putText(image, "Distance={}in".format(inchesG.astype(numpy.int64)),((x_center_green - 50).astype(numpy.int64), (y_center_green +50).astype(numpy.int64)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 255), 3)
-#
-#     image = cv2.circle(image, (max_point[0], max_point[1]), 5, (0,0,255), -1)
-#     image = cv2.circle(image, (min_point[0], min_point[1]), 5, (0,0,255), -1)
-#
-#     image = cv2.line(image, ((max_point[0]),(max_point[1])),(min_point[0],min_point[1]),(255,0,255),5)
-#
-#     #Draw Crosshair
-#     image = cv2.line(image, ((x_center_green).astype(numpy.int64), (y_center_green - 50).astype(numpy.int64)), ((x_center_green).astype(numpy.int64), (y_center_green +50).astype(numpy.int64)), (255,0,255), 3)
-#
-#     #Angle
-#     image = cv2.putText(image, "Angle={}deg".format(angle_green.astype(numpy.int64)),((x_center_green - 50).astype(numpy.int64), (y_center_green +90).astype(numpy.int64)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 255), 3)
-#
-#     #Start of Yellow Code
-#     inchesZ = 10000
-#
-#     for contours in contours_output_yellow:
-#
-#         contourPoints = contours[:,0]
-#
-#         x_points_yellow = contourPoints[:,0]
-#         y_points_yellow = contourPoints[:,1]
-#
-#         x_min_yellow = numpy.amin(x_points_yellow)
-#         x_max_yellow = numpy.amax(x_points_yellow)
-#
-#         #for distance
-#         Yellow_Width = x_max_yellow - x_min_yellow
-#         #sd.putNumber('Yellow Width', Yellow_Width)
-#
-#         #call distance function to return widths
-#         Yellow_Real_Width = 7 #in
-#         inchesY = distance_to_camera(Yellow_Real_Width, Yellow_Width)
-#         #sd.putNumber('Yellow Distance', inchesY)
-#
-#         #sd.putNumber('YellowDistance', inchesY)
-#
-#         y_min_yellow = numpy.amin(y_points_yellow)
-#         y_max_yellow = numpy.amax(y_points_yellow)
-#
-#         #sd.putNumber('Min X Yellow', x_min_yellow)
-#         #sd.putNumber('Max X Yellow', x_max_yellow)
-#         #sd.putNumber('Min Y Yellow', y_min_yellow)
-#         #sd.putNumber('Max Y Yellow', y_max_yellow)
-#
-#         area_yellow = (x_max_yellow - x_min_yellow) * (y_max_yellow - y_min_yellow)
-#
-#         #sd.putNumber('Yellow Area', area_yellow)
-#
-#         x_center_yellow = ((x_max_yellow - x_min_yellow)/2) + x_min_yellow
-#         y_center_yellow = ((y_max_yellow - y_min_yellow)/2) + y_min_yellow
-#
-#         #sd.putNumber('Center X Yellow', x_center_yellow)
-#         #sd.putNumber('Center Y Yellow', y_center_yellow)
-#
-#         image = cv2.line(image, ((x_center_yellow).astype(numpy.int64),((y_center_yellow) - 15).astype(numpy.int64)),((x_center_yellow).astype(numpy.int64),((y_center_yellow) + 15).astype(numpy.int64)),(0,0,0),5)
-#         image = cv2.line(image, (((x_center_yellow) - 15).astype(numpy.int64),(y_center_yellow).astype(numpy.int64)),(((x_center_yellow) + 15).astype(numpy.int64),(y_center_yellow).astype(numpy.int64)),(0,0,0),5)
-#
-#         image = cv2.line(image, ((x_max_yellow).astype(numpy.int64),((y_max_yellow)).astype(numpy.int64)),((x_max_yellow).astype(numpy.int64),((y_min_yellow)).astype(numpy.int64)),(0,0,0),5)
-#         image = cv2.line(image, (((x_min_yellow)).astype(numpy.int64),(y_max_yellow).astype(numpy.int64)),(((x_min_yellow)).astype(numpy.int64),(y_min_yellow).astype(numpy.int64)),(0,0,0),5)
-#         image = cv2.line(image, ((x_max_yellow).astype(numpy.int64),((y_max_yellow)).astype(numpy.int64)),((x_min_yellow).astype(numpy.int64),((y_max_yellow)).astype(numpy.int64)),(0,0,0),5)
-#         image = cv2.line(image, (((x_max_yellow)).astype(numpy.int64),(y_min_yellow).astype(numpy.int64)),(((x_min_yellow)).astype(numpy.int64),(y_min_yellow).astype(numpy.int64)),(0,0,0),5)
-#
-#         #Display Distance
-#         image = cv2.putText(image, "Distance={}in".format(inchesY.astype(numpy.int64)),((x_center_yellow - 70).astype(numpy.int64), (y_center_yellow +70).astype(numpy.int64)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 3)
-#
-#         if (inchesY < inchesZ):
-#             sd.putNumber('Center X Yellow', x_center_yellow)
-#             sd.putNumber('Center Y Yellow', y_center_yellow)
-#             #sd.putNumber('Yellow Area', area_yellow)
-#
-#             #sd.putNumber('Min X Yellow', x_min_yellow)
-#             #sd.putNumber('Max X Yellow', x_max_yellow)
-#             #sd.putNumber('Min Y Yellow', y_min_yellow)
-#             #sd.putNumber('Max Y Yellow', y_max_yellow)
-#
-#             sd.putNumber('Yellow Distance', inchesY)
-#
-#
-#             #sd.putNumber('Yellow Width', Yellow_Width)
-#
-#             inchesZ = inchesY
-#
-#     return image
-
-
+        pipeline = GripPipelineGreen()
+    if yuyv:
+        pipeline.useYuyvLookupTable()
+    elif thresholdLutBits is not None:
+        pipeline.useLookupTable(thresholdLutBits)
+    if fastFilter:
+        pipeline.useFastFilter()
+    if morphologyPlan:
+        pipeline.useMorphologyPlan()
+    if profiler is not None:
+        pipeline.useProfiler(profiler, name)
+    if roiTracking:
+        pipeline = RoiTracker(pipeline)
+    return pipeline
+
+def makeYellowPipeline(yuyv=False, name="Yellow"):
+    """Create the yellow pipeline as configured, for packed YUYV frames if yuyv, profiled under name."""
+    if gripEngine:
+        pipeline = GripPipeline(gripPath("Contours_YellowBall.grip"))
+    else:
+        pipeline = GripPipelineYellow()
+    if yuyv:
+        pipeline.useYuyvLookupTable()
+    elif thresholdLutBits is not None:
+        pipeline.useLookupTable(thresholdLutBits)
+    if fastFilter:
+        pipeline.useFastFilter()
+    if morphologyPlan:
+        pipeline.useMorphologyPlan()
+    if profiler is not None:
+        pipeline.useProfiler(profiler, name)
+    if coarseToFine:
+        pipeline = CoarseToFine(pipeline)
+    return pipeline
+
+# what each "pipeline" of a camera runs: (pipeline factory, measurement, result keys)
+PIPELINES = {
+    "green": (makeGreenPipeline, getValuesGreen, GREEN_KEYS),
+    "yellow": (makeYellowPipeline, getValuesYellow, YELLOW_KEYS),
+}
+
+def replaySink(name, sink):
+    """The sink a camera's frames come from: its recording when replaying and there is one, else sink."""
+    if replayDirectory is None:
+        return sink
+    path = ringPath(replayDirectory, name)
+    if not os.path.exists(path):
+        print("no recording of '{}' in {}, using the camera".format(name, replayDirectory), file=sys.stderr)
+        return sink
+    print("Replaying '{}' from {}".format(name, path))
+    return ReplaySink(path, replaySpeed == "original")
+
+def visionSink(index, name):
+    """The sink a pipeline camera's frames come from, its source is set once the camera is open.
+    Returns:
+        (sink, yuyv), yuyv is True if the sink hands out packed YUYV frames instead of BGR.
+    """
+    sink = None
+    if rawYuyv and str(cameraConfigs[index].config.get("pixel format", "")).lower() == "yuyv":
+        try:
+            sink = CvSink("vision " + name, VideoMode.PixelFormat.kYUYV)
+        except TypeError:
+            # before 2024 a CvSink only ever decodes to BGR
+            print("camera '{}': this cscore cannot grab raw YUYV, decoding to BGR".format(name), file=sys.stderr)
+    yuyv = sink is not None
+    if sink is None:
+        sink = CvSink("vision " + name)
+    replay = replaySink(name, sink)
+    if replay is not sink:
+        yuyv = replay.channels == 2
+    return replay, yuyv
+
+def chosenCamera(camera_chooser):
+    """The camera nothing processes that a "Camera chooser" value shows, None if it shows annotated frames."""
+    for index, config in enumerate(cameraConfigs):
+        if config.pipeline == "none" and config.chooser == camera_chooser:
+            return cameras[index]
+    return None
+
+def publishPoolResult(worker, record, image):
+    """Publish a result record from a pipeline worker, streaming its frame if selected."""
+    cameraWorker = cameraWorkers[worker.name]
+    with publishLock:
+        for i, key in enumerate(worker.keys):
+            publisher.putNumber(key, record[len(RECORD_HEADER) + i])
+        publisher.publish(record[0], record[1], cameraWorker.results)
+        cameraWorker.latency.add(publisher.latency)
+
+    if cameraWorker.streamed:
+        stream.submit(image, copy=True)
 
 if __name__ == "__main__":
     if len(sys.argv) >= 2:
         configFile = sys.argv[1]
 
+    # from power-on to the first result, published once it is out
+    startup = StartupTimer(processStartTime() or importStart)
+    startup.record("boot", 0.0, startup.start)
+    startup.record("python", startup.start, importStart)
+    startup.record("imports", importStart, importEnd)
+
     # read configuration
+    began = now()
     if not readConfig():
         sys.exit(1)
+    startup.record("config", began)
+
+    # pipeline workers are forked, so start them before any other threads
+    pool = None
+    poolWorkers = {}
+    if processPool:
+        began = now()
+        pool = PipelinePool(publishPoolResult)
+        for index, config in enumerate(cameraConfigs):
+            if config.pipeline != "none":
+                makePipeline, measure, keys = PIPELINES[config.pipeline]
+                poolWorkers[config.name] = pool.addPipeline(config.name, makePipeline, measure, keys, frameShape(index))
+        pool.start()
+        startup.record("process pool", began)
+
+    # created after the workers are forked, they are not profiled
+    if profiling:
+        profiler = StageProfiler()
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.dump())
 
     # start NetworkTables
+    began = now()
     ntinst = NetworkTablesInstance.getDefault()
     if server:
         print("Setting up NetworkTables server")
@@ -580,134 +566,138 @@ if __name__ == "__main__":
     else:
         print("Setting up NetworkTables client for team {}".format(team))
         ntinst.startClientTeam(team)
-
-    # start cameras
-    for config in cameraConfigs:
-        cameras.append(startCamera(config))
+    startup.record("networktables", began)
+
+    # start cameras, all at once and in the background
+    camerasBegan = now()
+    cameraThreads = startCameras()
+
+    #Init Grip, warmed up on a blank frame while the cameras open
+    began = now()
+    sinks = []
+    pipelines = []
+    for index, config in enumerate(cameraConfigs):
+        if config.pipeline == "none":
+            sinks.append((None, False))
+            pipelines.append(None)
+            continue
+        sink, yuyv = visionSink(index, config.name)
+        sinks.append((sink, yuyv))
+        pipeline = None
+        if pool is None:
+            makePipeline, measure, keys = PIPELINES[config.pipeline]
+            pipeline = makePipeline(yuyv, config.name)
+            warmPipeline(pipeline, measure, RecordingTable(), frameShape(index, yuyv))
+        pipelines.append(pipeline)
+    startup.record("warm up", began)
+
+    for thread in cameraThreads:
+        thread.join()
+    camerasOpen = now()
+    startup.record("cameras", camerasBegan, camerasOpen)
+
+    for index, (sink, yuyv) in enumerate(sinks):
+        if sink is not None:
+            sink.setSource(cameras[index])
 
     # start switched cameras
     for config in switchedCameraConfigs:
         startSwitchedCamera(config)
-
-    #Init Grip
-    grip_green = GripPipelineGreen()
-    grip_yellow = GripPipelineYellow()
-    sinkY = CvSink("vision Yellow")
-    sinkF = CvSink("vision Front")
-    sinkY.setSource(cameras[1]) #Was 1, trying 0
-    sinkF.setSource(cameras[2]) #Was 1, trying 0
-    sinkG = CvSink("vision Green")
-    sinkG.setSource(cameras[0]) #Was 1, trying 0
-    image_G = numpy.ndarray((640,480,3), dtype = numpy.uint8) #Mid val was 360
-    image_F = numpy.ndarray((640,480,3), dtype = numpy.uint8) #Mid val was 360
-    image_Y = numpy.ndarray((640,480,3), dtype = numpy.uint8) #Mid val was 360
     camservInst = CameraServer.getInstance()
 
-    dashSource1 = camservInst.putVideo("UI Active Cam", 640, 480)
-    #dashSource2 = camservInst.putVideo("UI Green Cam", 320, 240)
-    # loop forever
+    # switched between the annotated frames and the cameras nothing processes
+    dashServer = camservInst.addSwitchedCamera("UI Active Cam")
+    dashSource1 = CvSource("UI Annotated Cam", VideoMode.PixelFormat.kMJPEG, 640, 480, 30)
+    dashServer.setSource(dashSource1)
+    # annotated, decoded from YUYV and scaled to the budget on its own thread
+    stream = DashboardStream(dashSource1, dashServer, streamKbps)
+    stream.profiler = profiler
+    stream.start()
 
     sd = ntinst.getTable('SmartDashboard')
 
+    # capture times go out on the robot's clock once it puts its time
+    robotClock = ClockOffset()
+    listenForRobotTime(sd, robotClock)
+
+    # all results go out together, once per processed frame and only if they changed
+    publisher = ResultPublisher(sd, ntinst.flush, resultEpsilon, individualKeys, robotClock, stampMs / 1000.0)
+    publishLock = threading.Lock()
+    latencyPublished = now()
+    perfTable = ntinst.getTable(PERF_TABLE)
+
+    # one grabber and one worker thread per processed camera, each waits for its own frames only
+    cameraWorkers = {}
+    for index, config in enumerate(cameraConfigs):
+        sink, yuyv = sinks[index]
+        if sink is None:
+            continue
+        height, width, channels = frameShape(index, yuyv)
+        grabber = FrameGrabber(config.name, sink, threading.Condition(), width, height, channels)
+        grabber.profiler = profiler
+        # as fast as the worker takes them, but every single one
+        grabber.lossless = isinstance(grabber.sink, ReplaySink) and replaySpeed == "max"
+        if recordDirectory is not None:
+            grabber.recorder = FrameRecorder(ringPath(recordDirectory, grabber.camera_name), recordFrames, grabber.shape)
+            grabber.recorder.start()
+
+        worker = CameraWorker(grabber, publisher, publishLock, pipelines[index], PIPELINES[config.pipeline][1], stream)
+        worker.results = config.pipeline
+        worker.pool_worker = poolWorkers.get(config.name)
+        worker.profiler = profiler
+        # tracked balls are predicted for the frames the yellow pipeline skips
+        if ballTracking and config.pipeline == "yellow" and pool is None:
+            worker.tracker = BallTracker()
+            worker.every = yellowEvery
+        cameraWorkers[config.name] = worker
+
+    for worker in cameraWorkers.values():
+        worker.grabber.start()
+        worker.start()
+
+    # step cameras down while their workers drop frames, and back up when there is room
+    rateControllers = []
+    if adaptiveRate and replayDirectory is None:
+        for index, config in enumerate(cameraConfigs):
+            if config.name not in cameraWorkers:
+                continue
+            worker = cameraWorkers[config.name]
+            modes = rateModes(config.config)
+            controller = RateController(cameras[index], config.config, worker.grabber, modes, worker.pool_worker)
+            rateControllers.append((controller, worker))
+
+    # the workers do the work, this loop follows the chooser and publishes the statistics
     while True:
-
-        #camera_chooser = sd.getNumber("Camera chooser", 1)
-        #
-        # if (camera_chooser == 1):
-        #     sinkY.setSource(cameras[1])
-        # elif (camera_chooser == 2):
-        #     sinkY.setSource(cameras[2])
-        #
-
-        #Change the time
-
-
-        timestamp,image_F = sinkF.grabFrame(image_F)
-
-        timestamp,image_Y = sinkY.grabFrame(image_Y)
-        grip_yellow.process(image_Y)
-
-        timestamp,image_G = sinkG.grabFrame(image_G)
-        grip_green.process(image_G)
-
-
-        contours_output_green = grip_green.filter_contours_output
-        contours_output_yellow = grip_yellow.filter_contours_output
-
-        #print(contours_output_green)
-
-        if(contours_output_green):
-
-            image_G = getValuesGreen(image_G)
-
-        else :
-                x_min_green = -1
-                x_max_green = -1
-
-                y_min_green = -1
-                y_max_green = -1
-
-                #sd.putNumber('Min X Green', x_min_green)
-                #sd.putNumber('Max X Green', x_max_green)
-                #sd.putNumber('Min Y Green', y_min_green)
-                #sd.putNumber('Max Y Green', y_max_green)
-
-                #print("Bruh, objects not detected")
-
-                x_center_green = -1
-                y_center_green = -1
-
-                sd.putNumber('Center X Green', x_center_green)
-                sd.putNumber('Center Y Green', y_center_green)
-
-                area_green = -1
-
-                #sd.putNumber('Green Area', area_green)
-
-                #only get yellow distance
-                inchesG = -1
-                sd.putNumber('Green Distance', inchesG)
-    #    dashSource2.putFrame(image_G)
-
-        if(contours_output_yellow):
-
-            image_Y = getValuesYellow(image_Y)
-
-        else:
-            x_min_yellow = -1
-            x_max_yellow = -1
-
-            y_min_yellow = -1
-            y_max_yellow = -1
-
-            #sd.putNumber('Min X Yellow', x_min_yellow)
-            #sd.putNumber('Max X Yellow', x_max_yellow)
-            #sd.putNumber('Min Y Yellow', y_min_yellow)
-            #sd.putNumber('Max Y Yellow', y_max_yellow)
-
-
-            x_center_yellow = -1
-            y_center_yellow = -1
-
-            sd.putNumber('Center X Yellow', x_center_yellow)
-            sd.putNumber('Center Y Yellow', y_center_yellow)
-
-            area_yellow = -1
-
-            #sd.putNumber('Yellow Area', area_yellow)
-
-            #only get green distance
-            inchesY = -1
-            sd.putNumber('Yellow Distance', inchesY)
-
-        #END OF IF STATEMENTS/SEND DATA
-
-
         camera_chooser = sd.getNumber("Camera chooser", 1) ## Starts on back camera to pick up balls
-
-        if (camera_chooser == 1):
-            dashSource1.putFrame(image_Y)
-        elif (camera_chooser == 2):
-            dashSource1.putFrame(image_F)
-        elif (camera_chooser == 3):
-            dashSource1.putFrame(image_G)
+        stream.showCamera(chosenCamera(camera_chooser))
+        for config in cameraConfigs:
+            worker = cameraWorkers.get(config.name)
+            if worker is not None:
+                worker.streamed = config.chooser == camera_chooser
+                publishFrameCounts(sd, worker.grabber)
+
+        # startup ends with the first result out, from any pipeline
+        if startup.first_result is None and publisher.first_published is not None:
+            startup.firstResult(publisher.first_published)
+            firstFrame = min(w.grabber.first_frame for w in cameraWorkers.values() if w.grabber.first_frame is not None)
+            startup.record("first frame", camerasOpen, firstFrame)
+            startup.record("first result", firstFrame, startup.first_result)
+            startup.publish(sd)
+            startup.report()
+
+        # latency percentiles, stage timings and camera rates about once a second
+        if now() - latencyPublished >= 1.0:
+            latencyPublished = now()
+            for controller, worker in rateControllers:
+                controller.update(worker.busy())
+                controller.publish(sd)
+            for worker in cameraWorkers.values():
+                worker.latency.publish(sd)
+                if isinstance(worker.pipeline, RoiTracker):
+                    sd.putNumber('ROI Hit Rate ' + worker.camera_name, worker.pipeline.hitRate())
+                    sd.putNumber('ROI Time Saved ' + worker.camera_name, worker.pipeline.timeSavedMs())
+            stream.publish(sd)
+            if profiler is not None:
+                profiler.publish(perfTable)
+
+        time.sleep(CHOOSER_INTERVAL)
@@ -0,0 +1,52 @@
+import cv2
+import numpy
+
+
+LINE = 0
+CIRCLE = 1
+TEXT = 2
+
+
+class Overlay:
+    """
+    Annotations recorded as a draw list and rasterized later, if at all.
+
+    Measuring a frame only records what it would draw. The list is drawn onto
+    the one frame that is actually streamed, so frames nobody watches never pay
+    for lines and text. Cleared by the measurement for every new frame.
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def clear(self):
+        del self.items[:]
+
+    def line(self, pt1, pt2, color, thickness):
+        self.items.append((LINE, pt1, pt2, color, thickness))
+
+    def circle(self, center, radius, color, thickness):
+        self.items.append((CIRCLE, center, radius, color, thickness))
+
+    def text(self, text, org, color, scale=1.0, thickness=3):
+        self.items.append((TEXT, text, org, color, scale, thickness))
+
+    def draw(self, image):
+        """Rasterize the draw list onto image in the order it was recorded.
+        Returns:
+            image, for chaining.
+        """
+        for item in self.items:
+            if item[0] == LINE:
+                cv2.line(image, _point(item[1]), _point(item[2]), item[3], item[4])
+            elif item[0] == CIRCLE:
+                cv2.circle(image, _point(item[1]), item[2], item[3], item[4])
+            else:
+                cv2.putText(image, item[1], _point(item[2]), cv2.FONT_HERSHEY_SIMPLEX, item[4], item[3], item[5])
+        return image
+
+
+def _point(point):
+    """Pixel coordinates truncated towards zero, like the .astype(numpy.int64) the drawing code used."""
+    x, y = numpy.asarray(point, dtype=numpy.float64).astype(numpy.int64)
+    return (int(x), int(y))
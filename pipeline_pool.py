@@ -0,0 +1,193 @@
+import collections
+import multiprocessing
+import sys
+import threading
+
+import numpy
+
+from overlay import Overlay
+from startup import warmPipeline
+
+
+# shape of a pipeline's frames unless its camera says otherwise
+FRAME_SHAPE = (480, 640, 3)
+
+# every result record starts with these, followed by one value per key
+RECORD_HEADER = ['frame id', 'capture time']
+
+GREEN_KEYS = ['Center X Green', 'Center Y Green', 'Green Distance', 'Green Angle']
+YELLOW_KEYS = ['Center X Yellow', 'Center Y Yellow', 'Yellow Distance', 'Yellow Track ID', 'Yellow Tracks']
+
+
+class RecordingTable:
+    """
+    Stands in for a NetworkTables table and remembers the last value put under each key.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.puts = 0
+
+    def putNumber(self, key, value):
+        self.values[key] = value
+        self.puts += 1
+        return True
+
+    def putNumberArray(self, key, value):
+        self.values[key] = list(value)
+        self.puts += 1
+        return True
+
+    def getNumber(self, key, defaultValue):
+        return self.values.get(key, defaultValue)
+
+
+def _workerMain(pipeline_class, measure, keys, shape, frame_buffer, record_buffer, slots, jobs, done, index):
+    """Body of a worker process: run one pipeline on every frame slot it is handed."""
+    frames = numpy.frombuffer(frame_buffer, dtype=numpy.uint8).reshape((slots,) + shape)
+    records = numpy.frombuffer(record_buffer, dtype=numpy.float64).reshape(slots, len(RECORD_HEADER) + len(keys))
+    pipeline = pipeline_class()
+    table = RecordingTable()
+    overlay = Overlay()
+    # the first frame's one-off costs are paid while the cameras are still opening
+    warmPipeline(pipeline, measure, RecordingTable(), shape)
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        slot, frame_id, capture_time, annotate = job
+
+        image = frames[slot]
+        pipeline.process(image)
+        measure(pipeline.filter_contours_output, table, overlay)
+        if annotate:
+            # straight into the shared slot
+            overlay.draw(image)
+
+        record = records[slot]
+        record[0] = frame_id
+        record[1] = capture_time
+        for i, key in enumerate(keys):
+            record[len(RECORD_HEADER) + i] = table.values.get(key, -1)
+        done.put((index, slot))
+
+
+class PipelineWorker:
+    """
+    One pipeline running in its own process, fed through a ring of shared frame slots.
+    """
+
+    def __init__(self, name, index, pipeline_class, measure, keys, done, slots, shape=FRAME_SHAPE):
+        self.name = name
+        self.keys = keys
+        self.slots = slots
+        self.shape = tuple(shape)
+
+        self.frames_submitted = 0
+        self.frames_completed = 0
+        self.frames_rejected = 0
+        # frames of another shape than the slots, e.g. after the camera's mode changed
+        self.frames_mismatched = 0
+
+        # preallocated once, the frames themselves never go through a pipe
+        self.__frame_buffer = multiprocessing.RawArray('B', slots * self.shape[0] * self.shape[1] * self.shape[2])
+        self.__record_buffer = multiprocessing.RawArray('d', slots * (len(RECORD_HEADER) + len(keys)))
+        self.frames = numpy.frombuffer(self.__frame_buffer, dtype=numpy.uint8).reshape((slots,) + self.shape)
+        self.records = numpy.frombuffer(self.__record_buffer, dtype=numpy.float64).reshape(slots, len(RECORD_HEADER) + len(keys))
+
+        self.__free = collections.deque(range(slots))
+        self.__lock = threading.Lock()
+        self.__jobs = multiprocessing.SimpleQueue()
+        self.__process = multiprocessing.Process(
+            target=_workerMain, name="pipeline " + name, daemon=True,
+            args=(pipeline_class, measure, keys, self.shape, self.__frame_buffer, self.__record_buffer, slots, self.__jobs, done, index))
+
+    def start(self):
+        self.__process.start()
+
+    def stop(self):
+        self.__jobs.put(None)
+        self.__process.join()
+
+    def submit(self, frame, frame_id, capture_time, annotate=True):
+        """Copy a frame into a free slot and hand it to the worker.
+        Returns:
+            False if every slot is busy or the frame does not fit the slots, and it was dropped.
+        """
+        if frame.shape != self.shape:
+            if self.frames_mismatched == 0:
+                print("pipeline '{}': {} frame does not fit the {} slots, dropping it".format(
+                    self.name, frame.shape, self.shape), file=sys.stderr)
+            self.frames_mismatched += 1
+            return False
+        with self.__lock:
+            if not self.__free:
+                self.frames_rejected += 1
+                return False
+            slot = self.__free.popleft()
+        numpy.copyto(self.frames[slot], frame)
+        self.frames_submitted += 1
+        self.__jobs.put((slot, frame_id, capture_time, annotate))
+        return True
+
+    def release(self, slot):
+        with self.__lock:
+            self.__free.append(slot)
+        self.frames_completed += 1
+
+
+class PipelinePool:
+    """
+    Runs each pipeline in its own worker process.
+
+    Results are handed to on_result(worker, record, image) on a collector
+    thread. The record and the annotated image live in shared memory and are
+    only valid until on_result returns.
+    """
+
+    def __init__(self, on_result, slots=3):
+        self.on_result = on_result
+        self.slots = slots
+        self.workers = []
+        self.__done = multiprocessing.Queue()
+        self.__collector = threading.Thread(target=self.__collect, name="pipeline results", daemon=True)
+
+    def addPipeline(self, name, pipeline_class, measure, keys, shape=FRAME_SHAPE):
+        """Add a pipeline, must be called before start().
+        Args:
+            name: Name used for the worker process.
+            pipeline_class: A GRIP pipeline class or factory, called inside the worker.
+            measure: getValuesGreen/getValuesYellow style function(contours, table, overlay).
+            keys: Table keys that make up the result record.
+            shape: (height, width, channels) of the camera's frames, the slots are this size.
+        Returns:
+            The PipelineWorker to submit frames to.
+        """
+        worker = PipelineWorker(name, len(self.workers), pipeline_class, measure, keys, self.__done, self.slots, shape)
+        self.workers.append(worker)
+        return worker
+
+    def start(self):
+        """Start the workers. Call this before starting any other threads, the workers are forked."""
+        for worker in self.workers:
+            worker.start()
+        self.__collector.start()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        self.__done.put(None)
+        self.__collector.join()
+
+    def __collect(self):
+        while True:
+            item = self.__done.get()
+            if item is None:
+                break
+            index, slot = item
+            worker = self.workers[index]
+            try:
+                self.on_result(worker, worker.records[slot], worker.frames[slot])
+            finally:
+                worker.release(slot)
@@ -0,0 +1,95 @@
+"""
+Opt-in timing of every pipeline step and of capture, measurement, drawing and publishing.
+
+Code that is profiled takes time.perf_counter_ns() before a stage and hands
+it to StageProfiler.lap() after it. Each stage keeps its last durations in a
+preallocated ring, so recording a frame allocates nothing. Without a
+profiler the only cost is an `is not None` test per stage.
+"""
+
+import sys
+from time import perf_counter_ns
+
+import numpy
+
+
+PERF_TABLE = 'Vision/Perf'
+
+
+class StageTimes:
+    """
+    The last durations of one stage, in nanoseconds.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self.total = 0
+        self.samples = numpy.zeros(size, dtype=numpy.int64)
+
+    def add(self, ns):
+        self.samples[self.count % self.size] = ns
+        self.count += 1
+        self.total += ns
+
+    def recent(self):
+        return self.samples[:min(self.count, self.size)]
+
+
+class StageProfiler:
+    """
+    Durations of named stages, e.g. "Green/CV_erode0", each in its own ring of StageTimes.
+
+    A stage is written by one thread only, different stages may be written by
+    different threads.
+    """
+
+    def __init__(self, size=512):
+        """
+        Args:
+            size: Durations kept per stage for the summaries.
+        """
+        self.size = size
+        self.stages = {}
+
+    def lap(self, name, start):
+        """Record the time since start for a stage.
+        Args:
+            name: Stage name.
+            start: perf_counter_ns() when the stage began.
+        Returns:
+            perf_counter_ns() now, the start of whatever comes next.
+        """
+        end = perf_counter_ns()
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageTimes(self.size)
+        stage.add(end - start)
+        return end
+
+    def summary(self):
+        """Per stage, in name order: (name, count, mean, p50, p95, max), times in milliseconds."""
+        rows = []
+        for name in sorted(self.stages):
+            stage = self.stages[name]
+            recent = stage.recent()
+            if len(recent) == 0:
+                continue
+            p50, p95 = numpy.percentile(recent, (50, 95)) / 1e6
+            rows.append((name, stage.count, stage.total / stage.count / 1e6, p50, p95, recent.max() / 1e6))
+        return rows
+
+    def publish(self, table):
+        """Put every stage's mean, p50, p95 and max into a NetworkTables table, e.g. PERF_TABLE."""
+        for name, count, mean, p50, p95, worst in self.summary():
+            table.putNumber(name + ' mean', mean)
+            table.putNumber(name + ' p50', p50)
+            table.putNumber(name + ' p95', p95)
+            table.putNumber(name + ' max', worst)
+
+    def dump(self, file=sys.stdout):
+        """Print the summary as a table."""
+        print("{:<32} {:>8} {:>9} {:>9} {:>9} {:>9}".format("stage", "count", "mean ms", "p50 ms", "p95 ms", "max ms"), file=file)
+        for row in self.summary():
+            print("{:<32} {:>8} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}".format(*row), file=file)
+        file.flush()
@@ -0,0 +1,136 @@
+"""
+Lowers a camera's frame rate or resolution while the vision loop cannot keep up, and raises it again after.
+
+The FrameGrabber already hands out only the newest frame and counts the
+ones nobody took, so latency stays bounded by one frame plus processing.
+Frames that are captured and decoded only to be dropped still cost CPU,
+though. Under sustained overload the RateController steps the camera down
+a ladder of modes through setConfigJson, using the same keys as a camera in
+/boot/frc.json, and steps back up once the loop has headroom for the next
+mode up.
+"""
+
+import json
+import sys
+
+
+def rateModes(config, resolution=False, min_fps=5):
+    """The ladder of (width, height, fps) modes for a camera, its configured mode first.
+    Args:
+        config: The camera's /boot/frc.json object.
+        resolution: Also try half the resolution. Only for cameras nothing measures in pixels.
+        min_fps: Lowest frame rate tried.
+    """
+    width = int(config.get("width", 640))
+    height = int(config.get("height", 480))
+    fps = int(config.get("fps", 30))
+    rates = [fps]
+    for rate in (fps * 2 // 3, fps // 2, fps // 3):
+        if rate >= min_fps and rate < rates[-1]:
+            rates.append(rate)
+
+    modes = [(width, height, rates[0])]
+    if resolution:
+        # smaller frames first, they keep the motion smooth
+        width, height = width // 2, height // 2
+        modes.append((width, height, rates[0]))
+    modes.extend((width, height, rate) for rate in rates[1:])
+    return modes
+
+
+class RateController:
+    """
+    Steps one camera through its modes from the loop's load and the camera's dropped frames.
+    """
+
+    def __init__(self, camera, config, grabber, modes, worker=None, drop_limit=0.2, busy_limit=0.9, headroom=0.6, patience=3):
+        """
+        Args:
+            camera: The cscore camera to reconfigure.
+            config: The camera's /boot/frc.json object, copied with each mode's width, height and fps.
+            grabber: The camera's FrameGrabber, for its frame counts.
+            modes: (width, height, fps) ladder from rateModes().
+            worker: The camera's PipelineWorker with the process pool, frames it rejects count as dropped.
+            drop_limit: Fraction of frames dropped that counts as overload.
+            busy_limit: Fraction of the time the loop is busy that counts as overload.
+            headroom: Busy fraction the next mode up may be expected to reach and still be stepped up to.
+            patience: Updates in a row that must agree before stepping down, twice that before stepping up.
+        """
+        self.camera = camera
+        self.config = config
+        self.grabber = grabber
+        self.modes = modes
+        self.worker = worker
+        self.drop_limit = drop_limit
+        self.busy_limit = busy_limit
+        self.headroom = headroom
+        self.patience = patience
+
+        self.mode = 0
+        self.drop_ratio = 0.0
+        self.__overloaded = 0
+        self.__idle = 0
+        self.__captured = grabber.frames_captured
+        self.__dropped = self.__framesDropped()
+
+    def update(self, busy):
+        """Look at the camera's drops since the last update and step if it has been over- or underloaded long enough.
+        Args:
+            busy: Fraction of the time since the last update the loop was not waiting for frames.
+        Returns:
+            True if the mode changed.
+        """
+        captured = self.grabber.frames_captured
+        dropped = self.__framesDropped()
+        new_frames = captured - self.__captured
+        self.drop_ratio = (dropped - self.__dropped) / new_frames if new_frames > 0 else 0.0
+        self.__captured = captured
+        self.__dropped = dropped
+
+        if self.drop_ratio > self.drop_limit or (busy > self.busy_limit and self.drop_ratio > 0):
+            self.__overloaded += 1
+            self.__idle = 0
+        elif self.mode > 0 and self.drop_ratio == 0 and busy * self.__cost(self.mode - 1) / self.__cost(self.mode) < self.headroom:
+            self.__idle += 1
+            self.__overloaded = 0
+        else:
+            self.__overloaded = 0
+            self.__idle = 0
+
+        if self.__overloaded >= self.patience and self.mode < len(self.modes) - 1:
+            return self.setMode(self.mode + 1)
+        if self.__idle >= 2 * self.patience:
+            return self.setMode(self.mode - 1)
+        return False
+
+    def setMode(self, mode):
+        """Reconfigure the camera to a mode of the ladder."""
+        width, height, fps = self.modes[mode]
+        config = dict(self.config, width=width, height=height, fps=fps)
+        if not self.camera.setConfigJson(json.dumps(config)):
+            print("camera '{}': could not switch to {}x{} at {} fps".format(self.grabber.camera_name, width, height, fps), file=sys.stderr)
+            return False
+        print("camera '{}': {}x{} at {} fps".format(self.grabber.camera_name, width, height, fps))
+        self.mode = mode
+        self.__overloaded = 0
+        self.__idle = 0
+        return True
+
+    def publish(self, table):
+        """Put the camera's current frame rate, width and drop ratio into a NetworkTables table."""
+        width, height, fps = self.modes[self.mode]
+        name = self.grabber.camera_name
+        table.putNumber('Camera FPS ' + name, fps)
+        table.putNumber('Camera Width ' + name, width)
+        table.putNumber('Drop Ratio ' + name, self.drop_ratio)
+
+    def __framesDropped(self):
+        dropped = self.grabber.framesDropped()
+        if self.worker is not None:
+            dropped += self.worker.frames_rejected
+        return dropped
+
+    def __cost(self, mode):
+        """Pixels per second of a mode, what decoding and processing scale with."""
+        width, height, fps = self.modes[mode]
+        return width * height * fps
@@ -0,0 +1,119 @@
+from pipeline_pool import GREEN_KEYS, YELLOW_KEYS
+from latency import now
+
+
+RESULT_KEY = 'Vision Result'
+
+# every pipeline's results in the array, each after the stamp of the frame they came from
+RESULT_GROUPS = [('green', GREEN_KEYS), ('yellow', YELLOW_KEYS)]
+
+# the stamp: frame id, capture time in robot FPGA seconds (-1 until the robot
+# puts its time) and capture-to-publish latency in milliseconds, -1 before the first frame
+STAMP_FIELDS = ['frame id', 'capture time', 'latency']
+
+# layout of the number array under RESULT_KEY
+RESULT_FIELDS = [field for name, keys in RESULT_GROUPS for field in [name + ' ' + stamp for stamp in STAMP_FIELDS] + keys]
+
+
+class ResultPublisher:
+    """
+    Collects a frame's results and publishes them to NetworkTables as one number array.
+
+    Stands in for the table getValuesGreen/getValuesYellow put their numbers
+    into. publish() then sends every result as a single array, laid out as
+    RESULT_FIELDS, when some result moved by more than epsilon, and flushes
+    right away so the robot sees it without waiting for the next
+    NetworkTables update interval. While nothing moves, the array still goes
+    out every stamp_interval with the newest stamps, so a target that holds
+    still is not mistaken for vision that stopped. Each pipeline's results carry the frame id,
+    capture time and latency of the frame they were measured on, so results
+    of the other pipeline that did not change keep their own, older stamp.
+    The robot can also get a capture time on its own clock as the time it
+    received the array minus the latency, which only leaves out the network.
+    """
+
+    def __init__(self, table, flush=None, epsilon=1e-3, individual_keys=False, robot_clock=None, stamp_interval=0.1):
+        """
+        Args:
+            table: NetworkTables table to publish to.
+            flush: Function that flushes NetworkTables, e.g. NetworkTablesInstance.flush.
+            epsilon: Smallest change of any result that is published.
+            individual_keys: Also put every result under its own key, as before the array existed.
+            robot_clock: latency.ClockOffset of the robot's FPGA clock.
+            stamp_interval: Longest time in seconds newer stamps go unsent while no result changes.
+        """
+        self.table = table
+        self.flush = flush
+        self.epsilon = epsilon
+        self.individual_keys = individual_keys
+        self.robot_clock = robot_clock
+        self.stamp_interval = stamp_interval
+
+        self.values = dict((key, -1.0) for key in GREEN_KEYS + YELLOW_KEYS)
+        # per RESULT_GROUPS name, the stamp of the frame its results came from
+        self.stamps = dict((name, [-1.0, -1.0, -1.0]) for name, keys in RESULT_GROUPS)
+        self.published = None
+        self.publish_count = 0
+        # sent with unchanged results, only for newer stamps
+        self.stamp_count = 0
+        self.sent_at = None
+        # now() of the first results sent, startup ends there
+        self.first_published = None
+        self.skip_count = 0
+        # of the last publish() call, sent or not
+        self.latency = -1.0
+
+    def putNumber(self, key, value):
+        self.values[key] = float(value)
+        return True
+
+    def getNumber(self, key, defaultValue):
+        return self.values.get(key, defaultValue)
+
+    def publish(self, frame_id, capture_time, group):
+        """Publish the collected results if any changed, or the stamps if they have not been for stamp_interval.
+        Args:
+            frame_id: Number of the frame the group's results came from.
+            capture_time: When that frame was captured, in latency.now() seconds.
+            group: RESULT_GROUPS name of the pipeline that measured the frame, e.g. 'green'.
+        Returns:
+            True if anything was sent.
+        """
+        self.latency = (now() - capture_time) * 1000.0
+        robot_time = None if self.robot_clock is None else self.robot_clock.toTheirs(capture_time)
+        if robot_time is None:
+            robot_time = -1.0
+        self.stamps[group] = [float(frame_id), robot_time, self.latency]
+
+        results = [self.values[key] for key in GREEN_KEYS + YELLOW_KEYS]
+        changed = self.published is None or self.__changed(results)
+        if not changed and now() - self.sent_at < self.stamp_interval:
+            self.skip_count += 1
+            return False
+
+        array = []
+        for name, keys in RESULT_GROUPS:
+            array.extend(self.stamps[name])
+            array.extend(self.values[key] for key in keys)
+        self.table.putNumberArray(RESULT_KEY, array)
+        if self.individual_keys and changed:
+            for key, value in zip(GREEN_KEYS + YELLOW_KEYS, results):
+                self.table.putNumber(key, value)
+        if self.flush is not None:
+            self.flush()
+        self.sent_at = now()
+        if not changed:
+            self.stamp_count += 1
+            return True
+        self.published = results
+        self.publish_count += 1
+        if self.first_published is None:
+            self.first_published = now()
+        return True
+
+    def __changed(self, results):
+        for old, new in zip(self.published, results):
+            # NaN != NaN, treat it as unchanged against itself
+            if abs(new - old) > self.epsilon or (old == old) != (new == new):
+                return True
+        return False
@@ -0,0 +1,115 @@
+import time
+
+import cv2
+
+
+class RoiTracker:
+    """
+    Runs a pipeline only on a window around the previous detection.
+
+    Contours come back in full-frame coordinates, so the tracker can stand in
+    for the pipeline it wraps. The whole frame is searched again as soon as
+    the target is lost, and every full_search_interval frames to pick up new
+    targets. A contour that touches an edge of the window inside the frame may
+    be cut off by it, so that counts as lost too and the frame is searched
+    whole, keeping the measured centre, distance and angle the same as
+    without the tracker.
+    """
+
+    def __init__(self, pipeline, margin=48, full_search_interval=15):
+        """Wrap a pipeline.
+        Args:
+            pipeline: A GRIP pipeline with process() and filter_contours_output.
+            margin: Pixels added around the last detection on every side.
+            full_search_interval: Search the full frame at least this often.
+        """
+        self.pipeline = pipeline
+        self.margin = margin
+        self.full_search_interval = full_search_interval
+
+        self.filter_contours_output = None
+        self.roi = None
+
+        self.roi_frames = 0
+        self.roi_hits = 0
+        self.full_frame_ms = None
+        self.roi_ms = None
+
+        self.__roi_run = 0
+
+    def process(self, source0):
+        """
+        Runs the pipeline on the region of interest, or on the whole frame when there is none.
+        """
+        if self.roi is not None and self.__roi_run < self.full_search_interval:
+            x, y, w, h = self.roi
+            start = time.perf_counter()
+            self.pipeline.process(source0[y:y + h, x:x + w])
+            contours = self.pipeline.filter_contours_output
+            clipped = self.__clipped(contours, source0.shape[1], source0.shape[0])
+            for contour in contours:
+                contour += (x, y)
+            self.roi_ms = self.__average(self.roi_ms, (time.perf_counter() - start) * 1000)
+
+            self.roi_frames += 1
+            self.__roi_run += 1
+            if contours and not clipped:
+                self.roi_hits += 1
+            else:
+                # lost it or cut it off, look everywhere before giving up on this frame
+                contours = self.__processFullFrame(source0)
+        else:
+            contours = self.__processFullFrame(source0)
+
+        self.filter_contours_output = contours
+        self.roi = self.__window(contours, source0.shape[1], source0.shape[0])
+
+    def hitRate(self):
+        """Fraction of region of interest frames that still found the target."""
+        return self.roi_hits / self.roi_frames if self.roi_frames else 0.0
+
+    def timeSavedMs(self):
+        """Average milliseconds saved by a region of interest frame over a full-frame one."""
+        if self.full_frame_ms is None or self.roi_ms is None:
+            return 0.0
+        return self.full_frame_ms - self.roi_ms
+
+    def __processFullFrame(self, source0):
+        start = time.perf_counter()
+        self.pipeline.process(source0)
+        self.full_frame_ms = self.__average(self.full_frame_ms, (time.perf_counter() - start) * 1000)
+        self.__roi_run = 0
+        return self.pipeline.filter_contours_output
+
+    def __clipped(self, contours, frame_width, frame_height):
+        """True if a contour, in window coordinates, touches a window edge that is not an edge of the frame."""
+        x, y, w, h = self.roi
+        for contour in contours:
+            left, top, width, height = cv2.boundingRect(contour)
+            if ((x > 0 and left == 0) or (y > 0 and top == 0) or
+                    (x + w < frame_width and left + width >= w) or (y + h < frame_height and top + height >= h)):
+                return True
+        return False
+
+    def __window(self, contours, frame_width, frame_height):
+        """Bounding box of all contours grown by the margin and clipped to the frame, or None."""
+        if not contours:
+            return None
+        left, top, right, bottom = frame_width, frame_height, 0, 0
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            left = min(left, x)
+            top = min(top, y)
+            right = max(right, x + w)
+            bottom = max(bottom, y + h)
+        # even left and right edges keep the pixel pairs of a YUYV frame together
+        left = max(0, left - self.margin) & ~1
+        top = max(0, top - self.margin)
+        right = min(frame_width, (right + self.margin + 1) & ~1)
+        bottom = min(frame_height, bottom + self.margin)
+        return (left, top, right - left, bottom - top)
+
+    @staticmethod
+    def __average(average, value):
+        """Exponential moving average, seeded with the first value."""
+        return value if average is None else average * 0.95 + value * 0.05
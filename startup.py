@@ -0,0 +1,87 @@
+"""
+Time from power-on to the first published result, phase by phase.
+
+After a brownout the Pi boots, Python starts, the modules import, the
+cameras open and the pipelines pay their first-frame costs before the robot
+sees a single target. StartupTimer records when each phase began and ended
+on the now() clock, which on Linux counts from boot, so the report covers
+the whole way from the kernel to the first result. Phases may overlap: the
+pipelines warm up while the cameras are being opened.
+"""
+
+import os
+import sys
+
+import numpy
+
+from latency import now
+
+
+def processStartTime():
+    """now() when this process started, read from /proc, or None where that is not available."""
+    try:
+        with open("/proc/self/stat", "rt") as f:
+            stat = f.read()
+        # the fields after the command name, which may hold spaces; starttime is field 22
+        ticks = int(stat.rsplit(")", 1)[1].split()[19])
+        return ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def warmPipeline(pipeline, measure=None, table=None, shape=(480, 640, 3)):
+    """Run a pipeline, and its measurement into a table that is not published, once on a black frame.
+
+    The first frame pays for OpenCV's lazy initialisation and the pipeline's
+    buffers. Paying it here keeps it off the first camera frame. A pipeline
+    with a warm(shape) of its own, whose paths a black frame does not all
+    take, is warmed through that.
+    """
+    if hasattr(pipeline, "warm"):
+        pipeline.warm(shape)
+    else:
+        pipeline.process(numpy.zeros(shape, dtype=numpy.uint8))
+    if measure is not None:
+        measure(pipeline.filter_contours_output, table)
+
+
+class StartupTimer:
+    """
+    Named phases of startup, each from when it began to when it ended, in now() seconds.
+    """
+
+    def __init__(self, start=None):
+        """
+        Args:
+            start: now() when the process started, now() if None.
+        """
+        self.start = now() if start is None else start
+        self.phases = []
+        self.first_result = None
+
+    def record(self, name, began, ended=None):
+        """Add a phase that ran from began to ended, ended defaults to now()."""
+        self.phases.append((name, began, now() if ended is None else ended))
+
+    def firstResult(self, time=None):
+        """Mark the first published result, at now() if time is None. Returns True the first time only."""
+        if self.first_result is not None:
+            return False
+        self.first_result = now() if time is None else time
+        return True
+
+    def publish(self, table):
+        """Put every phase's duration and the time to the first result into a NetworkTables table, in seconds."""
+        for name, began, ended in self.phases:
+            table.putNumber('Startup ' + name, ended - began)
+        if self.first_result is not None:
+            table.putNumber('Time To First Result', self.first_result - self.start)
+
+    def report(self, file=sys.stdout):
+        """Print the phases as a timeline from the process start."""
+        print("{:<24} {:>9} {:>9} {:>9}".format("startup phase", "begin s", "end s", "took s"), file=file)
+        for name, began, ended in self.phases:
+            print("{:<24} {:>9.3f} {:>9.3f} {:>9.3f}".format(name, began - self.start, ended - self.start, ended - began), file=file)
+        if self.first_result is not None:
+            print("first result after {:.3f} s".format(self.first_result - self.start), file=file)
+        file.flush()
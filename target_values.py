@@ -0,0 +1,264 @@
+import numpy
+
+from measurements import distance_to_camera, angleFinder, measureGreen, measureYellow
+
+
+def getValuesGreen(contours_output_green, sd, overlay=None):
+    """Measure the green target, put the results in sd and record its annotations in overlay if given."""
+
+    if overlay is not None:
+        overlay.clear()
+
+    if not contours_output_green:
+        x_center_green = -1
+        y_center_green = -1
+
+        sd.putNumber('Center X Green', x_center_green)
+        sd.putNumber('Center Y Green', y_center_green)
+
+        #only get yellow distance
+        inchesG = -1
+        sd.putNumber('Green Distance', inchesG)
+        sd.putNumber('Green Angle', -1)
+        return
+
+    #the first contour is the target
+    green = measureGreen(contours_output_green[:1])[0]
+
+    inchesG = green['distance']
+    sd.putNumber('Green Distance', inchesG)
+    sd.putNumber('Green Angle', green['angle'])
+
+    x_center_green = green['center_x']
+    y_center_green = green['center_y']
+    sd.putNumber('Center X Green', x_center_green)
+    sd.putNumber('Center Y Green', y_center_green)
+
+    if overlay is None:
+        return
+
+    #Display Distance
+    overlay.text("Distance={}in".format(inchesG.astype(numpy.int64)), (x_center_green - 50, y_center_green + 50), (255, 0, 255))
+
+    #Points of corner
+    max_point = (green['right_x'], green['right_y'])
+    min_point = (green['left_x'], green['left_y'])
+    overlay.circle(max_point, 5, (0,0,255), -1)
+    overlay.circle(min_point, 5, (0,0,255), -1)
+
+    #Draw line from corner to corner
+    overlay.line(max_point, min_point, (255,0,255), 5)
+
+    #draw crosshair
+    overlay.line((x_center_green, y_center_green - 50), (x_center_green, y_center_green + 50), (255,0,255), 3)
+
+    #Angle
+    overlay.text("Angle={}deg".format(green['angle'].astype(numpy.int64)), (x_center_green - 50, y_center_green + 90), (255, 0, 255))
+
+def getValuesYellow(contours_output_yellow, sd, overlay=None):
+    """Measure the closest yellow ball, put the results in sd and record annotations for all balls in overlay if given."""
+
+    if overlay is not None:
+        overlay.clear()
+
+    if not contours_output_yellow:
+        x_center_yellow = -1
+        y_center_yellow = -1
+
+        sd.putNumber('Center X Yellow', x_center_yellow)
+        sd.putNumber('Center Y Yellow', y_center_yellow)
+
+        #only get green distance
+        inchesY = -1
+        sd.putNumber('Yellow Distance', inchesY)
+        return
+
+    balls = measureYellow(contours_output_yellow)
+
+    if overlay is not None:
+        for ball in balls:
+            x_center_yellow = ball['center_x']
+            y_center_yellow = ball['center_y']
+            x_min_yellow = ball['x_min']
+            x_max_yellow = ball['x_max']
+            y_min_yellow = ball['y_min']
+            y_max_yellow = ball['y_max']
+
+            overlay.line((x_center_yellow, y_center_yellow - 15), (x_center_yellow, y_center_yellow + 15), (0,0,0), 5)
+            overlay.line((x_center_yellow - 15, y_center_yellow), (x_center_yellow + 15, y_center_yellow), (0,0,0), 5)
+
+            overlay.line((x_max_yellow, y_max_yellow), (x_max_yellow, y_min_yellow), (0,0,0), 5)
+            overlay.line((x_min_yellow, y_max_yellow), (x_min_yellow, y_min_yellow), (0,0,0), 5)
+            overlay.line((x_max_yellow, y_max_yellow), (x_min_yellow, y_max_yellow), (0,0,0), 5)
+            overlay.line((x_max_yellow, y_min_yellow), (x_min_yellow, y_min_yellow), (0,0,0), 5)
+
+            #Display Distance
+            overlay.text("Distance={}in".format(ball['distance'].astype(numpy.int64)), (x_center_yellow - 70, y_center_yellow + 70), (0, 0, 0))
+
+    #closest ball, the first one if several are as close
+    closest = balls[numpy.argmin(balls['distance'])]
+    if closest['distance'] < 10000:
+        sd.putNumber('Center X Yellow', closest['center_x'])
+        sd.putNumber('Center Y Yellow', closest['center_y'])
+        sd.putNumber('Yellow Distance', closest['distance'])
+
+#
+# def getValuesBoth(image, contours_output_green, contours_output_yellow, sd):
+#
+#     contourPoints_green = contours_output_green[0][:,0]
+#
+#     x_points_green = contourPoints_green[:,0]
+#     y_points_green = contourPoints_green[:,1]
+#
+#     x_min_green = numpy.amin(x_points_green)
+#     x_max_green = numpy.amax(x_points_green)
+#
+#     sorted_contours = sorted(contourPoints_green, key=lambda tup: tup[0])
+#     #print(sorted_contours_min[0])
+#     min_point = sorted_contours[0]
+#     #print(min_point)
+#     max_point = sorted_contours[len(sorted_contours)-1]
+#     #print(max_point)
+#
+#     sorted_contours = sorted(contourPoints_green, key=lambda tup: tup[0])
+#     #print(sorted_contours_min[0])
+#     min_point = sorted_contours[0]
+#     #print(min_point)
+#     max_point = sorted_contours[len(sorted_contours)-1]
+#     #print(max_point)
+#
+#     y_min_green = numpy.amin(y_points_green)
+#     y_max_green = numpy.amax(y_points_green)
+#     #for distance
+#     Green_Width = x_max_green - x_min_green
+#     #sd.putNumber('Green Width', Green_Width)
+#
+#     #call distance function to return widths
+#     Green_Real_Width = 39 #in
+#
+#     #Find slope of the target
+#     slope = (min_point[1] - max_point[1])/(min_point[0]-max_point[0])
+#
+#     #Find angle of the target
+#     angle_green = angleFinder(slope)
+#
+#     #find distance
+#     inchesG = distance_to_camera(Green_Real_Width, Green_Width) - (0.0111*(angle_green*angle_green)) + (0.0809*angle_green)
+#     sd.putNumber('Green Distance', inchesG)
+#
+#     #sd.putNumber('Min X Green', x_min_green)
+#     #sd.putNumber('Max X Green', x_max_green)
+#     #sd.putNumber('Min Y Green', y_min_green)
+#     #sd.putNumber('Max Y Green', y_max_green)
+#
+#
+#     area_green = (x_max_green - x_min_green) * (y_max_green - y_min_green)
+#
+#     #sd.putNumber('Green Area', area_green)
+#
+#     x_center_green = ((max_point[0]-min_point[0])/2) + min_point[0]
+#     if (max_point[1] > min_point[1]):
+#         y_center_green = ((max_point[1] - min_point[1])/2) + min_point[1]
+#
+#     elif (max_point[1] < min_point[1]):
+#         y_center_green = ((min_point[1] - max_point[1])/2) + max_point[1]
+#
+#     else:
+#         y_center_green = min_point[1]
+#
+#     sd.putNumber('Center X Green', x_center_green)
+#     sd.putNumber('Center Y Green', y_center_green)
+#
+#     #image = cv2.line(image, ((x_center_green).astype(numpy.int64),((y_center_green) - 15).astype(numpy.int64)),((x_center_green).astype(numpy.int64),((y_center_green) + 15).astype(numpy.int64)),(255,0,255),5)
+#     #image = cv2.line(image, (((x_center_green) - 15).astype(numpy.int64),(y_center_green).astype(numpy.int64)),(((x_center_green) + 15).astype(numpy.int64),(y_center_green).astype(numpy.int64)),(255,0,255),5)
+#
+#     #image = cv2.line(image, ((x_max_green).astype(numpy.int64),((y_max_green)).astype(numpy.int64)),((x_max_green).astype(numpy.int64),((y_min_green)).astype(numpy.int64)),(255,0,255),5)
+#     #image = cv2.line(image, (((x_min_green)).astype(numpy.int64),(y_max_green).astype(numpy.int64)),(((x_min_green)).astype(numpy.int64),(y_min_green).astype(numpy.int64)),(255,0,255),5)
+#     #image = cv2.line(image, ((x_max_green).astype(numpy.int64),((y_max_green)).astype(numpy.int64)),((x_min_green).astype(numpy.int64),((y_max_green)).astype(numpy.int64)),(255,0,255),5)
+#     #image = cv2.line(image, (((x_max_green)).astype(numpy.int64),(y_min_green).astype(numpy.int64)),(((x_min_green)).astype(numpy.int64),(y_min_green).astype(numpy.int64)),(255,0,255),5)
+#
+#     #Display Distance
+#     image = cv2.putText(image, "Distance={}in".format(inchesG.astype(numpy.int64)),((x_center_green - 50).astype(numpy.int64), (y_center_green +50).astype(numpy.int64)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 255), 3)
+#
+#     image = cv2.circle(image, (max_point[0], max_point[1]), 5, (0,0,255), -1)
+#     image = cv2.circle(image, (min_point[0], min_point[1]), 5, (0,0,255), -1)
+#
+#     image = cv2.line(image, ((max_point[0]),(max_point[1])),(min_point[0],min_point[1]),(255,0,255),5)
+#
+#     #Draw Crosshair
+#     image = cv2.line(image, ((x_center_green).astype(numpy.int64), (y_center_green - 50).astype(numpy.int64)), ((x_center_green).astype(numpy.int64), (y_center_green +50).astype(numpy.int64)), (255,0,255), 3)
+#
+#     #Angle
+#     image = cv2.putText(image, "Angle={}deg".format(angle_green.astype(numpy.int64)),((x_center_green - 50).astype(numpy.int64), (y_center_green +90).astype(numpy.int64)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 255), 3)
+#
+#     #Start of Yellow Code
+#     inchesZ = 10000
+#
+#     for contours in contours_output_yellow:
+#
+#         contourPoints = contours[:,0]
+#
+#         x_points_yellow = contourPoints[:,0]
+#         y_points_yellow = contourPoints[:,1]
+#
+#         x_min_yellow = numpy.amin(x_points_yellow)
+#         x_max_yellow = numpy.amax(x_points_yellow)
+#
+#         #for distance
+#         Yellow_Width = x_max_yellow - x_min_yellow
+#         #sd.putNumber('Yellow Width', Yellow_Width)
+#
+#         #call distance function to return widths
+#         Yellow_Real_Width = 7 #in
+#         inchesY = distance_to_camera(Yellow_Real_Width, Yellow_Width)
+#         #sd.putNumber('Yellow Distance', inchesY)
+#
+#         #sd.putNumber('YellowDistance', inchesY)
+#
+#         y_min_yellow = numpy.amin(y_points_yellow)
+#         y_max_yellow = numpy.amax(y_points_yellow)
+#
+#         #sd.putNumber('Min X Yellow', x_min_yellow)
+#         #sd.putNumber('Max X Yellow', x_max_yellow)
+#         #sd.putNumber('Min Y Yellow', y_min_yellow)
+#         #sd.putNumber('Max Y Yellow', y_max_yellow)
+#
+#         area_yellow = (x_max_yellow - x_min_yellow) * (y_max_yellow - y_min_yellow)
+#
+#         #sd.putNumber('Yellow Area', area_yellow)
+#
+#         x_center_yellow = ((x_max_yellow - x_min_yellow)/2) + x_min_yellow
+#         y_center_yellow = ((y_max_yellow - y_min_yellow)/2) + y_min_yellow
+#
+#         #sd.putNumber('Center X Yellow', x_center_yellow)
+#         #sd.putNumber('Center Y Yellow', y_center_yellow)
+#
+#         image = cv2.line(image, ((x_center_yellow).astype(numpy.int64),((y_center_yellow) - 15).astype(numpy.int64)),((x_center_yellow).astype(numpy.int64),((y_center_yellow) + 15).astype(numpy.int64)),(0,0,0),5)
+#         image = cv2.line(image, (((x_center_yellow) - 15).astype(numpy.int64),(y_center_yellow).astype(numpy.int64)),(((x_center_yellow) + 15).astype(numpy.int64),(y_center_yellow).astype(numpy.int64)),(0,0,0),5)
+#
+#         image = cv2.line(image, ((x_max_yellow).astype(numpy.int64),((y_max_yellow)).astype(numpy.int64)),((x_max_yellow).astype(numpy.int64),((y_min_yellow)).astype(numpy.int64)),(0,0,0),5)
+#         image = cv2.line(image, (((x_min_yellow)).astype(numpy.int64),(y_max_yellow).astype(numpy.int64)),(((x_min_yellow)).astype(numpy.int64),(y_min_yellow).astype(numpy.int64)),(0,0,0),5)
+#         image = cv2.line(image, ((x_max_yellow).astype(numpy.int64),((y_max_yellow)).astype(numpy.int64)),((x_min_yellow).astype(numpy.int64),((y_max_yellow)).astype(numpy.int64)),(0,0,0),5)
+#         image = cv2.line(image, (((x_max_yellow)).astype(numpy.int64),(y_min_yellow).astype(numpy.int64)),(((x_min_yellow)).astype(numpy.int64),(y_min_yellow).astype(numpy.int64)),(0,0,0),5)
+#
+#         #Display Distance
+#         image = cv2.putText(image, "Distance={}in".format(inchesY.astype(numpy.int64)),((x_center_yellow - 70).astype(numpy.int64), (y_center_yellow +70).astype(numpy.int64)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 3)
+#
+#         if (inchesY < inchesZ):
+#             sd.putNumber('Center X Yellow', x_center_yellow)
+#             sd.putNumber('Center Y Yellow', y_center_yellow)
+#             #sd.putNumber('Yellow Area', area_yellow)
+#
+#             #sd.putNumber('Min X Yellow', x_min_yellow)
+#             #sd.putNumber('Max X Yellow', x_max_yellow)
+#             #sd.putNumber('Min Y Yellow', y_min_yellow)
+#             #sd.putNumber('Max Y Yellow', y_max_yellow)
+#
+#             sd.putNumber('Yellow Distance', inchesY)
+#
+#
+#             #sd.putNumber('Yellow Width', Yellow_Width)
+#
+#             inchesZ = inchesY
+#
+#     return image
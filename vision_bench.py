@@ -0,0 +1,1100 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the vision pipelines.
+
+Runs on recorded frames (any .jpg/.png in a directory) or on synthetic
+frames, no cameras or NetworkTables needed. The suite times every
+pipeline, then runs each feature in FEATURES against the way things are
+done without it through compareRuns, on the same frames.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy
+
+from reflective_tape_new import GripPipelineGreen
+from reflective_tape_lines import GripPipelineGreen as GripPipelineGreenLines
+from yellow_ball_test import GripPipelineYellow
+from target_values import getValuesGreen, getValuesYellow
+from overlay import Overlay
+from result_publisher import ResultPublisher
+from latency import ClockOffset, LatencyHistogram, now
+from profiler import StageProfiler
+from startup import warmPipeline
+from frame_recorder import FrameRecorder, ReplaySink
+from frame_grabber import FrameGrabber, waitForFrames
+from rate_control import RateController, rateModes
+from ball_tracker import BallTracker, trackYellow, predictYellow
+from measurements import distance_to_camera, angleFinder, measureGreen, measureYellow
+from grip_engine import GripEngine, GripPipeline, gripPath
+from morphology import MorphologyPlan, ERODE, DILATE
+from roi_tracking import RoiTracker
+from coarse_to_fine import CoarseToFine
+from dashboard_stream import DashboardStream
+from pipeline_pool import PipelinePool, RecordingTable, FRAME_SHAPE, GREEN_KEYS, YELLOW_KEYS
+
+
+# colours that land inside the GRIP thresholds
+GREEN_BGR = (155, 255, 105)
+YELLOW_BGR = (0, 230, 255)
+
+FOCAL_LENGTH = (57 * 69) / 7
+
+
+def syntheticFrame(index, tape_distance=120.0, ball_distances=(48.0, 96.0)):
+    """Draw a frame with a green tape target and yellow balls at known distances (inches)."""
+    height, width = FRAME_SHAPE[0], FRAME_SHAPE[1]
+    image = numpy.full(FRAME_SHAPE, 40, dtype=numpy.uint8)
+
+    # a little noise so the thresholds have something to reject
+    rng = numpy.random.RandomState(index)
+    image += rng.randint(0, 30, size=FRAME_SHAPE).astype(numpy.uint8)
+
+    if tape_distance:
+        tape_width = int(39 * FOCAL_LENGTH / tape_distance)
+        x = (width - tape_width) // 2 + (index % 40) - 20
+        y = height // 3
+        outer = numpy.array([[x, y], [x + tape_width, y],
+                             [x + tape_width * 3 // 4, y + tape_width // 3],
+                             [x + tape_width // 4, y + tape_width // 3]], dtype=numpy.int32)
+        cv2.polylines(image, [outer], True, GREEN_BGR, 8)
+
+    for i, distance in enumerate(ball_distances):
+        radius = int(7 * FOCAL_LENGTH / distance / 2)
+        cx = width // 4 + i * width // 2 + (index % 30) - 15
+        cy = height - radius - 10
+        cv2.circle(image, (cx, cy), radius, YELLOW_BGR, -1)
+
+    return image
+
+
+def loadRecorded(path):
+    """Every .jpg/.png in a directory, resized to FRAME_SHAPE."""
+    frames = []
+    for name in sorted(glob.glob(os.path.join(path, "*.jpg")) + glob.glob(os.path.join(path, "*.png"))):
+        image = cv2.imread(name)
+        if image is None:
+            continue
+        if image.shape != FRAME_SHAPE:
+            image = cv2.resize(image, (FRAME_SHAPE[1], FRAME_SHAPE[0]))
+        frames.append(image)
+    return frames
+
+
+def loadFrames(path, count):
+    """Load recorded frames from a directory, or make synthetic ones when there are none."""
+    frames = loadRecorded(path) if path else []
+    if not frames:
+        frames = [syntheticFrame(i) for i in range(min(count, 60))]
+    while len(frames) < count:
+        frames = frames + frames
+    return frames[:count]
+
+
+def loadCorpus(path, count):
+    """Synthetic frames with targets at known distances plus every recorded frame.
+    Returns:
+        A list of (image, known green distance, known yellow distance), None for recorded frames.
+    """
+    corpus = []
+    for i in range(count):
+        tape_distance = 60.0 + (i % 8) * 20.0
+        ball_distance = 36.0 + (i % 5) * 12.0
+        corpus.append((syntheticFrame(i, tape_distance, (ball_distance, 120.0)), tape_distance, ball_distance))
+    if path:
+        corpus.extend((frame, None, None) for frame in loadRecorded(path))
+    return corpus
+
+
+def allocationsPerFrame(pipeline, measure, frames):
+    """Bytes traced by tracemalloc per frame of pipeline + measure, warmed up.
+    Returns:
+        (mean, largest)
+    """
+    table = RecordingTable()
+    overlay = Overlay()
+    for frame in frames[:10]:
+        pipeline.process(frame)
+        measure(pipeline.filter_contours_output, table, overlay)
+
+    tracemalloc.start()
+    total = worst = 0
+    for frame in frames:
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        pipeline.process(frame)
+        measure(pipeline.filter_contours_output, table, overlay)
+        allocated = tracemalloc.get_traced_memory()[1] - before
+        total += allocated
+        worst = max(worst, allocated)
+    tracemalloc.stop()
+    return total / len(frames), worst
+
+
+def benchTarget(name, pipeline, measure, corpus, key):
+    """Time a pipeline and its measurement over the corpus.
+    Returns:
+        A dict of fps, stage percentiles, allocations, peak RSS and distance error.
+    """
+    frames = [frame for frame, green, yellow in corpus]
+    table = RecordingTable()
+    overlay = Overlay()
+    for frame in frames[:10]:
+        pipeline.process(frame)
+
+    profiler = StageProfiler(size=len(frames))
+    pipeline.useProfiler(profiler, name)
+    errors = []
+    start = time.perf_counter()
+    for (frame, green, yellow) in corpus:
+        begin = time.perf_counter_ns()
+        pipeline.process(frame)
+        lap = time.perf_counter_ns()
+        measure(pipeline.filter_contours_output, table, overlay)
+        profiler.lap(name + "/measure", lap)
+        profiler.lap(name + "/frame", begin)
+        known = green if measure is getValuesGreen else yellow
+        if known is not None and table.values[key] >= 0:
+            errors.append(abs(table.values[key] - known))
+    elapsed = time.perf_counter() - start
+    pipeline.useProfiler(None)
+
+    stages = {}
+    for stage_name, stage in profiler.stages.items():
+        p50, p95, p99 = numpy.percentile(stage.recent(), (50, 95, 99)) / 1e6
+        stages[stage_name] = {"mean ms": stage.total / stage.count / 1e6, "p50 ms": p50, "p95 ms": p95, "p99 ms": p99}
+
+    mean, worst = allocationsPerFrame(pipeline, measure, frames)
+    return {
+        "fps": len(frames) / elapsed,
+        "stages": stages,
+        "allocated bytes per frame": mean,
+        "allocated bytes worst frame": worst,
+        # ru_maxrss is in KiB on Linux, the peak of the whole run so far
+        "peak rss KiB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "distance error in": float(numpy.mean(errors)) if errors else None,
+        "targets found": len(errors),
+    }
+
+
+SUITE = [
+    ("green", GripPipelineGreen, getValuesGreen, "Green Distance"),
+    ("green lines", GripPipelineGreenLines, getValuesGreen, "Green Distance"),
+    ("yellow", GripPipelineYellow, getValuesYellow, "Yellow Distance"),
+]
+
+
+def runSuite(args):
+    corpus = loadCorpus(args.frames, args.count)
+    results = {
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "synthetic frames": args.count,
+        "recorded frames": len(corpus) - args.count,
+        "targets": {},
+    }
+    for name, pipeline_class, measure, key in SUITE:
+        result = results["targets"][name] = benchTarget(name, pipeline_class(), measure, corpus, key)
+        frame = result["stages"][name + "/frame"]
+        print("{:12} {:7.1f} fps  frame p50 {:.2f} p95 {:.2f} p99 {:.2f} ms  {:7.0f} B/frame  rss {} KiB".format(
+            name, result["fps"], frame["p50 ms"], frame["p95 ms"], frame["p99 ms"],
+            result["allocated bytes per frame"], result["peak rss KiB"]))
+        if args.stages:
+            for stage_name in sorted(result["stages"]):
+                stage = result["stages"][stage_name]
+                print("    {:28} p50 {:.3f} p95 {:.3f} p99 {:.3f} ms".format(stage_name, stage["p50 ms"], stage["p95 ms"], stage["p99 ms"]))
+
+    frames = loadFrames(args.frames, args.count)
+    results["features"] = {}
+    for feature, compare in FEATURES:
+        if args.features is not None and feature not in args.features:
+            continue
+        rows = results["features"][feature] = {}
+        for row, inputs, reference, candidate, differ, notes in compare(args, frames):
+            result = rows[row] = compareRuns(inputs, reference, candidate, differ)
+            printComparison(feature, row, reference[0], candidate[0], result, notes() if notes else None)
+
+    if args.compare:
+        with open(args.compare, "rt", encoding="utf-8") as f:
+            before = json.load(f)
+        print("against {}:".format(args.compare))
+        for name, result in results["targets"].items():
+            old = before.get("targets", {}).get(name)
+            if old is None:
+                continue
+            print("{:12} {:7.1f} -> {:7.1f} fps ({:.2f}x)".format(name, old["fps"], result["fps"], result["fps"] / old["fps"]))
+        for feature, rows in results["features"].items():
+            for row, result in rows.items():
+                old = before.get("features", {}).get(feature, {}).get(row)
+                if old is None:
+                    continue
+                print("{:8} {:22} {:.3f} -> {:.3f} ms".format(feature, row, old["candidate ms"], result["candidate ms"]))
+
+    if args.json:
+        with open(args.json, "wt", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+def benchSingle(frames):
+    """Run both pipelines one after another in this process, return frames/sec."""
+    green = GripPipelineGreen()
+    yellow = GripPipelineYellow()
+    table = RecordingTable()
+    overlay = Overlay()
+
+    start = time.perf_counter()
+    for frame in frames:
+        image = frame.copy()
+        green.process(image)
+        getValuesGreen(green.filter_contours_output, table, overlay)
+        overlay.draw(image)
+        image = frame.copy()
+        yellow.process(image)
+        getValuesYellow(yellow.filter_contours_output, table, overlay)
+        overlay.draw(image)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def benchPool(frames):
+    """Run both pipelines in the process pool, return frames/sec."""
+    finished = threading.Semaphore(0)
+    pool = PipelinePool(lambda worker, record, image: finished.release())
+    workers = [pool.addPipeline("Green", GripPipelineGreen, getValuesGreen, GREEN_KEYS),
+               pool.addPipeline("Yellow", GripPipelineYellow, getValuesYellow, YELLOW_KEYS)]
+    pool.start()
+
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        for worker in workers:
+            while not worker.submit(frame, i, 0):
+                time.sleep(0.0005)
+    for i in range(len(frames) * len(workers)):
+        finished.acquire()
+    elapsed = time.perf_counter() - start
+
+    pool.stop()
+    return len(frames) / elapsed
+
+
+def runPool(args):
+    frames = loadFrames(args.frames, args.count)
+    single = benchSingle(frames)
+    pooled = benchPool(frames)
+    print("frames:         {}".format(len(frames)))
+    print("single process: {:.1f} fps".format(single))
+    print("process pool:   {:.1f} fps ({:.2f}x)".format(pooled, pooled / single))
+
+
+# below a 96x96 mask, the smallest window the region of interest tracker uses, so a
+# mask buffer made again on any frame fails; a frame's contours and views come to ~9 KiB
+ALLOC_PEAK_LIMIT = 10 * 1024
+# what the last frame's contours may hold on to more than the first's
+ALLOC_GROWTH_LIMIT = 4 * 1024
+ALLOC_FRAMES = 1000
+
+
+def checkAllocations(pipeline, frames, warmup=10, limit=ALLOC_GROWTH_LIMIT, peak_limit=ALLOC_PEAK_LIMIT):
+    """Run a pipeline with tracemalloc on and check memory stays flat after warm-up.
+    Returns:
+        (growth in bytes after warm-up, largest per-frame peak in bytes, passed)
+    """
+    for frame in frames[:warmup]:
+        pipeline.process(frame)
+
+    tracemalloc.start()
+    start, peak = tracemalloc.get_traced_memory()
+    worst = 0
+    for frame in frames:
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        pipeline.process(frame)
+        current, peak = tracemalloc.get_traced_memory()
+        worst = max(worst, peak - before)
+    end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # contour lists are still built per frame, every image buffer has to be reused
+    return end - start, worst, end - start < limit and worst < peak_limit
+
+
+def allocationPipelines():
+    """(name, pipeline, frame conversion) for every path through the pipelines that keeps buffers."""
+    def lut(pipeline):
+        pipeline.useLookupTable(8)
+        return pipeline
+
+    def yuyv(pipeline):
+        pipeline.useYuyvLookupTable()
+        return pipeline
+
+    return [("green", GripPipelineGreen(), None),
+            ("green lines", GripPipelineGreenLines(), None),
+            ("yellow", GripPipelineYellow(), None),
+            ("green lut", lut(GripPipelineGreen()), None),
+            ("yellow lut", lut(GripPipelineYellow()), None),
+            ("green roi", RoiTracker(GripPipelineGreen()), None),
+            ("green lut roi", RoiTracker(lut(GripPipelineGreen())), None),
+            ("green yuyv roi", RoiTracker(yuyv(GripPipelineGreen())), toYuyv)]
+
+
+def runAlloc(args):
+    frames = loadFrames(args.frames, ALLOC_FRAMES)
+    failed = False
+    for name, pipeline, convert in allocationPipelines():
+        growth, worst, passed = checkAllocations(pipeline, frames if convert is None else [convert(frame) for frame in frames])
+        failed = failed or not passed
+        print("{:16} {} frames, growth {} bytes, worst frame {} bytes: {}".format(
+            name, len(frames), growth, worst, "ok" if passed else "FAILED"))
+    if failed:
+        sys.exit(1)
+
+
+PIPELINES = [("green", GripPipelineGreen), ("green lines", GripPipelineGreenLines), ("yellow", GripPipelineYellow)]
+
+
+def outputOf(pipeline, attribute="filter_contours_output", convert=None):
+    """function(frame) that runs a pipeline on a frame and returns one of its outputs."""
+    def run(frame):
+        pipeline.process(frame if convert is None else convert(frame))
+        return getattr(pipeline, attribute)
+    return run
+
+
+def engineOutput(engine, pipeline):
+    """function(frame) that runs a GripEngine on a frame and returns the contours of one of its pipelines."""
+    def run(frame):
+        engine.process(frame)
+        return pipeline.filter_contours_output
+    return run
+
+
+def loadTime(configure):
+    """Milliseconds configure() takes, e.g. to build a lookup table."""
+    start = time.perf_counter()
+    configure()
+    return (time.perf_counter() - start) * 1000
+
+
+def contoursDiffer(a, b):
+    return len(a) != len(b) or not all(numpy.array_equal(x, y) for x, y in zip(a, b))
+
+
+def pixelsDiffer(a, b):
+    return numpy.count_nonzero(a != b)
+
+
+def resultsDiffer(measure):
+    """A differ for contours that only have to measure the same, e.g. found in a window of the frame."""
+    tables = (RecordingTable(), RecordingTable())
+
+    def differ(a, b):
+        measure(a, tables[0])
+        measure(b, tables[1])
+        return tables[0].values != tables[1].values
+    return differ
+
+
+def compareRuns(inputs, reference, candidate, differ=None):
+    """Time two ways of doing the same thing on every input, one after the other, and compare what they give.
+    Args:
+        inputs: What both are run on, usually frames.
+        reference: (label, function(input) -> output), the way it is done without the feature.
+        candidate: (label, function(input) -> output), the way it is done with it.
+        differ: function(reference output, candidate output) -> how many things differ, None to not compare.
+    Returns:
+        A dict of mean and p95 ms of each, and in how many inputs and how many things they differ.
+    """
+    times = ([], [])
+    differ_inputs = differences = 0
+    for item in inputs:
+        outputs = []
+        for (label, function), elapsed in zip((reference, candidate), times):
+            start = time.perf_counter()
+            outputs.append(function(item))
+            elapsed.append((time.perf_counter() - start) * 1000)
+        if differ is not None:
+            count = int(differ(*outputs))
+            differ_inputs += count != 0
+            differences += count
+    result = {"inputs": len(inputs), "differ": differ_inputs if differ is not None else None, "differences": differences}
+    for key, elapsed in zip(("reference", "candidate"), times):
+        result[key + " ms"] = float(numpy.mean(elapsed))
+        result[key + " p95 ms"] = float(numpy.percentile(elapsed, 95))
+    return result
+
+
+def printComparison(feature, row, reference, candidate, result, notes=None):
+    """Print one row of a feature's comparison, reference and candidate are their labels."""
+    line = "{:8} {:22} {} {:.3f} ms (p95 {:.3f}), {} {:.3f} ms (p95 {:.3f}), {:.2f}x".format(
+        feature, row, reference, result["reference ms"], result["reference p95 ms"],
+        candidate, result["candidate ms"], result["candidate p95 ms"], result["reference ms"] / result["candidate ms"])
+    if result["differ"] is not None:
+        line += ", {} of {} differ".format(result["differ"], result["inputs"])
+        if result["differences"] > result["differ"]:
+            line += " ({} differences)".format(result["differences"])
+    if notes:
+        line += ", " + notes
+    print(line)
+
+
+# every feature below yields (row, inputs, reference, candidate, differ, notes) for compareRuns, where
+# notes is None or a function() -> text for the row, called once the row has run
+
+def compareLut(args, frames):
+    for name, pipeline_class in PIPELINES:
+        for bits in args.bits:
+            pipeline = pipeline_class()
+            load_ms = loadTime(lambda: pipeline.useLookupTable(bits))
+            yield ("{} {} bits".format(name, bits), frames,
+                   ("cvtColor + inRange", outputOf(pipeline_class(), "hsv_threshold_output")),
+                   ("lut", outputOf(pipeline, "hsv_threshold_output")),
+                   pixelsDiffer, lambda: "table load {:.0f} ms".format(load_ms))
+
+
+def toYuyv(frame):
+    """A BGR frame as the packed YUYV buffer a camera would send, U and V taken from the even pixels."""
+    yuv = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV)
+    yuyv = numpy.empty(frame.shape[:2] + (2,), dtype=numpy.uint8)
+    yuyv[:, :, 0] = yuv[:, :, 0]
+    yuyv[:, 0::2, 1] = yuv[:, 0::2, 1]
+    yuyv[:, 1::2, 1] = yuv[:, 0::2, 2]
+    return yuyv
+
+
+def compareYuyv(args, frames):
+    frames = [toYuyv(frame) for frame in frames]
+    bgr = numpy.empty(frames[0].shape[:2] + (3,), dtype=numpy.uint8)
+
+    # what happens without it: cscore decodes every frame to BGR, then the pipeline thresholds it
+    def decode(frame):
+        return cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_YUYV, dst=bgr)
+
+    for name, pipeline_class in PIPELINES:
+        pipeline = pipeline_class()
+        load_ms = loadTime(pipeline.useYuyvLookupTable)
+        yield (name, frames,
+               ("decode + pipeline", outputOf(pipeline_class(), "hsv_threshold_output", decode)),
+               ("yuyv lut", outputOf(pipeline, "hsv_threshold_output")),
+               pixelsDiffer, lambda: "table load {:.0f} ms".format(load_ms))
+
+
+def compareRoi(args, frames):
+    for name, pipeline_class in [("green", GripPipelineGreen), ("green lines", GripPipelineGreenLines)]:
+        tracker = RoiTracker(pipeline_class(), args.margin, args.interval)
+        yield (name, frames, ("full frame", outputOf(pipeline_class())), ("roi tracking", outputOf(tracker)),
+               resultsDiffer(getValuesGreen),
+               lambda: "roi hit rate {:.1f}%, saved {:.2f} ms per roi frame".format(tracker.hitRate() * 100, tracker.timeSavedMs()))
+
+
+def compareGrip(args, frames):
+    for name, grip, pipeline_class in [("green", "Contours_GreenNORESIZE.grip", GripPipelineGreen),
+                                       ("yellow", "Contours_YellowBall.grip", GripPipelineYellow)]:
+        engine = GripEngine()
+        pipeline = engine.addPipeline(gripPath(grip))
+        yield (name, frames, ("generated", outputOf(pipeline_class())), ("engine", engineOutput(engine, pipeline)),
+               contoursDiffer, lambda: "{} steps".format(engine.stepCount()))
+
+    # two pipelines on one camera share every step they have in common
+    once = GripEngine()
+    twice = GripEngine()
+    green = once.addPipeline(gripPath("Contours_GreenNORESIZE.grip"))
+    green_twice = twice.addPipeline(gripPath("Contours_GreenNORESIZE.grip"))
+    twice.addPipeline(gripPath("Contours_GreenNORESIZE.grip"), ("cv_dilate_output",))
+    yield ("green twice", frames, ("once", engineOutput(once, green)), ("twice", engineOutput(twice, green_twice)),
+           contoursDiffer, lambda: "{} vs {} steps".format(once.stepCount(), twice.stepCount()))
+
+
+def compareMorph(args, frames):
+    border = (cv2.BORDER_CONSTANT, -1)
+    for name, pipeline_class, erode, dilate in [("green", GripPipelineGreen, 1, 4), ("green lines", GripPipelineGreenLines, 3, 3), ("yellow", GripPipelineYellow, 0, 3)]:
+        # the masks each pipeline's erode step gets
+        threshold = outputOf(pipeline_class(), "hsv_threshold_output")
+        masks = [threshold(frame).copy() for frame in frames]
+        masks.extend(numpy.zeros_like(masks[0]) for _ in range(len(masks) // 4))
+
+        grip_buffers = (numpy.empty_like(masks[0]), numpy.empty_like(masks[0]))
+        plan_buffers = (numpy.empty_like(masks[0]), numpy.empty_like(masks[0]))
+        plan = MorphologyPlan([(ERODE, None, (-1, -1), erode) + border, (DILATE, None, (-1, -1), dilate) + border])
+
+        def gripCalls(mask):
+            eroded = cv2.erode(mask, None, grip_buffers[0], (-1, -1), iterations=erode, borderType=border[0], borderValue=border[1])
+            return cv2.dilate(eroded, None, grip_buffers[1], (-1, -1), iterations=dilate, borderType=border[0], borderValue=border[1])
+
+        yield (name + " masks", masks, ("grip calls", gripCalls), ("plan", lambda mask: plan.run(mask, *plan_buffers)),
+               pixelsDiffer, lambda: "erode {} + dilate {} -> {}".format(erode, dilate, plan.describe()))
+
+        compiled = pipeline_class()
+        compiled.useMorphologyPlan()
+        yield (name, frames, ("grip calls", outputOf(pipeline_class())), ("plan", outputOf(compiled)), contoursDiffer, None)
+
+    for name, grip in [("green", "Contours_GreenNORESIZE.grip"), ("yellow", "Contours_YellowBall.grip")]:
+        compiled = GripPipeline(gripPath(grip))
+        compiled.useMorphologyPlan()
+        yield (name + " .grip", frames, ("grip calls", outputOf(GripPipeline(gripPath(grip)))), ("plan", outputOf(compiled)),
+               contoursDiffer, None)
+
+
+def behindNet(frame, spacing):
+    """Copy of a frame seen through a net of black 1 pixel lines, spacing pixels apart."""
+    netted = frame.copy()
+    netted[::spacing] = 0
+    netted[:, ::spacing] = 0
+    return netted
+
+
+def comparePyramid(args, frames):
+    count = max(1, len(frames) // 2)
+    # balls broken up by a net, which a coarse copy can miss altogether
+    netted = [behindNet(frame, 3 + i % 4) for i, frame in enumerate(frames[:count])]
+    for name, inputs, yuyv in [("no ball", [syntheticFrame(i, ball_distances=()) for i in range(count)], False),
+                               ("balls", frames[:count], False),
+                               ("net", netted, False),
+                               ("net yuyv", [toYuyv(frame) for frame in netted], True)]:
+        full = GripPipelineYellow()
+        fine = GripPipelineYellow()
+        if yuyv:
+            full.useYuyvLookupTable()
+            fine.useYuyvLookupTable()
+        coarse = CoarseToFine(fine)
+        yield (name, inputs, ("full frame", outputOf(full)), ("coarse-to-fine", outputOf(coarse)),
+               resultsDiffer(getValuesYellow), lambda: "early exit {:.0f}%".format(coarse.earlyExitRate() * 100))
+
+
+def addNoise(frame, fraction, colour, seed):
+    """Copy of a frame with a fraction of its pixels, in small specks, set to a colour."""
+    rng = numpy.random.RandomState(seed)
+    specks = (rng.random_sample(frame.shape[:2]) < fraction / 4).astype(numpy.uint8)
+    specks = cv2.dilate(specks, numpy.ones((2, 2), numpy.uint8))
+    noisy = frame.copy()
+    noisy[specks != 0] = colour
+    return noisy
+
+
+def compareFilter(args, frames):
+    for name, pipeline_class, colour in [("green", GripPipelineGreen, GREEN_BGR),
+                                         ("green lines", GripPipelineGreenLines, GREEN_BGR),
+                                         ("yellow", GripPipelineYellow, YELLOW_BGR)]:
+        for noise in [0.0] + args.noise:
+            noisy = [addNoise(frame, noise, colour, i) for i, frame in enumerate(frames)] if noise else frames
+            grip = pipeline_class()
+            fast = pipeline_class()
+            fast.useFastFilter()
+            yield ("{} {:.1f}% noise".format(name, noise * 100), noisy, ("grip filter", outputOf(grip)), ("fast filter", outputOf(fast)),
+                   contoursDiffer, None)
+
+
+def loopGreen(contours):
+    """getValuesGreen's measurement as it was before measurements.py, (centre x, centre y, distance)."""
+    contourPoints = contours[0][:, 0]
+    x_min = numpy.amin(contourPoints[:, 0])
+    x_max = numpy.amax(contourPoints[:, 0])
+    sorted_contours = sorted(contourPoints, key=lambda tup: tup[0])
+    min_point = sorted_contours[0]
+    max_point = sorted_contours[len(sorted_contours) - 1]
+    slope = (min_point[1] - max_point[1]) / (min_point[0] - max_point[0])
+    angle = angleFinder(slope)
+    inches = distance_to_camera(39, x_max - x_min) - (0.0111 * (angle * angle)) + (0.0809 * angle)
+    x_center = ((max_point[0] - min_point[0]) / 2) + min_point[0]
+    if (max_point[1] > min_point[1]):
+        y_center = ((max_point[1] - min_point[1]) / 2) + min_point[1]
+    elif (max_point[1] < min_point[1]):
+        y_center = ((min_point[1] - max_point[1]) / 2) + max_point[1]
+    else:
+        y_center = min_point[1]
+    return (x_center, y_center, inches)
+
+
+def loopYellow(contours):
+    """getValuesYellow's measurement as it was before measurements.py, closest (centre x, centre y, distance)."""
+    closest = None
+    inchesZ = 10000
+    for contour in contours:
+        contourPoints = contour[:, 0]
+        x_min = numpy.amin(contourPoints[:, 0])
+        x_max = numpy.amax(contourPoints[:, 0])
+        y_min = numpy.amin(contourPoints[:, 1])
+        y_max = numpy.amax(contourPoints[:, 1])
+        inches = distance_to_camera(7, x_max - x_min)
+        x_center = ((x_max - x_min) / 2) + x_min
+        y_center = ((y_max - y_min) / 2) + y_min
+        if inches < inchesZ:
+            closest = (x_center, y_center, inches)
+            inchesZ = inches
+    return closest
+
+
+def vectorGreen(contours):
+    green = measureGreen(contours[:1])[0]
+    return (green["center_x"], green["center_y"], green["distance"])
+
+
+def vectorYellow(contours):
+    balls = measureYellow(contours)
+    closest = balls[numpy.argmin(balls["distance"])]
+    return (closest["center_x"], closest["center_y"], closest["distance"]) if closest["distance"] < 10000 else None
+
+def compareMeasure(args, frames):
+    for name, pipeline_class, loop, vector in [("green", GripPipelineGreen, loopGreen, vectorGreen),
+                                               ("yellow", GripPipelineYellow, loopYellow, vectorYellow)]:
+        contours = outputOf(pipeline_class())
+        contour_lists = [found for found in (list(contours(frame)) for frame in frames[:100]) if found]
+        # green only ever measures its first contour
+        for copies in ([1] if name == "green" else args.contours):
+            # the same frame's contours repeated, as if that many balls were in view
+            batches = [(found * copies)[:max(copies, 1)] for found in contour_lists]
+            yield ("{} {} contours".format(name, copies), batches, ("loop", loop), ("vectorized", vector),
+                   lambda a, b: a != b, None)
+
+
+def compareOverlay(args, frames):
+    for name, pipeline_class, measure in [("green", GripPipelineGreen, getValuesGreen),
+                                          ("yellow", GripPipelineYellow, getValuesYellow)]:
+        contours = outputOf(pipeline_class())
+        results = [(frame.copy(), list(contours(frame))) for frame in frames[:100]]
+        table = RecordingTable()
+        overlay = Overlay()
+
+        def record(result):
+            measure(result[1], table, overlay)
+
+        def recordAndDraw(result):
+            measure(result[1], table, overlay)
+            overlay.draw(result[0])
+
+        yield (name, results, ("measure + record", record), ("+ draw", recordAndDraw), None, None)
+
+
+# what the suite compares, a feature against the way things are done without it
+FEATURES = [
+    ("lut", compareLut),
+    ("yuyv", compareYuyv),
+    ("roi", compareRoi),
+    ("grip", compareGrip),
+    ("morph", compareMorph),
+    ("pyramid", comparePyramid),
+    ("filter", compareFilter),
+    ("measure", compareMeasure),
+    ("overlay", compareOverlay),
+]
+
+
+def runPublish(args):
+    frames = loadFrames(args.frames, args.count)
+    green = GripPipelineGreen()
+    yellow = GripPipelineYellow()
+    contours = []
+    for frame in frames:
+        green.process(frame)
+        yellow.process(frame)
+        contours.append((list(green.filter_contours_output), list(yellow.filter_contours_output)))
+
+    table = RecordingTable()
+    for green_contours, yellow_contours in contours:
+        getValuesGreen(green_contours, table)
+        getValuesYellow(yellow_contours, table)
+    print("individual putNumber:  {:.1f} updates/frame".format(table.puts / len(frames)))
+
+    for epsilon in args.epsilon:
+        table = RecordingTable()
+        publisher = ResultPublisher(table, epsilon=epsilon)
+        for frame_id, (green_contours, yellow_contours) in enumerate(contours):
+            getValuesGreen(green_contours, publisher)
+            publisher.publish(frame_id, now(), 'green')
+            getValuesYellow(yellow_contours, publisher)
+            publisher.publish(frame_id, now(), 'yellow')
+        print("result array, eps {:<5g} {:.2f} updates/frame".format(epsilon, table.puts / len(frames)))
+
+
+def runLatency(args):
+    frames = loadFrames(args.frames, args.count)
+    green = GripPipelineGreen()
+    yellow = GripPipelineYellow()
+    publisher = ResultPublisher(RecordingTable())
+    overlay = Overlay()
+
+    # frames stamped by a clock 1000 s ahead, as if cscore's clock started elsewhere
+    clock = ClockOffset()
+    histograms = {"Green": LatencyHistogram("Green"), "Yellow": LatencyHistogram("Yellow")}
+    for frame_id, frame in enumerate(frames):
+        for name, pipeline, measure in (("Green", green, getValuesGreen), ("Yellow", yellow, getValuesYellow)):
+            timestamp = int((now() + 1000.0) * 1e6)
+            clock.update(timestamp * 1e-6, now())
+            capture_time = clock.toOurs(timestamp * 1e-6)
+            pipeline.process(frame)
+            measure(pipeline.filter_contours_output, publisher, overlay)
+            publisher.publish(frame_id, capture_time, name.lower())
+            histograms[name].add(publisher.latency)
+
+    print("clock offset {:.6f} s (expected -1000)".format(clock.offset))
+    for name, histogram in histograms.items():
+        print("{:<7} capture-to-publish p50 {:.2f} ms  p95 {:.2f} ms  p99 {:.2f} ms".format(name, *histogram.percentiles()))
+
+
+def runProfile(args):
+    frames = loadFrames(args.frames, args.count)
+    green = GripPipelineGreen()
+    yellow = GripPipelineYellow()
+    table = RecordingTable()
+    overlay = Overlay()
+
+    def run():
+        for frame in frames:
+            green.process(frame)
+            getValuesGreen(green.filter_contours_output, table, overlay)
+            yellow.process(frame)
+            getValuesYellow(yellow.filter_contours_output, table, overlay)
+
+    # alternate the two so both see the same machine, best of each
+    profiler = StageProfiler()
+    plain = profiled = None
+    run()
+    for _ in range(10):
+        green.useProfiler(None)
+        yellow.useProfiler(None)
+        elapsed = timeit(run, repeat=1)
+        plain = elapsed if plain is None else min(plain, elapsed)
+        green.useProfiler(profiler)
+        yellow.useProfiler(profiler)
+        elapsed = timeit(run, repeat=1)
+        profiled = elapsed if profiled is None else min(profiled, elapsed)
+
+    # timing differences that small drown in noise, so also work the overhead out from the cost of a lap
+    laps = sum(stage.count for stage in profiler.stages.values()) / (10 * len(frames))
+    start = time.perf_counter_ns()
+    lap = timeit(lambda: [profiler.lap("bench", start) for _ in range(1000)]) / 1000
+    del profiler.stages["bench"]
+
+    profiler.dump()
+    print("frames:    {}".format(len(frames)))
+    print("disabled:  {:.3f} ms/frame".format(plain / len(frames) * 1e3))
+    print("enabled:   {:.3f} ms/frame ({:+.2f}%)".format(profiled / len(frames) * 1e3, (profiled / plain - 1) * 100))
+    print("lap:       {:.2f} us x {:.0f} per frame = {:.3f}% of a frame".format(lap * 1e6, laps, lap * laps / (plain / len(frames)) * 100))
+
+
+def runRecord(args):
+    frames = loadFrames(args.frames, args.count)
+    path = os.path.join(args.directory, "bench.ring")
+    slots = max(1, len(frames) // 2)
+    recorder = FrameRecorder(path, slots, frames[0].shape, keep=0)
+    recorder.start()
+    while not recorder.isReady():
+        time.sleep(0.01)
+
+    # a copy into plain memory next to each recorded frame, to tell the mapping's cost from the machine's
+    costs = []
+    copies = []
+    buffer = numpy.empty_like(frames[0])
+    for i, frame in enumerate(frames):
+        start = time.perf_counter()
+        recorder.record(1000000 + i * 33333, frame)
+        middle = time.perf_counter()
+        numpy.copyto(buffer, frame)
+        end = time.perf_counter()
+        costs.append(middle - start)
+        copies.append(end - middle)
+        # paced like a 30 fps camera, so the sync thread sees the load it would on the robot
+        time.sleep(max(0.0, 1 / 30 - (end - start)))
+    recorder.stop()
+    for name, times in (("record", costs), ("copy", copies)):
+        times = numpy.array(times) * 1e3
+        print("{:8} {} frames, p50 {:.3f} ms  p99 {:.3f} ms  max {:.3f} ms".format(
+            name + ":", len(frames), numpy.percentile(times, 50), numpy.percentile(times, 99), times.max()))
+
+    # replay as fast as frames are taken, through a lossless grabber like the main loop does
+    condition = threading.Condition()
+    grabber = FrameGrabber("bench", ReplaySink(path, realtime=False), condition)
+    grabber.lossless = True
+    grabber.start()
+    expected = list(range(len(frames) - slots, len(frames)))
+    replayed = []
+    start = time.perf_counter()
+    while len(replayed) < len(expected):
+        with condition:
+            condition.wait_for(grabber.hasFrame)
+        timestamp, image = grabber.takeFrame()
+        index = (timestamp - 1000000) // 33333
+        replayed.append(index if numpy.array_equal(image, frames[index]) else -1)
+        grabber.release(image)
+    elapsed = time.perf_counter() - start
+    print("replay:  {} frames at {:.0f} fps, {}".format(
+        len(replayed), len(replayed) / elapsed, "same frames in the same order" if replayed == expected else "MISMATCH"))
+    os.remove(path)
+    if replayed != expected:
+        sys.exit(1)
+
+
+class SimulatedCamera:
+    """A camera and sink in one, delivering frames at whatever fps setConfigJson() last asked for."""
+
+    def __init__(self, frame, fps):
+        self.frame = frame
+        self.fps = fps
+        self.__next = time.monotonic()
+
+    def setConfigJson(self, config):
+        self.fps = json.loads(config)["fps"]
+        return True
+
+    def grabFrame(self, image):
+        self.__next = max(self.__next + 1.0 / self.fps, time.monotonic())
+        time.sleep(max(0.0, self.__next - time.monotonic()))
+        numpy.copyto(image, self.frame)
+        return int(time.monotonic() * 1e6), image
+
+    def getError(self):
+        return ""
+
+    def setEnabled(self, enabled):
+        pass
+
+
+def runRate(args):
+    frame = loadFrames(args.frames, 1)[0]
+    camera = SimulatedCamera(frame, 30)
+    condition = threading.Condition()
+    grabber = FrameGrabber("bench", camera, condition)
+    grabber.start()
+    controller = RateController(camera, {"fps": 30}, grabber, rateModes({"fps": 30}), patience=2)
+
+    # processing takes longer than a 30 fps frame interval
+    busy_time = args.cost / 1000.0
+    interval = 0.5
+    start = last = time.monotonic()
+    waited = 0.0
+    latencies = []
+    while time.monotonic() - start < args.seconds:
+        wait_start = time.monotonic()
+        waitForFrames([grabber], condition)
+        waited += time.monotonic() - wait_start
+        timestamp, image = grabber.takeFrame()
+        time.sleep(busy_time)
+        grabber.release(image)
+        latencies.append(time.monotonic() - timestamp * 1e-6)
+        if time.monotonic() - last >= interval:
+            busy = 1.0 - waited / (time.monotonic() - last)
+            last = time.monotonic()
+            waited = 0.0
+            if controller.update(busy):
+                print("{:5.1f} s  busy {:.2f}  dropped {:.2f}  -> {} fps".format(
+                    last - start, busy, controller.drop_ratio, controller.modes[controller.mode][2]))
+    latencies = numpy.array(latencies) * 1e3
+    print("frames processed {}, dropped {}, capture-to-done p50 {:.1f} ms  max {:.1f} ms, ending at {} fps, {} frame buffers".format(
+        grabber.frames_processed, grabber.framesDropped(), numpy.percentile(latencies, 50), latencies.max(),
+        controller.modes[controller.mode][2], grabber.pool.allocated))
+
+
+class SimulatedSource:
+    """A CvSource with a client connected, counting the frames put."""
+
+    def __init__(self):
+        self.frames = 0
+
+    def isEnabled(self):
+        return True
+
+    def putFrame(self, image):
+        self.frames += 1
+
+
+def runStream(args):
+    frames = loadFrames(args.frames, min(args.count, 100))
+    pipeline = GripPipelineYellow()
+    overlay = Overlay()
+    results = []
+    for frame in frames:
+        pipeline.process(frame)
+        getValuesYellow(pipeline.filter_contours_output, RecordingTable(), overlay)
+        results.append(list(overlay.items))
+
+    for budget in args.kbps:
+        source = SimulatedSource()
+        stream = DashboardStream(source, budget_kbps=budget)
+        stream.start()
+        submit_time = 0.0
+        start = time.monotonic()
+        i = 0
+        while time.monotonic() - start < args.seconds:
+            overlay.items = results[i % len(frames)]
+            image = frames[i % len(frames)].copy()
+            began = time.perf_counter()
+            stream.submit(image, overlay)
+            submit_time += time.perf_counter() - began
+            i += 1
+            time.sleep(1 / 30.0)
+        stream.stop()
+        scale, quality = stream.levels[stream.level]
+        print("budget {:6.0f} kbps: {:.0f} kbps at scale {} quality {}, {:.1f} fps streamed, {} of {} frames dropped, "
+              "encode {:.2f} ms, submit {:.3f} ms on the loop".format(
+                  budget, stream.kbps, scale, quality, source.frames / args.seconds, stream.frames_dropped, i,
+                  stream.encode_ms, submit_time / i * 1e3))
+
+
+def firstFrames(warm):
+    """In a fresh process: ms of the first and the tenth frame through each pipeline, warmed up first or not."""
+    frames = loadFrames(None, 10)
+    times = []
+    for pipeline_class, measure in [(GripPipelineGreen, getValuesGreen), (GripPipelineYellow, getValuesYellow)]:
+        pipeline = pipeline_class()
+        if warm:
+            warmPipeline(pipeline, measure, RecordingTable())
+        first = None
+        for frame in frames:
+            start = time.perf_counter()
+            pipeline.process(frame)
+            measure(pipeline.filter_contours_output, RecordingTable())
+            elapsed = (time.perf_counter() - start) * 1000
+            first = elapsed if first is None else first
+        times.append((first, elapsed))
+    return times
+
+
+def runStartup(args):
+    import multiprocessing
+    # each run in a new process that has not touched OpenCV yet
+    for warm in (False, True):
+        with multiprocessing.Pool(1) as pool:
+            times = pool.apply(firstFrames, (warm,))
+        print("{:10} green first frame {:.2f} ms (tenth {:.2f}), yellow first frame {:.2f} ms (tenth {:.2f})".format(
+            "warmed up" if warm else "cold", times[0][0], times[0][1], times[1][0], times[1][1]))
+
+
+def movingBalls(count, fps=30.0):
+    """Frames of balls swinging across the view while they come closer.
+    Returns:
+        A list of (capture time, frame).
+    """
+    # x, y, swing px, swing rad/s, distance in, closing speed in/s
+    balls = [(160, 300, 120, 1.1, 90, 6), (480, 250, 140, 0.8, 140, 8), (320, 380, 200, 0.6, 60, 2)]
+    frames = []
+    for i in range(count):
+        t = i / fps
+        image = numpy.full(FRAME_SHAPE, 40, dtype=numpy.uint8)
+        for x, y, swing, speed, distance, closing in balls:
+            d = max(30.0, distance - closing * t)
+            radius = int(7 * FOCAL_LENGTH / d / 2)
+            cx = int(x + swing * numpy.sin(speed * t))
+            cy = int(y + swing / 4 * numpy.sin(2 * speed * t))
+            cv2.circle(image, (cx, cy), radius, YELLOW_BGR, -1)
+        frames.append((t, image))
+    return frames
+
+
+def runTrack(args):
+    frames = movingBalls(args.count)
+    yellow = GripPipelineYellow()
+
+    # what the pipeline sees on every frame is the truth the predictions are held to
+    truth = []
+    for t, frame in frames:
+        yellow.process(frame)
+        balls = measureYellow(yellow.filter_contours_output)
+        truth.append(numpy.stack([balls['center_x'], balls['center_y'], balls['distance']], axis=1))
+
+    for every in args.every:
+        tracker = BallTracker()
+        table = RecordingTable()
+        errors = []
+        held_errors = []
+        counts = []
+        update_time = predict_time = 0.0
+        for i, (t, frame) in enumerate(frames):
+            start = time.perf_counter()
+            if i % every == 0:
+                yellow.process(frame)
+                trackYellow(yellow.filter_contours_output, table, tracker, t)
+                update_time += time.perf_counter() - start
+            else:
+                predictYellow(table, tracker, t)
+                predict_time += time.perf_counter() - start
+                # error of every live predicted track against its nearest detection in this frame
+                live = tracker.missed == 0
+                if live.any() and len(truth[i]):
+                    gap = tracker.position[live, None, :2] - truth[i][None, :, :2]
+                    errors.extend(numpy.hypot(gap[..., 0], gap[..., 1]).min(axis=1))
+                # versus holding on to the last detections, what the robot got without tracking
+                held = truth[i - i % every]
+                if len(held) and len(truth[i]):
+                    gap = held[:, None, :2] - truth[i][None, :, :2]
+                    held_errors.extend(numpy.hypot(gap[..., 0], gap[..., 1]).min(axis=1))
+            counts.append(len(tracker))
+        detections = (len(frames) + every - 1) // every
+        errors = numpy.array(errors) if errors else numpy.zeros(1)
+        held_errors = numpy.array(held_errors) if held_errors else numpy.zeros(1)
+        print("every {}: {:.1f} tracks on average, {} IDs given out, prediction error mean {:.1f} px p95 {:.1f} px "
+              "(last detection {:.1f} px p95 {:.1f} px), {:.2f} ms per detected frame, {:.3f} ms per predicted frame".format(
+                  every, numpy.mean(counts), tracker.next_id, errors.mean(), numpy.percentile(errors, 95),
+                  held_errors.mean(), numpy.percentile(held_errors, 95),
+                  update_time / detections * 1e3, predict_time / max(1, len(frames) - detections) * 1e3))
+
+
+def timeit(function, repeat=20):
+    """Best of repeat runs of function, in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", help="directory of recorded frames (synthetic frames if omitted)")
+    parser.add_argument("--count", type=int, default=1000, help="number of frames to run")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    suite = commands.add_parser("suite", help="every pipeline and measurement over synthetic and recorded frames, and every feature against the way without it")
+    suite.add_argument("--json", help="write the results to this file")
+    suite.add_argument("--compare", help="results file of an earlier run to compare against")
+    suite.add_argument("--stages", action="store_true", help="print every stage's percentiles")
+    suite.add_argument("--features", nargs="*", choices=[feature for feature, compare in FEATURES], help="only compare these features, none if no names follow")
+    suite.add_argument("--bits", type=int, nargs="+", default=[5, 6, 8], help="lut: bits per channel to try")
+    suite.add_argument("--margin", type=int, default=48, help="roi: pixels around the last detection")
+    suite.add_argument("--interval", type=int, default=15, help="roi: frames between full-frame searches")
+    suite.add_argument("--noise", type=float, nargs="+", default=[0.01, 0.05], help="filter: fractions of pixels turned into specks of target colour")
+    suite.add_argument("--contours", type=int, nargs="+", default=[1, 4, 16, 64], help="measure: contours measured per call")
+    suite.set_defaults(run=runSuite)
+    commands.add_parser("pool", help="single process vs. process pool throughput").set_defaults(run=runPool)
+    commands.add_parser("alloc", help="check the pipelines allocate nothing per frame after warm-up").set_defaults(run=runAlloc)
+    publish = commands.add_parser("publish", help="NetworkTables updates per frame, individual keys vs. the result array")
+    publish.add_argument("--epsilon", type=float, nargs="+", default=[0.001, 0.5, 2.0], help="smallest change published")
+    publish.set_defaults(run=runPublish)
+    commands.add_parser("latency", help="capture-to-publish latency percentiles of both pipelines").set_defaults(run=runLatency)
+    record = commands.add_parser("record", help="cost of recording a frame to a ring file, and replaying it")
+    record.add_argument("--directory", default="/tmp", help="where the ring file goes")
+    record.set_defaults(run=runRecord)
+    rate = commands.add_parser("rate", help="adaptive camera frame rate against a simulated overloaded loop")
+    rate.add_argument("--cost", type=float, default=45.0, help="processing time per frame in ms")
+    rate.add_argument("--seconds", type=float, default=12.0, help="how long to run")
+    rate.set_defaults(run=runRate)
+    track = commands.add_parser("track", help="yellow ball tracks with the pipeline run on every n-th frame")
+    track.add_argument("--every", type=int, nargs="+", default=[1, 2, 3], help="run the pipeline on every n-th frame")
+    track.set_defaults(run=runTrack)
+    stream = commands.add_parser("stream", help="dashboard stream level and frame rate under a bandwidth budget")
+    stream.add_argument("--kbps", type=float, nargs="+", default=[8000, 3000, 1000, 300], help="budgets to try")
+    stream.add_argument("--seconds", type=float, default=6.0, help="how long to stream each budget")
+    stream.set_defaults(run=runStream)
+    commands.add_parser("startup", help="first frame cost with and without warming the pipelines up").set_defaults(run=runStartup)
+    commands.add_parser("profile", help="per-step timings and the cost of profiling them").set_defaults(run=runProfile)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
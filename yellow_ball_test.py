@@ -2,6 +2,10 @@ import cv2
 import numpy
 import math
 from enum import Enum
+from hsv_lut import HsvLookupTable, YuyvLookupTable
+from fast_filter import filterContoursFast
+from morphology import MorphologyPlan, ERODE, DILATE
+from time import perf_counter_ns
 
 class GripPipelineYellow:
     """
@@ -16,6 +20,12 @@ class GripPipelineYellow:
         self.__hsv_threshold_saturation = [187.28813559322032, 255.0]
         self.__hsv_threshold_value = [100.05649717514126, 255.0]
 
+        self.__hsv_threshold_lut = None
+        self.__fast_filter = False
+        self.__morphology_plan = None
+        self.__profiler = None
+        self.__profiler_stages = None
+
         self.hsv_threshold_output = None
 
         self.__cv_erode_src = self.hsv_threshold_output
@@ -61,53 +71,173 @@ class GripPipelineYellow:
 
         self.filter_contours_output = None
 
+        self.__hsv_buffer = None
+        self.__hsv_threshold_buffer = None
+        self.__cv_erode_buffer = None
+        self.__cv_dilate_buffer = None
+        self.__mask_buffer = None
+
 
     def process(self, source0):
         """
         Runs the pipeline and sets all outputs to new values.
+        Output images are owned by the pipeline and are overwritten by the next call.
         """
+        height, width = source0.shape[:2]
+        if self.__hsv_buffer is None or self.__hsv_buffer.shape[0] < height or self.__hsv_buffer.shape[1] < width or self.__mask_buffer.shape[2:] != source0.shape[2:]:
+            self.__allocate_buffers(source0)
+
+        # a smaller source (a region of interest) uses the top left corner of the buffers
+        hsv_buffer = self.__hsv_buffer[:height, :width]
+        hsv_threshold_buffer = self.__hsv_threshold_buffer[:height, :width]
+        cv_erode_buffer = self.__cv_erode_buffer[:height, :width]
+        cv_dilate_buffer = self.__cv_dilate_buffer[:height, :width]
+        mask_buffer = self.__mask_buffer[:height, :width]
+
+        profiler = self.__profiler
+        if profiler is not None:
+            start = perf_counter_ns()
+
         # Step HSV_Threshold0:
         self.__hsv_threshold_input = source0
-        (self.hsv_threshold_output) = self.__hsv_threshold(self.__hsv_threshold_input, self.__hsv_threshold_hue, self.__hsv_threshold_saturation, self.__hsv_threshold_value)
+        if self.__hsv_threshold_lut is not None:
+            (self.hsv_threshold_output) = self.__hsv_threshold_lut.apply(self.__hsv_threshold_input, hsv_threshold_buffer)
+        else:
+            (self.hsv_threshold_output) = self.__hsv_threshold(self.__hsv_threshold_input, self.__hsv_threshold_hue, self.__hsv_threshold_saturation, self.__hsv_threshold_value, hsv_buffer, hsv_threshold_buffer)
 
-        # Step CV_erode0:
-        self.__cv_erode_src = self.hsv_threshold_output
-        (self.cv_erode_output) = self.__cv_erode(self.__cv_erode_src, self.__cv_erode_kernel, self.__cv_erode_anchor, self.__cv_erode_iterations, self.__cv_erode_bordertype, self.__cv_erode_bordervalue)
+        if profiler is not None:
+            start = profiler.lap(self.__profiler_stages[0], start)
 
-        # Step CV_dilate0:
-        self.__cv_dilate_src = self.cv_erode_output
-        (self.cv_dilate_output) = self.__cv_dilate(self.__cv_dilate_src, self.__cv_dilate_kernel, self.__cv_dilate_anchor, self.__cv_dilate_iterations, self.__cv_dilate_bordertype, self.__cv_dilate_bordervalue)
+        if self.__morphology_plan is not None:
+            # Steps CV_erode0 and CV_dilate0, compiled together
+            self.cv_erode_output = None
+            (self.cv_dilate_output) = self.__morphology_plan.run(self.hsv_threshold_output, cv_dilate_buffer, cv_erode_buffer)
+
+            if profiler is not None:
+                start = profiler.lap(self.__profiler_stages[-1], start)
+        else:
+            # Step CV_erode0:
+            self.__cv_erode_src = self.hsv_threshold_output
+            (self.cv_erode_output) = self.__cv_erode(self.__cv_erode_src, self.__cv_erode_kernel, self.__cv_erode_anchor, self.__cv_erode_iterations, self.__cv_erode_bordertype, self.__cv_erode_bordervalue, cv_erode_buffer)
+
+            if profiler is not None:
+                start = profiler.lap(self.__profiler_stages[1], start)
+
+            # Step CV_dilate0:
+            self.__cv_dilate_src = self.cv_erode_output
+            (self.cv_dilate_output) = self.__cv_dilate(self.__cv_dilate_src, self.__cv_dilate_kernel, self.__cv_dilate_anchor, self.__cv_dilate_iterations, self.__cv_dilate_bordertype, self.__cv_dilate_bordervalue, cv_dilate_buffer)
+
+            if profiler is not None:
+                start = profiler.lap(self.__profiler_stages[2], start)
 
         # Step Mask0:
         self.__mask_input = source0
         self.__mask_mask = self.cv_dilate_output
-        (self.mask_output) = self.__mask(self.__mask_input, self.__mask_mask)
+        (self.mask_output) = self.__mask(self.__mask_input, self.__mask_mask, mask_buffer)
+
+        if profiler is not None:
+            start = profiler.lap(self.__profiler_stages[3], start)
 
         # Step Find_Contours0:
         self.__find_contours_input = self.cv_dilate_output
         (self.find_contours_output) = self.__find_contours(self.__find_contours_input, self.__find_contours_external_only)
 
+        if profiler is not None:
+            start = profiler.lap(self.__profiler_stages[4], start)
+
         # Step Filter_Contours0:
         self.__filter_contours_contours = self.find_contours_output
-        (self.filter_contours_output) = self.__filter_contours(self.__filter_contours_contours, self.__filter_contours_min_area, self.__filter_contours_min_perimeter, self.__filter_contours_min_width, self.__filter_contours_max_width, self.__filter_contours_min_height, self.__filter_contours_max_height, self.__filter_contours_solidity, self.__filter_contours_max_vertices, self.__filter_contours_min_vertices, self.__filter_contours_min_ratio, self.__filter_contours_max_ratio)
+        if self.__fast_filter:
+            (self.filter_contours_output) = filterContoursFast(self.__filter_contours_contours, self.__filter_contours_min_area, self.__filter_contours_min_perimeter, self.__filter_contours_min_width, self.__filter_contours_max_width, self.__filter_contours_min_height, self.__filter_contours_max_height, self.__filter_contours_solidity, self.__filter_contours_max_vertices, self.__filter_contours_min_vertices, self.__filter_contours_min_ratio, self.__filter_contours_max_ratio)
+        else:
+            (self.filter_contours_output) = self.__filter_contours(self.__filter_contours_contours, self.__filter_contours_min_area, self.__filter_contours_min_perimeter, self.__filter_contours_min_width, self.__filter_contours_max_width, self.__filter_contours_min_height, self.__filter_contours_max_height, self.__filter_contours_solidity, self.__filter_contours_max_vertices, self.__filter_contours_min_vertices, self.__filter_contours_min_ratio, self.__filter_contours_max_ratio)
+
+        if profiler is not None:
+            profiler.lap(self.__profiler_stages[5], start)
 
 
+    def useLookupTable(self, bits=8):
+        """Threshold through a precomputed HsvLookupTable instead of cvtColor + inRange.
+        Args:
+            bits: Bits kept per colour channel, 8 gives the exact same mask.
+        """
+        self.__hsv_threshold_lut = HsvLookupTable(self.__hsv_threshold_hue, self.__hsv_threshold_saturation, self.__hsv_threshold_value, bits)
+
+    def useYuyvLookupTable(self):
+        """Take packed YUYV frames instead of BGR and threshold them through a YuyvLookupTable.
+        The mask is the same as on the BGR frame cscore would decode from them.
+        """
+        self.__hsv_threshold_lut = YuyvLookupTable(self.__hsv_threshold_hue, self.__hsv_threshold_saturation, self.__hsv_threshold_value)
+
+    def useFastFilter(self):
+        """Filter contours with filterContoursFast, which keeps the same contours."""
+        self.__fast_filter = True
+
+    def useMorphologyPlan(self):
+        """Run the erode and dilate steps as one MorphologyPlan, which gives the same cv_dilate_output.
+        cv_erode_output is no longer set.
+        """
+        self.__morphology_plan = MorphologyPlan([
+            (ERODE, self.__cv_erode_kernel, self.__cv_erode_anchor, self.__cv_erode_iterations, self.__cv_erode_bordertype, self.__cv_erode_bordervalue),
+            (DILATE, self.__cv_dilate_kernel, self.__cv_dilate_anchor, self.__cv_dilate_iterations, self.__cv_dilate_bordertype, self.__cv_dilate_bordervalue)])
+
+    def useProfiler(self, profiler, name="Yellow"):
+        """Time every step with a profiler.StageProfiler.
+        Args:
+            profiler: The StageProfiler, None to stop timing.
+            name: Prefix of the stage names, e.g. "Yellow/CV_erode0". A morphology plan is timed as "Yellow/Morphology0".
+        """
+        self.__profiler = profiler
+        self.__profiler_stages = [name + "/" + step for step in ("HSV_Threshold0", "CV_erode0", "CV_dilate0", "Mask0", "Find_Contours0", "Filter_Contours0", "Morphology0")]
+
+    def threshold(self, source0, hsv=None, dst=None):
+        """Runs only the HSV threshold step, e.g. on a downscaled copy of a frame.
+        Args:
+            source0: A BGR numpy.ndarray.
+            hsv: Optional three channel numpy.ndarray to hold the HSV image.
+            dst: Optional single channel numpy.ndarray to hold the output.
+        Returns:
+            A black and white numpy.ndarray.
+        """
+        if self.__hsv_threshold_lut is not None:
+            return self.__hsv_threshold_lut.apply(source0, dst)
+        return self.__hsv_threshold(source0, self.__hsv_threshold_hue, self.__hsv_threshold_saturation, self.__hsv_threshold_value, hsv, dst)
+
+    def minArea(self):
+        """The smallest contour area the filter step keeps."""
+        return self.__filter_contours_min_area
+
+    def __allocate_buffers(self, source0):
+        """Sizes the step output buffers from a frame so later frames no bigger than it allocate nothing.
+        Args:
+            source0: A BGR numpy.ndarray.
+        """
+        height, width = source0.shape[:2]
+        self.__hsv_buffer = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        self.__hsv_threshold_buffer = numpy.empty((height, width), dtype=numpy.uint8)
+        self.__cv_erode_buffer = numpy.empty((height, width), dtype=numpy.uint8)
+        self.__cv_dilate_buffer = numpy.empty((height, width), dtype=numpy.uint8)
+        # as many channels as the source, three for BGR and two for YUYV
+        self.__mask_buffer = numpy.empty((height, width) + source0.shape[2:], dtype=numpy.uint8)
+
     @staticmethod
-    def __hsv_threshold(input, hue, sat, val):
+    def __hsv_threshold(input, hue, sat, val, hsv, dst):
         """Segment an image based on hue, saturation, and value ranges.
         Args:
             input: A BGR numpy.ndarray.
             hue: A list of two numbers the are the min and max hue.
             sat: A list of two numbers the are the min and max saturation.
             lum: A list of two numbers the are the min and max value.
+            hsv: A three channel numpy.ndarray to hold the HSV image.
+            dst: A single channel numpy.ndarray to hold the output.
         Returns:
             A black and white numpy.ndarray.
         """
-        out = cv2.cvtColor(input, cv2.COLOR_BGR2HSV)
-        return cv2.inRange(out, (hue[0], sat[0], val[0]),  (hue[1], sat[1], val[1]))
+        out = cv2.cvtColor(input, cv2.COLOR_BGR2HSV, dst=hsv)
+        return cv2.inRange(out, (hue[0], sat[0], val[0]),  (hue[1], sat[1], val[1]), dst=dst)
 
     @staticmethod
-    def __cv_erode(src, kernel, anchor, iterations, border_type, border_value):
+    def __cv_erode(src, kernel, anchor, iterations, border_type, border_value, dst):
         """Expands area of lower value in an image.
         Args:
            src: A numpy.ndarray.
@@ -115,14 +245,15 @@ class GripPipelineYellow:
            iterations: the number of times to erode.
            border_type: Opencv enum that represents a border type.
            border_value: value to be used for a constant border.
+           dst: A numpy.ndarray to hold the output.
         Returns:
             A numpy.ndarray after erosion.
         """
-        return cv2.erode(src, kernel, anchor, iterations = (int) (iterations +0.5),
+        return cv2.erode(src, kernel, dst, anchor, iterations = (int) (iterations +0.5),
                             borderType = border_type, borderValue = border_value)
 
     @staticmethod
-    def __cv_dilate(src, kernel, anchor, iterations, border_type, border_value):
+    def __cv_dilate(src, kernel, anchor, iterations, border_type, border_value, dst):
         """Expands area of higher value in an image.
         Args:
            src: A numpy.ndarray.
@@ -130,22 +261,26 @@ class GripPipelineYellow:
            iterations: the number of times to dilate.
            border_type: Opencv enum that represents a border type.
            border_value: value to be used for a constant border.
+           dst: A numpy.ndarray to hold the output.
         Returns:
             A numpy.ndarray after dilation.
         """
-        return cv2.dilate(src, kernel, anchor, iterations = (int) (iterations +0.5),
+        return cv2.dilate(src, kernel, dst, anchor, iterations = (int) (iterations +0.5),
                             borderType = border_type, borderValue = border_value)
 
     @staticmethod
-    def __mask(input, mask):
+    def __mask(input, mask, dst):
         """Filter out an area of an image using a binary mask.
         Args:
             input: A three channel numpy.ndarray.
             mask: A black and white numpy.ndarray.
+            dst: A three channel numpy.ndarray to hold the output.
         Returns:
             A three channel numpy.ndarray.
         """
-        return cv2.bitwise_and(input, input, mask=mask)
+        # bitwise_and leaves pixels outside the mask alone, clear them first
+        dst.fill(0)
+        return cv2.bitwise_and(input, input, dst=dst, mask=mask)
 
     @staticmethod
     def __find_contours(input, external_only):